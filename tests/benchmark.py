@@ -0,0 +1,279 @@
+#
+#	benchmark.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Run the same workload via several protocol bindings in one invocation and
+#	compare them side by side: throughput, latency, bytes on the wire and client
+#	CPU time per request.
+#
+#	The CSEBase URLs of the bindings are configured in config.BENCHMARKURLS.
+#
+
+from __future__ import annotations
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+import argparse, json, socket, ssl, threading, time
+from urllib.parse import urlparse
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from rich.console import Console
+from rich.table import Table
+import init
+from init import Transport, HttpTransport, MqttTransport, WsTransport, CoapTransport, RequestPrimitive, BENCHMARKURLS, mqttAddress, mqttPort, wsAddress, wsPort, APPID, ORIGINATOR, RELEASEVERSION, JSON, findXPath, uniqueRN
+from acme.etc.Types import Operation, ResponseStatusCode as RC, ResourceTypes as T
+from histograms import LatencyHistogram
+
+
+transportClasses:dict[str, Callable[[str], Transport]] = {
+	'http':		HttpTransport,
+	'https':	HttpTransport,
+	'mqtt':		MqttTransport,
+	'ws':		WsTransport,
+	'wss':		WsTransport,
+	'coap':		CoapTransport,
+}
+""" The transport class for each binding. Each binding gets its own transport instance and metrics, but the MQTT and WebSocket transports share the test suite's connections. """
+
+sharedConnections:dict[str, Tuple[str, int]] = {
+	'mqtt':		(mqttAddress, mqttPort),
+	'ws':		(wsAddress, wsPort),
+	'wss':		(wsAddress, wsPort),
+}
+""" The bindings that send all requests via the test suite's single connection, and the configured (host, port) of that connection.
+	Only the path of a URL for these bindings is used, so the URL's host and port must match the configuration. """
+
+
+class ByteCounter:
+	"""	Count the bytes that are sent and received through sockets. For TLS connections the
+		plaintext is counted. The counter wraps the socket methods of the *socket* and *ssl*
+		modules while it is active, so it counts the traffic of all client libraries,
+		but only of the sockets of this process.
+	"""
+	sent = 0
+	received = 0
+	_originals:dict[Tuple[type, str], Optional[Callable]] = {}
+	_methods = { socket.socket:	( ('send', 'sendall', 'sendto'), ('recv', 'recvfrom'), ('recv_into', 'recvfrom_into') ),
+				 ssl.SSLSocket:	( ('send', 'sendto'), ('recv', 'recvfrom'), ('recv_into', 'recvfrom_into') ) }	# SSLSocket.sendall() calls send()
+
+	@classmethod
+	def _wrapSend(cls, method:Callable) -> Callable:
+		def _send(self:socket.socket, data:Any, *args:Any) -> Any:
+			result = method(self, data, *args)
+			cls.sent += result if isinstance(result, int) else len(data)	# sendall() returns None
+			return result
+		return _send
+
+
+	@classmethod
+	def _wrapRecv(cls, method:Callable, intoBuffer:bool) -> Callable:
+		def _recv(self:socket.socket, *args:Any) -> Any:
+			result = method(self, *args)
+			if intoBuffer:		# recv_into() returns the number of bytes, recvfrom_into() a tuple
+				cls.received += result[0] if isinstance(result, tuple) else result
+			else:				# recv() returns the data, recvfrom() a tuple
+				cls.received += len(result[0] if isinstance(result, tuple) else result)
+			return result
+		return _recv
+
+
+	@classmethod
+	@contextmanager
+	def active(cls) -> Iterator[None]:
+		for klass, (sendMethods, recvMethods, recvIntoMethods) in cls._methods.items():
+			for names, wrap in ((sendMethods, cls._wrapSend),
+								(recvMethods, lambda m: cls._wrapRecv(m, False)),
+								(recvIntoMethods, lambda m: cls._wrapRecv(m, True))):
+				for name in names:
+					cls._originals[(klass, name)] = klass.__dict__.get(name)	# None if inherited
+					setattr(klass, name, wrap(getattr(klass, name)))
+		try:
+			yield
+		finally:
+			for (klass, name), original in cls._originals.items():
+				if original is None:
+					delattr(klass, name)
+				else:
+					setattr(klass, name, original)
+			cls._originals.clear()
+
+
+@dataclass
+class BindingResult:
+	"""	The measurements of a binding.
+	"""
+	binding:str
+	url:str
+	requests:int				= 0
+	errors:int					= 0
+	duration:float				= 0.0
+	cpuTime:float				= 0.0
+	bytesSent:int				= 0
+	bytesReceived:int			= 0
+	latencies:LatencyHistogram	= field(default_factory = LatencyHistogram)
+	error:Optional[str]			= None		# Set if the binding could not be benchmarked
+
+
+	def toJSON(self) -> JSON:
+		return { 'binding': self.binding,
+				 'url': self.url,
+				 'requests': self.requests,
+				 'errors': self.errors,
+				 'duration': self.duration,
+				 'cpuTime': self.cpuTime,
+				 'bytesSent': self.bytesSent,
+				 'bytesReceived': self.bytesReceived,
+				 'latency': self.latencies.summary(),
+				 'error': self.error }
+
+
+class BindingBenchmark:
+	"""	Run the benchmark workload via one binding.
+
+		The workload creates an AE with a container, and then alternately creates a <CIN>
+		and retrieves the latest <CIN> of the container, optionally in several threads.
+		Only these requests are measured, the set-up and clean-up are not.
+	"""
+
+	def __init__(self, binding:str, url:str) -> None:
+		self.binding = binding
+		self.url = url
+		self.transport = transportClasses[binding](binding)
+		self.aern = uniqueRN('benchAE')
+		self.originator:str = None
+
+
+	def request(self, operation:Operation, url:str, originator:str, ty:T = None, data:JSON = None) -> Tuple[Any, int]:
+		startTime = time.perf_counter()
+		result = self.transport.send(RequestPrimitive(operation, url, originator, ty, data))
+		self.transport.metrics.record(time.perf_counter() - startTime, result[1])
+		return result
+
+
+	def setUp(self) -> None:
+		r, rsc = self.request(Operation.CREATE, self.url, 'C', T.AE, { 'm2m:ae': { 'rn': self.aern, 'api': APPID, 'rr': False, 'srv': [ RELEASEVERSION ] }})
+		if rsc != RC.CREATED:
+			raise RuntimeError(f'cannot create AE: {rsc} {r}')
+		self.originator = findXPath(r, 'm2m:ae/aei')
+		r, rsc = self.request(Operation.CREATE, f'{self.url}/{self.aern}', self.originator, T.CNT, { 'm2m:cnt': { 'rn': 'data', 'mni': 10 }})
+		if rsc != RC.CREATED:
+			raise RuntimeError(f'cannot create container: {rsc} {r}')
+
+
+	def tearDown(self) -> None:
+		self.request(Operation.DELETE, f'{self.url}/{self.aern}', ORIGINATOR)
+
+
+	def run(self, count:int, parallel:int) -> BindingResult:
+		"""	Run the workload.
+
+			Args:
+				count: The number of requests per thread.
+				parallel: The number of threads.
+
+			Return:
+				The binding's measurements.
+		"""
+		result = BindingResult(self.binding, self.url)
+		lock = threading.Lock()
+		containerURL = f'{self.url}/{self.aern}/data'
+
+		def _worker() -> None:
+			latencies = LatencyHistogram()
+			errors = 0
+			for n in range(count):
+				startTime = time.perf_counter()
+				if n % 2 == 0:
+					_, rsc = self.request(Operation.CREATE, containerURL, self.originator, T.CIN, { 'm2m:cin': { 'con': f'value {n}' }})
+					ok = rsc == RC.CREATED
+				else:
+					_, rsc = self.request(Operation.RETRIEVE, f'{containerURL}/la', self.originator)
+					ok = rsc == RC.OK
+				latencies.record(time.perf_counter() - startTime)
+				errors += 0 if ok else 1
+			with lock:
+				result.latencies.merge(latencies)
+				result.errors += errors
+
+		try:
+			self.setUp()
+		except Exception as e:
+			result.error = str(e)
+			return result
+		try:
+			threads = [ threading.Thread(target = _worker) for _ in range(parallel) ]
+			sent, received = ByteCounter.sent, ByteCounter.received
+			startTime, startCPU = time.perf_counter(), time.process_time()
+			[ t.start() for t in threads ]	# type: ignore [func-returns-value]
+			[ t.join() for t in threads ]	# type: ignore [func-returns-value]
+			result.duration = time.perf_counter() - startTime
+			result.cpuTime = time.process_time() - startCPU
+			result.bytesSent = ByteCounter.sent - sent
+			result.bytesReceived = ByteCounter.received - received
+			result.requests = result.latencies.count
+		finally:
+			self.tearDown()
+		return result
+
+
+def _perRequest(r:BindingResult, value:float) -> float:
+	return value / r.requests if r.requests else 0.0
+
+
+if __name__ == '__main__':
+	console = Console()
+
+	parser = argparse.ArgumentParser(description = 'Compare the protocol bindings with the same workload')
+	parser.add_argument('--bindings', '-b', action = 'store', dest = 'bindings', nargs = '+', default = list(BENCHMARKURLS.keys()), help = f'the bindings to compare (default: {" ".join(BENCHMARKURLS.keys())})')
+	parser.add_argument('--url', action = 'append', dest = 'urls', default = [], metavar = 'BINDING=URL', help = 'the CSEBase URL for a binding, e.g. "https=https://localhost:8443/cse-in". Can be given several times')
+	parser.add_argument('--requests', '-n', action = 'store', dest = 'count', type = int, default = 1000, help = 'number of requests per thread (default: 1000)')
+	parser.add_argument('--parallel', '-p', action = 'store', dest = 'parallel', type = int, default = 1, help = 'number of threads (default: 1)')
+	parser.add_argument('--json', action = 'store', dest = 'jsonFile', default = None, metavar = 'FILE', help = 'also write the results to a JSON file')
+	args = parser.parse_args()
+
+	urls = dict(BENCHMARKURLS)
+	for u in args.urls:
+		binding, _, url = u.partition('=')
+		urls[binding] = url
+	for binding in args.bindings:
+		if binding not in transportClasses:
+			parser.error(f'unknown binding: {binding}. Must be one of {list(transportClasses)}')
+		if binding not in urls:
+			parser.error(f'no URL for binding: {binding}. Use --url {binding}=URL')
+		if binding in sharedConnections:
+			u = urlparse(urls[binding])
+			host, port = sharedConnections[binding]
+			if (u.hostname, u.port) != (host, port):
+				parser.error(f'the URL for binding {binding} must use the configured address {host}:{port}, not {u.hostname}:{u.port}')
+
+	results:list[BindingResult] = []
+	with ByteCounter.active():
+		for binding in args.bindings:
+			console.print(f'[bright_blue]Running [bold]{args.count} * {args.parallel}[/bold] requests via [bold]{binding}[/bold] ({urls[binding]})')
+			results.append(r := BindingBenchmark(binding, urls[binding]).run(args.count, args.parallel))
+			if r.error:
+				console.print(f'[red]{binding}: {r.error}')
+
+	# Print the results side by side
+	measured = [ r for r in results if not r.error ]
+	table = Table(show_header = True, header_style = 'bright_blue', title = f'Binding comparison ({args.count} * {args.parallel} requests, CREATE <CIN> / RETRIEVE latest)')
+	table.add_column('', no_wrap = True)
+	for r in measured:
+		table.add_column(r.binding, justify = 'right')
+	for name, value in [ ('Requests',				lambda r: f'{r.requests}'),
+						 ('Errors',					lambda r: f'{r.errors}'),
+						 ('Req / s',				lambda r: f'{r.requests / r.duration:.1f}' if r.duration else '-'),
+						 ('Latency p50 ms',			lambda r: f'{r.latencies.percentile(50)*1000:.2f}'),
+						 ('Latency p99 ms',			lambda r: f'{r.latencies.percentile(99)*1000:.2f}'),
+						 ('Latency max ms',			lambda r: f'{r.latencies.max/1000:.2f}'),
+						 ('Bytes sent / req',		lambda r: f'{_perRequest(r, r.bytesSent):.0f}'),
+						 ('Bytes received / req',	lambda r: f'{_perRequest(r, r.bytesReceived):.0f}'),
+						 ('Client CPU ms / req',	lambda r: f'{_perRequest(r, r.cpuTime)*1000:.3f}') ]:
+		table.add_row(name, *[ value(r) for r in measured ])
+	console.print(table)
+
+	if args.jsonFile:
+		with open(args.jsonFile, 'w', encoding = 'utf-8') as f:
+			json.dump([ r.toJSON() for r in results ], f, indent = 1)
+	init.shutdown()
@@ -0,0 +1,282 @@
+#
+#	coapFleet.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Simulate a fleet of constrained devices that use the CoAP binding. Each device
+#	registers its own AE and creates a container, and then periodically uploads
+#	<contentInstance> or <timeSeriesInstance> resources.
+#
+#	All devices run in a single asyncio event loop. Each device has its own UDP
+#	endpoint (source port) and its own token space, and confirmable requests are
+#	retransmitted as specified for CoAP. A request without a response after all
+#	retransmissions counts as lost.
+#
+#	Many devices need many sockets. Raise the limit of open files if necessary,
+#	e.g. "ulimit -n 10000".
+#
+
+from __future__ import annotations
+from typing import Optional, Tuple
+
+import argparse, asyncio, json, random, time, uuid
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+from rich.console import Console
+from rich.table import Table
+from coapthon import defines
+from coapthon.messages.message import Message
+from coapthon.serializer import Serializer
+from init import buildCoapRequest, parseCoapResponse, cseURL, PROTOCOL, CSERN, ORIGINATOR, APPID, RELEASEVERSION, JSON, STRING
+from acme.etc.Types import Operation, ResponseStatusCode as RC, ResourceTypes as T
+from acme.etc import DateUtils
+from histograms import LatencyHistogram, mergeHistograms
+
+
+defaultURL = cseURL if PROTOCOL == 'coap' else f'coap://localhost:5683/{CSERN}'
+""" The CSE's CoAP URL, if not given on the command line. """
+
+
+@dataclass
+class DeviceStats:
+	"""	Counters and latencies of a device.
+	"""
+	latencies:LatencyHistogram	= field(default_factory = LatencyHistogram)
+	sent:int					= 0		# Requests, not counting retransmissions
+	retransmissions:int			= 0
+	lost:int					= 0		# Requests without a response after all retransmissions
+	errors:int					= 0		# Responses with an unexpected response status code
+
+
+class DeviceProtocol(asyncio.DatagramProtocol):
+	"""	The UDP endpoint of a device.
+	"""
+
+	def __init__(self, device:Device) -> None:
+		self.device = device
+
+
+	def datagram_received(self, data:bytes, addr:Tuple[str, int]) -> None:
+		message = Serializer.deserialize(data, addr)
+		if isinstance(message, Message):
+			self.device.received(message)
+
+
+class Device:
+	"""	A simulated device with its own UDP endpoint.
+	"""
+
+	def __init__(self, index:int, url:str, tag:str) -> None:
+		self.index = index
+		self.url = url
+		self.originator = f'Cfleet{tag}d{index}'
+		self.aern = f'fleet{tag}d{index}'
+		self.containerURL = f'{url}/{self.aern}/data'
+		self.transport:asyncio.DatagramTransport = None
+		self.mid = random.randint(0, 0xffff)
+		self.tokenCounter = 0
+		self.pending:dict[str, asyncio.Future] = {}
+		self.stats = DeviceStats()
+
+
+	async def open(self) -> None:
+		url = urlparse(self.url)
+		self.transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(lambda: DeviceProtocol(self),
+																					   remote_addr = (url.hostname, url.port))
+
+
+	def close(self) -> None:
+		if self.transport:
+			self.transport.close()
+
+
+	def received(self, message:Message) -> None:
+		if message.type == defines.Types['CON']:	# a separate response must be acknowledged
+			ack = Message()
+			ack.type = defines.Types['ACK']
+			ack.mid = message.mid
+			ack.code = defines.Codes.EMPTY.number
+			ack.destination = message.source
+			self.transport.sendto(Serializer.serialize(ack))
+		if message.code == defines.Codes.EMPTY.number:	# empty ACK, the response follows separately
+			return
+		token = message.token.decode() if isinstance(message.token, bytes) else message.token
+		if (future := self.pending.pop(token, None)) and not future.done():
+			future.set_result(message)
+
+
+	async def request(self, operation:Operation, url:str, originator:str, ty:T = None, data:JSON = None) -> Optional[Tuple[STRING|JSON, int]]:
+		"""	Send a confirmable request and wait for the response. The request is retransmitted with
+			exponential backoff if there is no response.
+
+			Return:
+				Tuple (response content, response status code), or None if the request was lost.
+		"""
+		request = buildCoapRequest(operation, url, originator, ty, data)
+		self.mid = (self.mid + 1) & 0xffff
+		self.tokenCounter = (self.tokenCounter + 1) & 0xffff
+		request.mid = self.mid
+		request.token = f'{self.index & 0xffff:04x}{self.tokenCounter:04x}'	# the device's index in the upper half
+		datagram = Serializer.serialize(request)
+		future = asyncio.get_running_loop().create_future()
+		self.pending[request.token] = future
+
+		self.stats.sent += 1
+		startTime = time.perf_counter()
+		timeout = defines.ACK_TIMEOUT * random.uniform(1.0, defines.ACK_RANDOM_FACTOR)
+		try:
+			for attempt in range(defines.MAX_RETRANSMIT + 1):
+				if attempt > 0:
+					self.stats.retransmissions += 1
+				self.transport.sendto(datagram)
+				try:
+					response = await asyncio.wait_for(asyncio.shield(future), timeout)
+					self.stats.latencies.record(time.perf_counter() - startTime)
+					return parseCoapResponse(response)
+				except asyncio.TimeoutError:
+					timeout *= 2
+			self.stats.lost += 1
+			return None
+		finally:
+			self.pending.pop(request.token, None)
+
+
+	def check(self, result:Optional[Tuple[STRING|JSON, int]], expected:RC) -> bool:
+		if result is None:
+			return False
+		if result[1] != expected:
+			self.stats.errors += 1
+			return False
+		return True
+
+
+	async def register(self, timeSeries:bool) -> bool:
+		"""	Register the device's AE and create its container.
+		"""
+		ae = { 'm2m:ae': { 'rn': self.aern, 'api': APPID, 'rr': False, 'srv': [ RELEASEVERSION ] }}
+		if not self.check(await self.request(Operation.CREATE, self.url, self.originator, T.AE, ae), RC.CREATED):
+			return False
+		if timeSeries:
+			container = { 'm2m:ts': { 'rn': 'data', 'mni': 10 }}
+		else:
+			container = { 'm2m:cnt': { 'rn': 'data', 'mni': 10 }}
+		return self.check(await self.request(Operation.CREATE, f'{self.url}/{self.aern}', self.originator, T.TS if timeSeries else T.CNT, container), RC.CREATED)
+
+
+	async def upload(self, timeSeries:bool) -> None:
+		value = str(random.randint(0, 100))
+		if timeSeries:
+			self.check(await self.request(Operation.CREATE, self.containerURL, self.originator, T.TSI, { 'm2m:tsi': { 'dgt': DateUtils.getResourceDate(), 'con': value }}), RC.CREATED)
+		else:
+			self.check(await self.request(Operation.CREATE, self.containerURL, self.originator, T.CIN, { 'm2m:cin': { 'con': value }}), RC.CREATED)
+
+
+	async def run(self, duration:float, interval:float, jitter:float, timeSeries:bool) -> None:
+		"""	Upload data periodically until the duration has passed. The first upload is at a random
+			time within the first interval, so that the devices don't all send at the same time.
+		"""
+		loop = asyncio.get_running_loop()
+		end = loop.time() + duration
+		nextTime = loop.time() + random.uniform(0, interval)
+		while nextTime < end:
+			await asyncio.sleep(max(0.0, nextTime - loop.time()))
+			await self.upload(timeSeries)
+			nextTime += interval * random.uniform(1.0 - jitter, 1.0 + jitter)
+
+
+	async def deregister(self) -> None:
+		await self.request(Operation.DELETE, f'{self.url}/{self.aern}', ORIGINATOR)
+
+
+async def runFleet(devices:list[Device], duration:float, interval:float, jitter:float, timeSeries:bool, concurrency:int) -> Tuple[int, float]:
+	"""	Register all devices, run the uploads, and deregister the devices again.
+
+		Args:
+			devices: The devices.
+			duration: The duration of the upload phase in seconds.
+			interval: The mean interval between two uploads of a device in seconds.
+			jitter: The relative jitter of the interval, e.g. 0.1 for +/- 10%.
+			timeSeries: If True then upload <timeSeriesInstance> resources, otherwise <contentInstance> resources.
+			concurrency: The maximum number of concurrent registrations and deregistrations.
+
+		Return:
+			Tuple (number of registered devices, duration of the upload phase)
+	"""
+	semaphore = asyncio.Semaphore(concurrency)
+
+	async def _limited(coroutine) -> bool:	# type:ignore[no-untyped-def]
+		async with semaphore:
+			return await coroutine
+
+	await asyncio.gather(*[ d.open() for d in devices ])
+	try:
+		registered = [ d for d, ok in zip(devices, await asyncio.gather(*[ _limited(d.register(timeSeries)) for d in devices ])) if ok ]
+		for d in registered:	# only count the uploads
+			d.stats = DeviceStats()
+		startTime = time.perf_counter()
+		await asyncio.gather(*[ d.run(duration, interval, jitter, timeSeries) for d in registered ])
+		uploadTime = time.perf_counter() - startTime
+		await asyncio.gather(*[ _limited(d.deregister()) for d in devices ])
+		return len(registered), uploadTime
+	finally:
+		for d in devices:
+			d.close()
+
+
+if __name__ == '__main__':
+	console = Console()
+
+	parser = argparse.ArgumentParser(description = 'Simulate a fleet of CoAP devices')
+	parser.add_argument('--url', action = 'store', dest = 'url', default = defaultURL, help = f'the CSEBase\'s CoAP URL (default: {defaultURL})')
+	parser.add_argument('--devices', '-n', action = 'store', dest = 'devices', type = int, default = 100, help = 'number of devices (default: 100)')
+	parser.add_argument('--duration', action = 'store', dest = 'duration', type = float, default = 60.0, help = 'duration of the upload phase in seconds (default: 60)')
+	parser.add_argument('--interval', action = 'store', dest = 'interval', type = float, default = 10.0, help = 'mean upload interval per device in seconds (default: 10)')
+	parser.add_argument('--jitter', action = 'store', dest = 'jitter', type = float, default = 0.1, help = 'relative jitter of the upload interval (default: 0.1)')
+	parser.add_argument('--tsi', action = 'store_true', dest = 'timeSeries', default = False, help = 'upload <timeSeriesInstance> instead of <contentInstance> resources')
+	parser.add_argument('--concurrency', action = 'store', dest = 'concurrency', type = int, default = 50, help = 'maximum number of concurrent registrations (default: 50)')
+	parser.add_argument('--show-devices', action = 'store', dest = 'showDevices', type = int, default = 10, help = 'show the n devices with the most losses and highest latencies (default: 10)')
+	parser.add_argument('--json', action = 'store', dest = 'jsonFile', default = None, metavar = 'FILE', help = 'also write the per-device and aggregate results to a JSON file')
+	args = parser.parse_args()
+
+	tag = uuid.uuid4().hex[:6]
+	devices = [ Device(i, args.url, tag) for i in range(args.devices) ]
+	console.print(f'[bright_blue]Running [bold]{args.devices}[/bold] devices against {args.url} for {args.duration:g} s')
+	registered, uploadTime = asyncio.run(runFleet(devices, args.duration, args.interval, args.jitter, args.timeSeries, args.concurrency))
+
+	total = mergeHistograms([ d.stats.latencies for d in devices ])
+	sent = sum([ d.stats.sent for d in devices ])
+	lost = sum([ d.stats.lost for d in devices ])
+
+	def _row(name:str, stats:DeviceStats, histogram:LatencyHistogram, sent:int) -> list[str]:
+		s = histogram.summary()
+		return [ name,
+				 f'{sent}',
+				 f'{stats.retransmissions}',
+				 f'{stats.lost} ({stats.lost / sent * 100 if sent else 0:.1f}%)',
+				 f'{stats.errors}',
+				 f'{s["p50"]*1000:7.2f} | {s["p90"]*1000:7.2f} | {s["p99"]*1000:7.2f} | {s["max"]*1000:7.2f}' ]
+
+	table = Table(show_header = True, header_style = 'bright_blue', title = f'CoAP fleet: {registered}/{args.devices} devices registered, {sent / uploadTime if uploadTime else 0:.1f} uploads/s')
+	table.add_column('Device', no_wrap = True)
+	table.add_column('Uploads', justify = 'right')
+	table.add_column('Retransmissions', justify = 'right')
+	table.add_column('Lost', justify = 'right')
+	table.add_column('Errors', justify = 'right')
+	table.add_column('Latency ms\np50 | p90 | p99 | Max', justify = 'center')
+	worst = sorted(devices, key = lambda d: (d.stats.lost, d.stats.latencies.percentile(99)), reverse = True)[:args.showDevices]
+	for d in worst:
+		table.add_row(*_row(d.aern, d.stats, d.stats.latencies, d.stats.sent))
+	table.add_section()
+	table.add_row(*_row('All devices',
+						DeviceStats(total, sent, sum([ d.stats.retransmissions for d in devices ]), lost, sum([ d.stats.errors for d in devices ])),
+						total,
+						sent),
+				  style = 'bold')
+	console.print(table)
+
+	if args.jsonFile:
+		with open(args.jsonFile, 'w', encoding = 'utf-8') as f:
+			json.dump({ 'devices': { d.aern: dict(d.stats.latencies.summary(), sent = d.stats.sent, retransmissions = d.stats.retransmissions, lost = d.stats.lost, errors = d.stats.errors)
+									 for d in devices },
+						'total': dict(total.summary(), sent = sent, lost = lost, registered = registered, uploadTime = uploadTime) }, f, indent = 1)
@@ -7,6 +7,8 @@
 #	Configurations for unit tests
 #
 
+import os
+
 BINDING						= 'http'	# possible values: http, https, mqtt, ws
 
 match BINDING:
@@ -59,6 +61,7 @@ ORIGINATORNotifResp		= 'CTester'			# Originator for Notification responses
 RECONFIGURATIONENABLED	= True				# The CSE allowes for reconfigurations via Upper Tester
 UPPERTESTERENABLED		= True				# Enable or Disable Upper Tester extensions
 RELEASEVERSION			= '4'				# or '5', Supported Release Version for requests & registrations
+NAMESPACE				= os.environ.get('ACMETEST_NAMESPACE', '')	# Prefix for the test resource names. Set by runTests.py for parallel runs
 
 
 #
@@ -96,7 +99,28 @@ MQTTREGRESPONSETOPIC= f'/oneM2M/reg_resp/{mqttClientID}{CSEID}/json'
 
 wsAddress			= 'localhost'
 wsPort				= 8180
-wsSubProtocols		= ('oneM2M.json',)
+wsSerialization		= 'json'			# possible values: json, cbor. CBOR is sent in binary frames
+wsSubProtocols		= (f'oneM2M.{wsSerialization}',)
+wsCompression		= True				# Negotiate the permessage-deflate extension
+wsClientMaxWindowBits	= None			# 8..15, or None for the default (15)
+wsServerMaxWindowBits	= None			# 8..15, or None for the default (15)
+wsCompressionLevel	= None				# zlib compression level 1..9, or None for the default
+wsMemLevel			= None				# zlib memory level 1..9, or None for the default
+wsMaxSize			= 2**24				# Maximum size of a received message (bytes), eg. for large discovery results
+
+##############################################################################
+
+#
+#	Binding benchmark (benchmark.py)
+#	The CSEBase URLs for the bindings that are compared
+#
+
+BENCHMARKURLS		= {
+	'http':		f'http://localhost:8080/{CSERN}',
+	'mqtt':		f'mqtt://{mqttAddress}:{mqttPort}/{CSERN}',
+	'ws':		f'ws://{wsAddress}:{wsPort}/{CSERN}',
+	'coap':		f'coap://localhost:5683/{CSERN}',
+}
 
 ##############################################################################
 
@@ -144,7 +168,7 @@ REMOTEORIGINATOR	= 'CAdmin'
 #	Notification Server
 #
 
-NOTIFICATIONPORT 	= 9990
+NOTIFICATIONPORT 	= int(os.environ.get('ACMETEST_NOTIFICATIONPORT', 9990))	# Set by runTests.py for parallel runs
 NOTIFICATIONSERVER	= f'{NOTIFICATIONPROTOCOL}://localhost:{NOTIFICATIONPORT}' 
 NOTIFICATIONSERVERW	= f'{NOTIFICATIONPROTOCOL}://localhost:6666'
 NOTIFICATIONDELAY   = 0.5	# Time to wait for some async notifications
@@ -156,3 +180,4 @@ NOTIFICATIONDELAY   = 0.5	# Time to wait for some async notifications
 UTURL	= f'{CONFIGPROTOCOL}://localhost:8080/__ut__'	# CSE's Upper Tester URL
 UTCMD	= 'X-M2M-UTCMD'
 UTRSP	= 'X-M2M-UTRSP'
+UTASYNC	= False		# Send the testCaseStart/testCaseEnd commands without waiting for the response. They are then not ordered with the test's requests
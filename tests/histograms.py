@@ -0,0 +1,156 @@
+#
+#	histograms.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Log-bucketed latency histograms for the test suites, in the style of HDR histograms.
+#
+
+from __future__ import annotations
+from typing import Optional
+import math
+
+
+percentiles = ( 50.0, 90.0, 99.0, 99.9 )
+""" The percentiles that are reported in the summaries. """
+
+
+class LatencyHistogram:
+	"""	A histogram of latencies with logarithmic buckets.
+
+		Each power of two is divided into 2^subBucketBits linear sub-buckets, so the relative error
+		of a recorded value is at most 1/2^subBucketBits, independent of its magnitude. Values are
+		recorded in microseconds. Only buckets that have been used are stored, and recording
+		a value takes constant time.
+	"""
+
+	def __init__(self, subBucketBits:int = 7) -> None:
+		self.subBucketBits = subBucketBits
+		self.subBucketCount = 1 << subBucketBits
+		self.buckets:dict[int, int] = {}
+		self.count = 0
+		self.total = 0		# Sum of all recorded values in microseconds
+		self.min = 0
+		self.max = 0
+
+
+	def _index(self, value:int) -> int:
+		m, e = math.frexp(value)	# value = m * 2^e, 0.5 <= m < 1
+		return (e << self.subBucketBits) + int((m - 0.5) * 2 * self.subBucketCount)
+
+
+	def _upperBound(self, index:int) -> int:
+		e, sub = divmod(index, self.subBucketCount)
+		return math.ceil((0.5 + (sub + 1) / (2 * self.subBucketCount)) * (1 << e))
+
+
+	def record(self, duration:float) -> None:
+		"""	Record a latency.
+
+			Args:
+				duration: The latency in seconds.
+		"""
+		value = max(1, int(duration * 1000000))
+		index = self._index(value)
+		self.buckets[index] = self.buckets.get(index, 0) + 1
+		if self.count == 0 or value < self.min:
+			self.min = value
+		if value > self.max:
+			self.max = value
+		self.count += 1
+		self.total += value
+
+
+	def merge(self, other:LatencyHistogram) -> LatencyHistogram:
+		"""	Add the recorded values of another histogram with the same resolution to this histogram.
+
+			Args:
+				other: The histogram to merge.
+
+			Return:
+				This histogram.
+		"""
+		if other.count == 0:
+			return self
+		for index, count in other.buckets.items():
+			self.buckets[index] = self.buckets.get(index, 0) + count
+		self.min = other.min if self.count == 0 else min(self.min, other.min)
+		self.max = max(self.max, other.max)
+		self.count += other.count
+		self.total += other.total
+		return self
+
+
+	def percentile(self, p:float) -> float:
+		"""	Return the value at a percentile. The value is the upper bound of the bucket
+			that contains the percentile, but not larger than the maximum recorded value.
+
+			Args:
+				p: The percentile, from 0.0 to 100.0.
+
+			Return:
+				The latency in seconds, or 0.0 if no value has been recorded.
+		"""
+		if self.count == 0:
+			return 0.0
+		rank = max(1, math.ceil(self.count * p / 100.0))
+		seen = 0
+		for index in sorted(self.buckets):
+			seen += self.buckets[index]
+			if seen >= rank:
+				return min(self._upperBound(index), self.max) / 1000000.0
+		return self.max / 1000000.0
+
+
+	def summary(self) -> dict[str, float]:
+		"""	Return the count, mean, maximum and the reported percentiles. The times are in seconds.
+
+			Return:
+				Dictionary with the summary values.
+		"""
+		result:dict[str, float] = { 'count': self.count,
+									'mean': self.total / self.count / 1000000.0 if self.count else 0.0 }
+		for p in percentiles:
+			result[f'p{p:g}'] = self.percentile(p)
+		result['max'] = self.max / 1000000.0
+		return result
+
+
+	def toDict(self) -> dict:
+		"""	Return the histogram as a JSON serializable dictionary.
+		"""
+		return { 'subBucketBits': self.subBucketBits,
+				 'count': self.count,
+				 'total': self.total,
+				 'min': self.min,
+				 'max': self.max,
+				 'buckets': { str(i):c for i, c in self.buckets.items() } }
+
+
+	@classmethod
+	def fromDict(cls, data:dict) -> LatencyHistogram:
+		"""	Create a histogram from a dictionary returned by *toDict()*.
+		"""
+		histogram = cls(data['subBucketBits'])
+		histogram.buckets = { int(i):c for i, c in data['buckets'].items() }
+		histogram.count = data['count']
+		histogram.total = data['total']
+		histogram.min = data['min']
+		histogram.max = data['max']
+		return histogram
+
+
+def mergeHistograms(histograms:list[LatencyHistogram], into:Optional[LatencyHistogram] = None) -> LatencyHistogram:
+	"""	Merge a list of histograms into a new or an existing histogram.
+
+		Args:
+			histograms: The histograms to merge.
+			into: Optional histogram to merge into. A new histogram is created if this is None.
+
+		Return:
+			The merged histogram.
+	"""
+	result = into if into is not None else LatencyHistogram()
+	for h in histograms:
+		result.merge(h)
+	return result
@@ -0,0 +1,280 @@
+#
+#	idstore.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	A compact store for the identifiers of created resources, e.g. (ri, rn) pairs in load tests.
+#
+
+from __future__ import annotations
+from typing import Iterable, Iterator, Optional, Tuple
+
+import mmap, tempfile
+from array import array
+from threading import Lock
+
+
+spillThreshold = 64 * 1024 * 1024
+""" Default size in bytes after which the encoded identifiers are moved to a memory-mapped file. """
+
+maxPrefixes = 65536
+""" Maximum number of interned prefixes. Further identifiers are stored without a prefix. """
+
+
+def _splitIdentifier(identifier:str) -> Tuple[str, str]:
+	"""	Split an identifier into its non-digit prefix, e.g. a resource type's short name, and the rest.
+	"""
+	for i, c in enumerate(identifier):
+		if c.isdigit():
+			return identifier[:i], identifier[i:]
+	return identifier, ''
+
+
+def _appendVarint(buffer:bytearray, value:int) -> None:
+	while value > 0x7f:
+		buffer.append((value & 0x7f) | 0x80)
+		value >>= 7
+	buffer.append(value)
+
+
+def _readVarint(buffer:bytes|bytearray|mmap.mmap, offset:int) -> Tuple[int, int]:
+	value = shift = 0
+	while True:
+		b = buffer[offset]
+		offset += 1
+		value |= (b & 0x7f) << shift
+		if b < 0x80:
+			return value, offset
+		shift += 7
+
+
+class IdentifierStore:
+	"""	Append-only store for tuples of identifier strings, e.g. (ri, rn) pairs.
+
+		Each tuple is encoded into a single byte arena. The non-digit prefix of each identifier
+		(e.g. "cnt" of "cnt1234567") is interned in a table, and a purely numerical rest is stored
+		as a varint instead of a string. An entry costs its encoded size plus 9 bytes for its offset
+		and its deleted flag, compared to well over 100 bytes for a tuple of two strings.
+
+		Entries are addressed by their slot, i.e. the position at which they were appended. Removing
+		an entry only marks its slot as deleted, so removal takes constant time and the slots of the
+		other entries don't change. Iteration skips deleted entries.
+
+		When the arena grows beyond *spillThreshold* bytes it is moved to a memory-mapped temporary file,
+		so that the operating system can page it out. The file is removed when the store is cleared or closed.
+
+		The store can be used by several threads concurrently.
+	"""
+
+	def __init__(self, items:Iterable[Tuple[str, ...]] = (), spillThreshold:int = spillThreshold, directory:Optional[str] = None) -> None:
+		"""	Create a store.
+
+			Args:
+				items: Optional tuples to add.
+				spillThreshold: Size of the arena in bytes after which it is moved to a memory-mapped file.
+				directory: Directory for the memory-mapped file. The default is the system's temporary directory.
+		"""
+		self.spillThreshold = spillThreshold
+		self.directory = directory
+		self.lock = Lock()
+		self._reset()
+		self.extend(items)
+
+
+	def _reset(self) -> None:
+		self.prefixes:list[str] = [ '' ]
+		self.prefixIndex:dict[str, int] = { '': 0 }
+		self.offsets = array('Q')
+		self.deleted = bytearray()
+		self.live = 0
+		self.arena:bytearray|mmap.mmap = bytearray()
+		self.size = 0				# Used bytes of the arena
+		self.file = None
+
+
+	#########################################################################
+	#
+	#	Encoding
+	#
+
+	def _encode(self, item:Tuple[str, ...]) -> bytearray:
+		record = bytearray()
+		_appendVarint(record, len(item))
+		for identifier in item:
+			prefix, rest = _splitIdentifier(identifier)
+			if (pid := self.prefixIndex.get(prefix)) is None:
+				if len(self.prefixes) < maxPrefixes:
+					pid = self.prefixIndex[prefix] = len(self.prefixes)
+					self.prefixes.append(prefix)
+				else:
+					pid, rest = 0, identifier
+			if rest.isdigit() and rest.isascii() and (rest == '0' or rest[0] != '0'):	# round-trips as an integer
+				_appendVarint(record, pid << 1 | 1)
+				_appendVarint(record, int(rest))
+			else:
+				data = rest.encode('utf-8')
+				_appendVarint(record, pid << 1)
+				_appendVarint(record, len(data))
+				record.extend(data)
+		return record
+
+
+	def _decode(self, offset:int) -> Tuple[str, ...]:
+		arena = self.arena
+		count, offset = _readVarint(arena, offset)
+		result = []
+		for _ in range(count):
+			value, offset = _readVarint(arena, offset)
+			prefix = self.prefixes[value >> 1]
+			if value & 1:
+				number, offset = _readVarint(arena, offset)
+				result.append(f'{prefix}{number}')
+			else:
+				length, offset = _readVarint(arena, offset)
+				result.append(prefix + bytes(arena[offset:offset + length]).decode('utf-8'))
+				offset += length
+		return tuple(result)
+
+
+	#########################################################################
+	#
+	#	Arena
+	#
+
+	def _write(self, record:bytearray) -> int:
+		offset = self.size
+		end = offset + len(record)
+		if self.file is None:
+			if end <= self.spillThreshold:
+				self.arena.extend(record)		# type: ignore [union-attr]
+				self.size = end
+				return offset
+			self._spill(end)
+		elif end > len(self.arena):
+			self._grow(end)
+		self.arena[offset:end] = record
+		self.size = end
+		return offset
+
+
+	def _spill(self, required:int) -> None:
+		"""	Move the arena to a memory-mapped temporary file.
+		"""
+		self.file = tempfile.TemporaryFile(dir = self.directory)
+		data = self.arena
+		self.arena = bytearray()
+		self._grow(required)
+		self.arena[:len(data)] = data
+
+
+	def _grow(self, required:int) -> None:
+		capacity = max(required, 2 * len(self.arena), mmap.PAGESIZE)
+		if isinstance(self.arena, mmap.mmap):
+			self.arena.close()
+		self.file.truncate(capacity)				# type: ignore [attr-defined]
+		self.arena = mmap.mmap(self.file.fileno(), capacity)	# type: ignore [attr-defined]
+
+
+	#########################################################################
+	#
+	#	List-like interface
+	#
+
+	def append(self, item:Tuple[str, ...]) -> int:
+		"""	Add a tuple of identifiers.
+
+			Args:
+				item: The identifiers.
+
+			Return:
+				The new entry's slot.
+		"""
+		with self.lock:
+			offset = self._write(self._encode(item))
+			self.offsets.append(offset)
+			self.deleted.append(0)
+			self.live += 1
+			return len(self.offsets) - 1
+
+
+	def extend(self, items:Iterable[Tuple[str, ...]]) -> None:
+		for item in items:
+			self.append(item)
+
+
+	def __getitem__(self, slot:int) -> Tuple[str, ...]:
+		with self.lock:
+			if self.deleted[slot]:
+				raise KeyError(f'slot {slot} is deleted')
+			return self._decode(self.offsets[slot])
+
+
+	def __delitem__(self, slot:int) -> None:
+		"""	Mark an entry as deleted. This takes constant time.
+		"""
+		with self.lock:
+			if self.deleted[slot]:
+				raise KeyError(f'slot {slot} is deleted')
+			self.deleted[slot] = 1
+			self.live -= 1
+
+
+	def __len__(self) -> int:
+		return self.live
+
+
+	def __iter__(self) -> Iterator[Tuple[str, ...]]:
+		for _, item in self.items():
+			yield item
+
+
+	def items(self, start:int = 0, stop:Optional[int] = None, step:int = 1) -> Iterator[Tuple[int, Tuple[str, ...]]]:
+		"""	Iterate over the entries that are not deleted, in the order they were added.
+
+			Entries that are added or deleted during the iteration may or may not be returned.
+
+			Args:
+				start, stop, step: Optional range of slots to iterate over.
+
+			Return:
+				Iterator of (slot, identifiers) tuples.
+		"""
+		for slot in range(start, len(self.offsets) if stop is None else min(stop, len(self.offsets)), step):
+			with self.lock:
+				if self.deleted[slot]:
+					continue
+				item = self._decode(self.offsets[slot])
+			yield slot, item
+
+
+	def clear(self) -> None:
+		"""	Remove all entries and release the memory-mapped file.
+		"""
+		with self.lock:
+			self._close()
+			self._reset()
+
+
+	def close(self) -> None:
+		self.clear()
+
+
+	def _close(self) -> None:
+		if isinstance(self.arena, mmap.mmap):
+			self.arena.close()
+		if self.file:
+			self.file.close()
+
+
+	@property
+	def spilled(self) -> bool:
+		"""	True if the arena has been moved to a memory-mapped file.
+		"""
+		return self.file is not None
+
+
+	@property
+	def nbytes(self) -> int:
+		"""	The approximate memory used by the store's arrays and arena, in bytes.
+		"""
+		return self.offsets.itemsize * len(self.offsets) + len(self.deleted) + self.size
@@ -11,17 +11,20 @@ from __future__ import annotations
 from typing import Any, Callable, Tuple, cast, Optional
 
 from urllib.parse import ParseResult, urlparse, parse_qs
+from functools import lru_cache
+from abc import ABC, abstractmethod
 import sys, io, atexit, base64
 import unittest
 
 from rich.console import Console
-import requests, sys, json, time, ssl, urllib3, random, re, random
+import requests, sys, json, time, ssl, urllib3, random, re, random, queue
 from datetime import datetime, timezone
-from threading import Thread
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from threading import Thread, Event, Lock, Condition
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import deque
 import cbor2
 from websockets.sync.client import connect, ClientConnection
-from websockets.sync.connection import Connection as WSConnection
 from websockets.exceptions import ConnectionClosed
 
 # sys.path.append('../acme')
@@ -34,6 +37,9 @@ from acme.helpers.MQTTConnection import MQTTConnection, MQTTHandler
 from acme.etc.Constants import Constants as C
 from acme.etc.ResponseStatusCodes import INTERNAL_SERVER_ERROR
 from config import *
+from histograms import LatencyHistogram
+import tracing
+import wsdeflate
 
 # CoAP Libraries
 sys.path.append('./coapthon')
@@ -148,7 +154,9 @@ class MQTTClientHandler(MQTTHandler):
 	
 	def _callback(self, connection:MQTTConnection, topic:str, data:bytes) -> None:
 		# print(f'<== {topic} / {data}')
+		t = tracing.now()
 		resp = RequestUtils.deserializeData(data, ContentSerializationType.JSON)
+		tracing.complete('parse', 'binding', t)
 		if 'rqi' in resp:
 			self.responses[resp['rqi']] = (topic, resp)
 		else:
@@ -195,6 +203,24 @@ class MQTTClientHandler(MQTTHandler):
 # MQTT Connection
 mqttClient:MQTTConnection = None
 mqttHandler:MQTTClientHandler = None
+_mqttLock = Lock()
+
+
+def startMqttClient() -> None:
+	"""	Start the MQTT client and wait until it is connected. This is only done once, when
+		the first MQTT request is sent.
+	"""
+	global mqttClient, mqttHandler
+	with _mqttLock:
+		if mqttClient:
+			return
+		handler = MQTTClientHandler()
+		client = MQTTConnection(mqttAddress, mqttPort, clientID=mqttClientID, username=mqttUsername, password=mqttPassword, messageHandler=handler)
+		client.run()
+		while not handler.connection:
+			time.sleep(0.05)
+		mqttHandler = handler
+		mqttClient = client
 
 
 # HTTP Session
@@ -223,30 +249,30 @@ console = Console()
 
 ###############################################################################
 
-actrRN	= 'testACTR'
-aeRN	= 'testAE'
-acpRN	= 'testACP'
-batRN	= 'testBAT'
-cinRN	= 'testCIN'
-cntRN	= 'testCNT'
-crsRN	= 'testCRS'
-csrRN	= 'testCSR'
-deprRN	= 'testDEPR'
-fcntRN	= 'testFCNT'
-grpRN	= 'testGRP'
-lcpRN	= 'testLCP'
-nodRN 	= 'testNOD'
-pchRN 	= 'testPCH'
-prmrRN	= 'testPRMR'
-reqRN	= 'testREQ'
-schRN 	= 'testSCH'
-smdRN	= 'testSMD'
-subRN	= 'testSUB'
-tsRN	= 'testTS'
-tsbRN	= 'testTSB'
-tsiRN	= 'testTSI'
-memRN	= 'testMEM'
-wificRN	= 'testWIFIC'
+actrRN	= f'{NAMESPACE}testACTR'
+aeRN	= f'{NAMESPACE}testAE'
+acpRN	= f'{NAMESPACE}testACP'
+batRN	= f'{NAMESPACE}testBAT'
+cinRN	= f'{NAMESPACE}testCIN'
+cntRN	= f'{NAMESPACE}testCNT'
+crsRN	= f'{NAMESPACE}testCRS'
+csrRN	= f'{NAMESPACE}testCSR'
+deprRN	= f'{NAMESPACE}testDEPR'
+fcntRN	= f'{NAMESPACE}testFCNT'
+grpRN	= f'{NAMESPACE}testGRP'
+lcpRN	= f'{NAMESPACE}testLCP'
+nodRN 	= f'{NAMESPACE}testNOD'
+pchRN 	= f'{NAMESPACE}testPCH'
+prmrRN	= f'{NAMESPACE}testPRMR'
+reqRN	= f'{NAMESPACE}testREQ'
+schRN 	= f'{NAMESPACE}testSCH'
+smdRN	= f'{NAMESPACE}testSMD'
+subRN	= f'{NAMESPACE}testSUB'
+tsRN	= f'{NAMESPACE}testTS'
+tsbRN	= f'{NAMESPACE}testTSB'
+tsiRN	= f'{NAMESPACE}testTSI'
+memRN	= f'{NAMESPACE}testMEM'
+wificRN	= f'{NAMESPACE}testWIFIC'
 
 
 cseURL 	= f'{CSEURL}{CSERN}'
@@ -287,12 +313,17 @@ def shutdown() -> None:
 	"""	Shutdown the system. 
 	"""
 	global mqttClient
+	_oauthRefreshStop.set()
+	stopRecording()
+	registry.close()
+	upperTester.flush()
+	upperTester.close()
 	if mqttClient:
 		mqttClient.shutdown()
 		mqttClient = None
 	
-	for _, websocket in websockets.items():
-		websocket.close()
+	for _, handler in websockets.items():
+		handler.close()
 
 ###############################################################################
 
@@ -301,6 +332,7 @@ def shutdown() -> None:
 #
 
 requestCount:int = 0
+requestCacheSize:int = 1024		# Number of compiled request URLs to cache
 
 def _RETRIEVE(url:str, originator:str, timeout:float=None, headers:Parameters=None) -> Tuple[str|JSON, int]:
 	return sendRequest(Operation.RETRIEVE, url, originator, timeout=timeout, headers=headers)
@@ -338,82 +370,540 @@ def DELETE(url:str, originator:str, headers:Parameters=None) -> Tuple[JSON, int]
 
 
 def sendRequest(operation:Operation, url:str, originator:str, ty:ResourceTypes=None, data:JSON|str=None, ct:str=None, timeout:float=None, headers:Parameters=None) -> Tuple[STRING|JSON, int]:	# type: ignore # TODO Constants
-	"""	Send a request. Call the appropriate framework, depending on the protocol.
+	"""	Send a request. Call the appropriate transport, depending on the URL's scheme.
 	"""
-	global requestCount, httpSession
+	global requestCount
 	requestCount += 1
-	if url.startswith(('http', 'https')):
+	if not (transport := getTransport(url)):
+		print('ERROR')
+		return None, 5103
+
+	if (rec := recorder):
+		recordedHeaders = dict(headers) if headers else None	# copy, because the bindings remove some headers
+		recordedTime = time.time()
+	startTime = time.perf_counter()
+	with tracing.span(operation.name, 'request', { 'url': url, 'binding': transport.name }):
+		result = transport.send(RequestPrimitive(operation, url, originator, ty, data, ct, timeout, headers))
+	duration = time.perf_counter() - startTime
+	transport.metrics.record(duration, result[1])
+	recordLatency(f'{transport.name} {operation.name} {ty.name if isinstance(ty, ResourceTypes) else ty or ""}'.rstrip(), duration)
+	if rec:
+		rec.record(recordedTime, duration, RequestPrimitive(operation, url, originator, ty, data, ct, timeout, recordedHeaders), result)
+	if operation in (Operation.CREATE, Operation.DELETE):
+		registry.register(operation, url, originator, ty, result)
+	return result
+
+
+###############################################################################
+#
+#	Request recording
+#
+
+class RequestRecorder:
+	"""	Append-only recorder for the sent requests. Each request is written as a compact JSON
+		line with the keys:
+
+		- ts: The time the request was sent (seconds since the epoch)
+		- op, to, fr, ty, pc, ct, hd: The operation, target, originator, resource type, content,
+		  content type and additional headers of the request
+		- dur, rsc: The request's duration in seconds and the response status code
+		- ids: For successful CREATE requests the *ri* and *aei* of the created resource
+
+		The recording can be replayed with *replay.py*.
+	"""
+
+	def __init__(self, filename:str) -> None:
+		self.file = open(filename, 'a', encoding = 'utf-8')
+		self.lock = Lock()
+
+
+	def record(self, sendTime:float, duration:float, primitive:RequestPrimitive, result:Tuple[STRING|JSON, int]) -> None:
+		entry:JSON = { 'ts': round(sendTime, 6), 'op': primitive.operation.value, 'to': primitive.url, 'fr': primitive.originator }
+		if primitive.ty is not None:		entry['ty'] = int(primitive.ty)
+		if primitive.data is not None:		entry['pc'] = primitive.data
+		if primitive.ct is not None:		entry['ct'] = primitive.ct
+		if primitive.headers:				entry['hd'] = primitive.headers
+		entry['dur'] = round(duration, 6)
+		entry['rsc'] = result[1]
+		if primitive.operation == Operation.CREATE and result[1] == ResponseStatusCode.CREATED and isinstance(result[0], dict) and len(result[0]) == 1:
+			resource = next(iter(result[0].values()))
+			if isinstance(resource, dict) and (ids := { k:resource[k] for k in ('ri', 'aei') if k in resource }):
+				entry['ids'] = ids
+		line = json.dumps(entry, separators = (',', ':'), default = str)
+		with self.lock:
+			self.file.write(line + '\n')
+
+
+	def close(self) -> None:
+		with self.lock:
+			self.file.close()
+
+
+recorder:Optional[RequestRecorder] = None
+
+
+def startRecording(filename:str) -> None:
+	"""	Start recording all sent requests to a file. The file is appended to.
+
+		Args:
+			filename: The recording's file name.
+	"""
+	global recorder
+	stopRecording()
+	recorder = RequestRecorder(filename)
+
+
+def stopRecording() -> None:
+	global recorder
+	if recorder:
+		recorder.close()
+		recorder = None
+
+
+###############################################################################
+#
+#	Registry of created resources
+#
+
+class ResourceRegistry:
+	"""	Registry of the resources that were created during a test run. Every successful CREATE
+		request is registered automatically with the created resource's *ri*, its parent's *ri*
+		and its structured URL. A successful DELETE request removes the resource and all its
+		registered descendants, so that only the resources that still exist are kept in memory.
+
+		At the end of a run the remaining resources can be removed by deleting only the
+		top-level resources, i.e. the resources whose parents were not created by the run.
+
+		The registry can be persisted to a journal file, so that the resources of a crashed
+		run can still be removed later. Each line of the journal is a JSON object, either a
+		registration with the keys ri, pi, url, fr and ty, or a deletion with the key del.
+	"""
+
+	def __init__(self) -> None:
+		self.resources:dict[str, Tuple[str, str]] = {}	# ri -> (pi, structured URL) of the existing resources
+		self.urls:dict[str, str] = {}					# structured URL -> ri
+		self.children:dict[str, set[str]] = {}			# pi -> ri of the registered children
+		self.foreignDeletions:list[str] = []			# Deleted resources that are not registered here, see markDeleted()
+		self.file:Optional[io.TextIOWrapper] = None
+		self.lock = Lock()
+
+
+	def persist(self, filename:str) -> None:
+		"""	Append all further registrations and deletions to a journal file.
+
+			Args:
+				filename: The journal's file name.
+		"""
+		with self.lock:
+			if self.file:
+				self.file.close()
+			self.file = open(filename, 'a', encoding = 'utf-8', buffering = 1)	# line buffered, so that a crash doesn't lose entries
+
+
+	@property
+	def journal(self) -> Optional[str]:
+		"""	The file name of the journal, or None if the registry is not persisted.
+		"""
+		return self.file.name if self.file else None	# type: ignore [return-value]
+
+
+	def load(self, filename:str) -> int:
+		"""	Add the registrations and deletions of a journal file, e.g. from an earlier run.
+
+			Args:
+				filename: The journal's file name.
+
+			Return:
+				The number of registered resources that are not deleted. 0 if the file doesn't exist.
+		"""
+		try:
+			with open(filename, encoding = 'utf-8') as f:
+				for line in f:
+					try:
+						entry = json.loads(line)
+					except ValueError:
+						continue	# e.g. an incomplete last line after a crash
+					with self.lock:
+						if (ri := entry.get('del')):
+							self._remove(ri)
+						else:
+							self._add(entry['ri'], entry['pi'], entry['url'])
+		except FileNotFoundError:
+			return 0
+		with self.lock:
+			return len(self.resources)
+
+
+	def _add(self, ri:str, pi:str, url:str) -> None:
+		self._remove(ri)	# A registration replaces an earlier one with the same ri
+		self.resources[ri] = (pi, url)
+		self.urls[url] = ri
+		self.children.setdefault(pi, set()).add(ri)
+
+
+	def _remove(self, ri:str) -> bool:
+		"""	Remove a resource and its registered descendants.
+
+			Return:
+				True if the resource was registered.
+		"""
+		if ri not in self.resources:
+			return False
+		stack = [ ri ]
+		while stack:
+			r = stack.pop()
+			if not (entry := self.resources.pop(r, None)):
+				continue
+			pi, url = entry
+			if self.urls.get(url) == r:
+				del self.urls[url]
+			if (siblings := self.children.get(pi)) is not None:
+				siblings.discard(r)
+				if not siblings:
+					del self.children[pi]
+			stack.extend(self.children.pop(r, ()))
+		return True
+
+
+	def register(self, operation:Operation, url:str, originator:str, ty:ResourceTypes, result:Tuple[STRING|JSON, int]) -> None:
+		"""	Register the result of a CREATE or DELETE request.
+		"""
+		url = url.split('?', 1)[0].rstrip('/')
+		response, rsc = result
+		if operation == Operation.CREATE:
+			if rsc != ResponseStatusCode.CREATED or not isinstance(response, dict) or len(response) != 1:
+				return	# e.g. a CREATE request with rcn=0 returns no resource
+			resource = next(iter(response.values()))
+			if not isinstance(resource, dict) or not (ri := resource.get('ri')):
+				return
+			resourceURL = f'{url}/{resource.get("rn", ri)}'
+			with self.lock:
+				self._add(ri, resource.get('pi'), resourceURL)
+				self._write({ 'ri': ri, 'pi': resource.get('pi'), 'url': resourceURL, 'fr': originator, 'ty': int(ty) if ty is not None else None })
+		elif rsc in (ResponseStatusCode.DELETED, ResponseStatusCode.NOT_FOUND):
+			with self.lock:
+				if not (ri := self.urls.get(url)):
+					ri = url.rsplit('/', 1)[-1]		# unstructured address
+				if self._remove(ri):
+					self._write({ 'del': ri })
+
+
+	def markDeleted(self, ri:str) -> None:
+		"""	Mark a resource as deleted that was not deleted via this registry's process, e.g. because
+			it was created by another worker process. If the resource is not registered here then
+			the deletion is passed on by *export()*.
+		"""
+		with self.lock:
+			if not self._remove(ri):
+				self.foreignDeletions.append(ri)
+			self._write({ 'del': ri })
+
+
+	def _write(self, entry:JSON) -> None:
+		if self.file:
+			self.file.write(json.dumps(entry, separators = (',', ':')) + '\n')
+
+
+	def roots(self) -> list[Tuple[str, str]]:
+		"""	Return the (ri, structured URL) of the top-level resources. Deleting them removes all
+			other registered resources as well.
+		"""
+		with self.lock:
+			return [ (ri, url) for ri, (pi, url) in self.resources.items() if pi not in self.resources ]
+
+
+	def tearDown(self, maxWorkers:int = 16) -> Tuple[int, int]:
+		"""	Delete the top-level resources in parallel. Resources that don't exist anymore are
+			counted as deleted.
+
+			Args:
+				maxWorkers: The maximum number of concurrent requests.
+
+			Return:
+				Tuple (number of deleted top-level resources, number of resources that could not be deleted)
+		"""
+		def _delete(root:Tuple[str, str]) -> bool:
+			ri, url = root
+			u = urlparse(url)
+			_, rsc = DELETE(f'{u.scheme}://{u.netloc}/{ri}', ORIGINATOR)	# unstructured address, independent of the parent's address
+			if rsc == ResponseStatusCode.NOT_FOUND:
+				with self.lock:
+					if self._remove(ri):
+						self._write({ 'del': ri })
+			return rsc in (ResponseStatusCode.DELETED, ResponseStatusCode.NOT_FOUND)
+
+		roots = self.roots()
+		with ThreadPoolExecutor(max_workers = 1 if BINDING == 'mqtt' else maxWorkers) as executor:
+			deleted = sum(executor.map(_delete, roots))
+		return deleted, len(roots) - deleted
+
+
+	def export(self) -> JSON:
+		"""	Return the registrations and the deletions of resources that are not registered here,
+			e.g. to send them from a worker process to the main process.
+		"""
+		with self.lock:
+			return { 'resources': [ { 'ri': ri, 'pi': pi, 'url': url } for ri, (pi, url) in self.resources.items() ],
+					 'deleted': list(self.foreignDeletions) }
+
+
+	def merge(self, registrations:JSON, journal:bool = True) -> None:
+		"""	Add the registrations and deletions of another registry, see *export()*.
+
+			Args:
+				registrations: The registrations and deletions.
+				journal: If False then they are not written to the journal, e.g. because the other registry already did.
+		"""
+		with self.lock:
+			for entry in registrations['resources']:
+				self._add(entry['ri'], entry['pi'], entry['url'])
+				if journal:
+					self._write(entry)
+			for ri in registrations['deleted']:
+				if self._remove(ri) and journal:
+					self._write({ 'del': ri })
+
+
+	def clear(self) -> None:
+		"""	Remove all registrations from memory. The journal file is not changed.
+		"""
+		with self.lock:
+			self.resources.clear()
+			self.urls.clear()
+			self.children.clear()
+			self.foreignDeletions.clear()
+
+
+	def close(self) -> None:
+		with self.lock:
+			if self.file:
+				self.file.close()
+				self.file = None
+
+
+registry = ResourceRegistry()
+""" The registry of the resources that were created by this process. """
+
+
+###############################################################################
+#
+#	Latency histograms
+#
+
+latencyHistograms:dict[str, LatencyHistogram] = {}	# "binding operation [resourceType]" -> histogram
+_latencyLock = Lock()
+
+
+def recordLatency(key:str, duration:float) -> None:
+	"""	Record a request's latency in the histogram for the key.
+
+		Args:
+			key: The histogram's key, consisting of the binding, the operation and the resource type.
+			duration: The latency in seconds.
+	"""
+	with _latencyLock:
+		if not (histogram := latencyHistograms.get(key)):
+			histogram = latencyHistograms[key] = LatencyHistogram()
+		histogram.record(duration)
+
+
+def getLatencyHistograms() -> dict[str, LatencyHistogram]:
+	"""	Return the latency histograms recorded since the last *clearLatencyHistograms()*.
+	"""
+	with _latencyLock:
+		return dict(latencyHistograms)
+
+
+def clearLatencyHistograms() -> None:
+	with _latencyLock:
+		latencyHistograms.clear()
+
+
+def mergeLatencyHistograms(histograms:dict[str, LatencyHistogram]) -> None:
+	"""	Merge latency histograms, e.g. of a worker process, into the histograms of this process.
+
+		Args:
+			histograms: Dictionary of keys and histograms, see *recordLatency()*.
+	"""
+	with _latencyLock:
+		for key, histogram in histograms.items():
+			if not (h := latencyHistograms.get(key)):
+				h = latencyHistograms[key] = LatencyHistogram()
+			h.merge(histogram)
+
+
+###############################################################################
+#
+#	Transports
+#
+
+@dataclass
+class RequestPrimitive:
+	"""	A request to be sent by a transport.
+	"""
+	operation:Operation
+	url:str
+	originator:str
+	ty:ResourceTypes		= None
+	data:JSON|str			= None
+	ct:str					= None
+	timeout:float			= None
+	headers:Parameters		= None
+
+
+class TransportMetrics:
+	"""	Counters and times of the requests sent by a transport. The metrics can be updated
+		by several threads concurrently.
+	"""
+
+	def __init__(self) -> None:
+		self.requests:int	= 0
+		self.errors:int		= 0		# Requests that could not be sent or received (RSC 5103)
+		self.time:float		= 0.0	# Accumulated request time in seconds
+		self.lock			= Lock()
+
+
+	def record(self, duration:float, rsc:int) -> None:
+		with self.lock:
+			self.requests += 1
+			self.time += duration
+			if rsc == 5103:
+				self.errors += 1
+
+
+	def toDict(self) -> JSON:
+		with self.lock:
+			return { 'requests': self.requests, 'errors': self.errors, 'time': self.time }
+
+
+	def merge(self, data:JSON) -> None:
+		"""	Add the metrics of a dictionary returned by *toDict()*, e.g. of a worker process.
+		"""
+		with self.lock:
+			self.requests += data['requests']
+			self.errors += data['errors']
+			self.time += data['time']
+
+
+class Transport(ABC):
+	"""	Base class for the transports of the protocol bindings. A transport is registered for
+		one or more URL schemes and sends a request primitive via its binding.
+	"""
+
+	def __init__(self, name:str) -> None:
+		self.name = name
+		self.metrics = TransportMetrics()
+
+
+	@abstractmethod
+	def send(self, primitive:RequestPrimitive) -> Tuple[STRING|JSON, int]:	# type: ignore
+		"""	Send a request primitive and return the response.
+
+			Args:
+				primitive: The request to send.
+
+			Return:
+				Tuple (response content, response status code)
+		"""
+
+
+class HttpTransport(Transport):
+
+	methods:dict[Operation, Callable] = {
+		Operation.CREATE:	requests.post,
+		Operation.RETRIEVE:	requests.get,
+		Operation.UPDATE:	requests.put,
+		Operation.DELETE:	requests.delete,
+		Operation.NOTIFY:	requests.post,
+	}
+
+	def send(self, primitive:RequestPrimitive) -> Tuple[STRING|JSON, int]:	# type: ignore
+		global httpSession
 		if not httpSession:
 			httpSession = requests.Session()
+		p = primitive
+		return sendHttpRequest(self.methods[p.operation], url=p.url, originator=p.originator, ty=p.ty, data=p.data, ct=p.ct, timeout=p.timeout, headers=p.headers)
 
 
-		# if operation == Operation.CREATE:
-		# 	return sendHttpRequest(requests.post, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-		# elif operation == Operation.RETRIEVE:
-		# 	return sendHttpRequest(requests.get, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-		# elif operation == Operation.UPDATE:
-		# 	return sendHttpRequest(requests.put, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-		# elif operation == Operation.DELETE:
-		# 	return sendHttpRequest(requests.delete, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-		# elif operation == Operation.NOTIFY:
-		# 	return sendHttpRequest(requests.post, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-		match operation:
-			case Operation.CREATE:
-				return sendHttpRequest(requests.post, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.RETRIEVE:
-				return sendHttpRequest(requests.get, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.UPDATE:
-				return sendHttpRequest(requests.put, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.DELETE:
-				return sendHttpRequest(requests.delete, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.NOTIFY:
-				return sendHttpRequest(requests.post, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			
-	elif url.startswith('mqtt'):
-		match operation:
-			case Operation.CREATE:
-				return sendMqttRequest(Operation.CREATE, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.RETRIEVE:
-				return sendMqttRequest(Operation.RETRIEVE, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.UPDATE:
-				return sendMqttRequest(Operation.UPDATE, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.DELETE:
-				return sendMqttRequest(Operation.DELETE, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.NOTIFY:
-				return sendMqttRequest(Operation.NOTIFY, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-	
-	elif url.startswith(('ws', 'wss')):
-		match operation:
-			case Operation.CREATE:
-				return sendWsRequest(Operation.CREATE, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.RETRIEVE:
-				return sendWsRequest(Operation.RETRIEVE, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.UPDATE:
-				return sendWsRequest(Operation.UPDATE, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.DELETE:
-				return sendWsRequest(Operation.DELETE, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.NOTIFY:
-				return sendWsRequest(Operation.NOTIFY, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-
-	elif url.startswith(('coap')):
-		match operation:
-			case Operation.CREATE:
-				return sendCoapRequest(Operation.CREATE, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.RETRIEVE:
-				return sendCoapRequest(Operation.RETRIEVE, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.UPDATE:
-				return sendCoapRequest(Operation.UPDATE, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.DELETE:
-				return sendCoapRequest(Operation.DELETE, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
-			case Operation.NOTIFY:
-				return sendCoapRequest(Operation.NOTIFY, url=url, originator=originator, ty=ty, data=data, ct=ct, timeout=timeout, headers=headers)
+class MqttTransport(Transport):
 
-	else:
-		print('ERROR')
-		return None, 5103
+	def send(self, primitive:RequestPrimitive) -> Tuple[STRING|JSON, int]:	# type: ignore
+		if not mqttClient:
+			startMqttClient()
+		p = primitive
+		return sendMqttRequest(p.operation, url=p.url, originator=p.originator, ty=p.ty, data=p.data, ct=p.ct, timeout=p.timeout, headers=p.headers)
 
 
-def _packRequest(operation:Operation, url:str, originator:str, ty:int=None, data:JSON|str=None, ct:str=None, headers:Parameters=None) -> Tuple[JSON, str, ParseResult]:
+class WsTransport(Transport):
+
+	def send(self, primitive:RequestPrimitive) -> Tuple[STRING|JSON, int]:	# type: ignore
+		p = primitive
+		return sendWsRequest(p.operation, url=p.url, originator=p.originator, ty=p.ty, data=p.data, ct=p.ct, timeout=p.timeout, headers=p.headers)
+
+
+class CoapTransport(Transport):
+
+	def send(self, primitive:RequestPrimitive) -> Tuple[STRING|JSON, int]:	# type: ignore
+		p = primitive
+		return sendCoapRequest(p.operation, url=p.url, originator=p.originator, ty=p.ty, data=p.data, ct=p.ct, timeout=p.timeout, headers=p.headers)
+
+
+transports:dict[str, Transport] = dict()
+
+
+def registerTransport(transport:Transport, *schemes:str) -> None:
+	"""	Register a transport for one or more URL schemes. An already registered
+		transport for a scheme is replaced.
+
+		Args:
+			transport: The transport to register.
+			schemes: The URL schemes the transport handles, e.g. "http".
+	"""
+	for scheme in schemes:
+		transports[scheme] = transport
+
+
+def getTransport(url:str) -> Optional[Transport]:
+	"""	Return the transport for a URL.
+
+		Args:
+			url: The request URL.
+
+		Return:
+			The registered transport for the URL's scheme, or None.
+	"""
+	return transports.get(url.partition(':')[0])
+
+
+def transportMetrics() -> dict[str, TransportMetrics]:
+	"""	Return the metrics of all registered transports.
+
+		Return:
+			Dictionary of transport names and their metrics.
+	"""
+	return { t.name:t.metrics for t in transports.values() }
+
+
+registerTransport(HttpTransport('http'), 'http', 'https')
+registerTransport(MqttTransport('mqtt'), 'mqtt')
+registerTransport(WsTransport('ws'), 'ws', 'wss')
+registerTransport(CoapTransport('coap'), 'coap', 'coaps')
+
+
+@lru_cache(maxsize = requestCacheSize)
+def _compileRequest(url:str, originator:str) -> Tuple[JSON, list[str], ParseResult]:
+	"""	Parse a request URL and its query arguments into a request skeleton. The result is cached,
+		so each further request with the same URL and originator only needs a shallow copy of it.
+
+		The skeleton must not be changed by the caller.
+
+		Args:
+			url: The request URL, including query arguments.
+			originator: The request originator.
+
+		Return:
+			Tuple (request skeleton, list of *atrl* attributes or None, URL components)
+	"""
 	urlComponents:ParseResult = urlparse(url)
 	urlquery = parse_qs(urlComponents.query)
 	#print(urlquery)
@@ -422,13 +912,9 @@ def _packRequest(operation:Operation, url:str, originator:str, ty:int=None, data
 	fc:dict		= dict()
 	req['fr'] 	= originator
 	req['to'] 	= urlComponents.path[1:]	# remove the leading / of an url ( usually the root path)
-	req['op'] 	= operation.value
-	req['rqi'] 	= (rqi := uniqueID())
 	req['rvi'] 	= RELEASEVERSION
 
 	# Various request parameters
-	if ty:	
-		req['ty'] = ty
 	if (rcn := urlquery.get('rcn')):
 		req['rcn'] = int(rcn[0])	# only first rcn
 		del urlquery['rcn']
@@ -461,13 +947,10 @@ def _packRequest(operation:Operation, url:str, originator:str, ty:int=None, data
 		fc['cty'] = [ tt for t in cty for tt in t.split(' ') ]	# s.a.
 		del urlquery['cty']
 
-	# add some attributes to CONTENT
-	if (atrl := urlquery.get('atrl')):
-		if data is not None:
-			raise INTERNAL_SERVER_ERROR('data must be not set when using "atrl"')
-		data = dict()
-		data['m2m:atrl'] =  [ tt for t in atrl for tt in t.split(' ') ]
-		# Add CONTENT
+	# attributes to add to the CONTENT
+	atrl:list[str] = None
+	if (_atrl := urlquery.get('atrl')):
+		atrl = [ tt for t in _atrl for tt in t.split(' ') ]
 		del urlquery['atrl']
 
 	# add remaining arguments as attributes to filterCriteria
@@ -477,6 +960,26 @@ def _packRequest(operation:Operation, url:str, originator:str, ty:int=None, data
 	# Add filterCriteria to request
 	if len(fc):
 		req['fc'] = fc
+	
+	return req, atrl, urlComponents
+
+
+def _packRequest(operation:Operation, url:str, originator:str, ty:int=None, data:JSON|str=None, ct:str=None, headers:Parameters=None) -> Tuple[JSON, str, ParseResult]:
+	skeleton, atrl, urlComponents = _compileRequest(url, originator)
+
+	req:dict	= skeleton.copy()
+	req['op'] 	= operation.value
+	req['rqi'] 	= (rqi := uniqueID())
+
+	if ty:	
+		req['ty'] = ty
+
+	# add some attributes to CONTENT
+	if atrl:
+		if data is not None:
+			raise INTERNAL_SERVER_ERROR('data must be not set when using "atrl"')
+		data = dict()
+		data['m2m:atrl'] = list(atrl)
 
 	if headers:			# extend with other headers
 		for hdr,attr in [ (C.hfRVI, 'rvi'), (C.hfVSI, 'vsi'), (C.hfRET, 'rqet'), (C.hfOET, 'oet'), (C.hfOT, 'ot'), (C.hfRST, 'rset')]:
@@ -486,8 +989,7 @@ def _packRequest(operation:Operation, url:str, originator:str, ty:int=None, data
 		# Special handling for rtu/nu, which is a sub-structure for rt.
 		# Either get it (if exist), or create it. Then add nu, and add it again
 		if (h := headers.get(C.hfRTU)) is not None:
-			if (rtu := req.get('rt')) is None:
-				rtu = dict()
+			rtu = dict(req.get('rt', {}))	# copy, because the skeleton's rt is shared
 			rtu['nu'] = h.split('&')	# -> list
 			req['rt'] = rtu
 			del headers[C.hfRTU]
@@ -500,24 +1002,88 @@ def _packRequest(operation:Operation, url:str, originator:str, ty:int=None, data
 
 
 
-def addHttpAuthorizationHeader(headers:Parameters) -> Optional[Tuple[str, int]]:
+_authorizationHeader:str	= None		# Precomputed static authorization header
+oauthRefreshMargin:float	= 30.0		# Refresh an OAuth token this many seconds before it expires
+_oauthTokenLock				= Lock()
+_oauthRefreshStop			= Event()
+_oauthRefreshThread:Thread	= None
+
+
+def staticAuthorizationHeader() -> Optional[str]:
+	"""	Return the static (Basic or Token) authorization header. It is computed only once.
+
+		Return:
+			The value for the *Authorization* header, or None if no static authorization is configured.
+	"""
+	global _authorizationHeader
+	if _authorizationHeader is None:
+		if doHttpBasicAuth:
+			_t = f'{httpUserName}:{httpPassword}'
+			_authorizationHeader = f'Basic {base64.b64encode(_t.encode("utf-8")).decode("utf-8")}'
+		elif doHttpTokenAuth:
+			_authorizationHeader = f'Bearer {httpAuthToken}'
+		else:
+			_authorizationHeader = ''
+	return _authorizationHeader or None
+
+
+def _isOAuthTokenValid(token:OAuth.Token) -> bool:
+	return token is not None and token.expiration > utcTimestamp()
+
+
+def getOAuthToken() -> Optional[OAuth.Token]:
+	"""	Return a valid OAuth token. If there is none yet, or it has expired, then a new token
+		is requested. Only one thread requests a token at a time, the others wait for and
+		use its result. The first successful request also starts the background refresh.
+
+		Return:
+			The token, or None if no token could be retrieved.
+	"""
 	global oauthToken
+	if _isOAuthTokenValid(token := oauthToken):
+		return token
+	with _oauthTokenLock:
+		if _isOAuthTokenValid(token := oauthToken):	# Another thread has just refreshed the token
+			return token
+		if (token := OAuth.getOAuthToken(oauthServerUrl, oauthClientID, oauthClientSecret, None)) is not None:
+			oauthToken = token
+			_startOAuthRefresh()
+		return token
+
+
+def _startOAuthRefresh() -> None:
+	"""	Start the background thread that refreshes the OAuth token before it expires.
+	"""
+	global _oauthRefreshThread
 
+	def _refresh() -> None:
+		global oauthToken
+		while True:
+			delay = oauthToken.expiration - oauthRefreshMargin - utcTimestamp() if oauthToken else 0.0
+			if _oauthRefreshStop.wait(max(delay, 1.0)):
+				return
+			with _oauthTokenLock:
+				if (token := OAuth.getOAuthToken(oauthServerUrl, oauthClientID, oauthClientSecret, None)) is not None:
+					oauthToken = token
+
+	if _oauthRefreshThread is None:
+		_oauthRefreshThread = Thread(target = _refresh, daemon = True)
+		_oauthRefreshThread.start()
+
+
+def addHttpAuthorizationHeader(headers:Parameters) -> Optional[Tuple[str, int]]:
 	if doOAuth:
-		if (token := OAuth.getOAuthToken(oauthServerUrl, oauthClientID, oauthClientSecret, oauthToken)) is None:
+		if (token := getOAuthToken()) is None:
 			return 'error retrieving oauth token', 5103
-		oauthToken = token
-		headers['Authorization'] = f'Bearer {oauthToken.token}'
-	elif doHttpBasicAuth:
-		_t = f'{httpUserName}:{httpPassword}'
-		headers['Authorization'] = f'Basic {base64.b64encode(_t.encode("utf-8")).decode("utf-8")}'
-	elif doHttpTokenAuth:
-		headers['Authorization'] = f'Bearer {httpAuthToken}'
+		headers['Authorization'] = f'Bearer {token.token}'
+	elif (authorization := staticAuthorizationHeader()):
+		headers['Authorization'] = authorization
 	return None
 
 
 def sendHttpRequest(method:Callable, url:str, originator:str, ty:ResourceTypes=None, data:JSON|str=None, ct:str=None, timeout:float=None, headers:Parameters=None) -> Tuple[STRING|JSON, int]:	# type: ignore # TODO Constants
 	global httpSession
+	t = tracing.now()
 
 	# correct url
 	url = RequestUtils.toHttpUrl(url)
@@ -577,7 +1143,9 @@ def sendHttpRequest(method:Callable, url:str, originator:str, ty:ResourceTypes=N
 			console.print_json(data=data)
 
 	setLastRequestID(rid)
+	tracing.complete('pack', 'binding', t)
 	try:
+		t = tracing.now()
 		sendData:str = None
 		if data is not None:
 			if isinstance(data, dict):	# actually JSON, but isinstance() cannot be used with generics
@@ -585,7 +1153,9 @@ def sendHttpRequest(method:Callable, url:str, originator:str, ty:ResourceTypes=N
 			else:
 				sendData = data
 			# data = cbor2.dumps(data)	# TODO use CBOR as well
-		r = method(url, data=sendData, headers=hds, verify=verifyCertificate, timeout=timeout)
+		tracing.complete('serialize', 'binding', t)
+		with tracing.span('send+wait', 'binding'):	# requests sends the request and waits for the response in one call
+			r = method(url, data=sendData, headers=hds, verify=verifyCertificate, timeout=timeout)
 		# print(f'HTTP request sent: {r.status_code}')
 	except Exception as e:
 		# print(f'Failed to send request: {str(e)}')
@@ -607,13 +1177,15 @@ def sendHttpRequest(method:Callable, url:str, originator:str, ty:ResourceTypes=N
 	if (ct := r.headers.get('Content-Type')) is not None and ct.startswith('text/plain'):
 		return r.content, rc
 	elif ct is not None and ct.startswith(('application/json', 'application/vnd.onem2m-res+json')):
-		return r.json() if len(r.content) > 0 else None, rc
+		with tracing.span('parse', 'binding'):
+			return r.json() if len(r.content) > 0 else None, rc
 	# just return what's in there
 	return r.content, rc
 
 
 def sendMqttRequest(operation:Operation, url:str, originator:str, ty:int=None, data:JSON|str=None, ct:str=None, timeout:float=None, headers:Parameters=None) -> Tuple[STRING|JSON, int]:	# type: ignore # TODO Constants
 
+	t = tracing.now()
 	req, rqi, urlComponents = _packRequest(operation, url, originator, ty, data, ct, headers)
 
 	# MQTT: Which topic to use for request and response?
@@ -627,6 +1199,7 @@ def sendMqttRequest(operation:Operation, url:str, originator:str, ty:int=None, d
 
 		reqTopic  = topics.reqTopic
 		respTopic = topics.respTopic
+	tracing.complete('pack', 'binding', t)
 		
 	# print(f'==> {reqTopic} / {req}')
 
@@ -637,10 +1210,14 @@ def sendMqttRequest(operation:Operation, url:str, originator:str, ty:int=None, d
 		console.print(req)
 
 	# send the data
-	mqttHandler.publish(reqTopic, cast(bytes, RequestUtils.serializeData(req, ContentSerializationType.JSON)))  # TODO support cbor
+	with tracing.span('serialize', 'binding'):
+		payload = cast(bytes, RequestUtils.serializeData(req, ContentSerializationType.JSON))  # TODO support cbor
+	with tracing.span('send', 'binding'):
+		mqttHandler.publish(reqTopic, payload)
 
 	# Wait for response
 	while True: 	# Timeout?
+		t = tracing.now()
 		try:
 			if not DateUtils.waitFor(timeout = 60.0, condition = lambda:rqi in mqttHandler.responses):
 				print('MQTT Timeout')
@@ -648,6 +1225,7 @@ def sendMqttRequest(operation:Operation, url:str, originator:str, ty:int=None, d
 			message = mqttHandler.responses.pop(rqi)
 		except:
 			return None, 5103
+		tracing.complete('wait', 'binding', t)
 
 		# Verbose output
 		if verboseRequests:
@@ -670,79 +1248,217 @@ def sendMqttRequest(operation:Operation, url:str, originator:str, ty:int=None, d
 			return resp['pc'] if 'pc' in resp else None, resp['rsc']
 
 
-websockets:dict[str, ClientConnection] = dict()
-wsin:int = 0
+class WSClientHandler:
+	"""	Class for a multiplexed WebSocket connection. A background reader thread dispatches
+		received responses by their request ID to the waiting requests, and stores received
+		notifications in the notification store. This allows to have many requests outstanding at the
+		same time on a single connection.
+	"""
 
-def sendWsRequest(operation:Operation, url:str, originator:str, ty:int=None, data:JSON|str=None, ct:str=None, timeout:float=10.0, headers:Parameters=None) -> Tuple[STRING|JSON, int]:	# type: ignore # TODO Constants
-	req, rqi, urlComponents = _packRequest(operation, url, originator, ty, data, ct, headers)
+	def __init__(self, websocket:ClientConnection) -> None:
+		self.websocket:ClientConnection				= websocket
+		self.serialization							= ContentSerializationType.CBOR if websocket.subprotocol == 'oneM2M.cbor' else ContentSerializationType.JSON
+		self.responses:dict[str, JSON]				= dict()
+		self.pending:dict[str, Event]				= dict()
+		self.isOpen:bool							= True
+		self.lock									= Lock()
+		self.sendLock								= Lock()
+		self.readerThread							= Thread(target = self._reader, daemon = True)
+		self.readerThread.start()
 
-	def isWSOpen(websocket:WSConnection) -> bool:
+
+	def _reader(self) -> None:
+		"""	Receive messages until the connection is closed.
+		"""
 		try:
-			websocket.recv(timeout = 0)
-		except ConnectionClosed as e:
-			return False
-		except:
-			return True
-		return True
+			for message in self.websocket:
+				try:
+					self._dispatch(message)
+				except Exception as e:	# A bad frame or a failing handler must not stop the reader
+					console.print(f'[red]Error processing WebSocket message: {type(e).__name__}: {e}')
+					if verboseRequests:
+						console.print(message)
+		except ConnectionClosed:
+			pass
+		except Exception as e:
+			console.print(f'[red]WebSocket connection failed: {type(e).__name__}: {e}')
+		finally:
+			self.isOpen = False
+			with self.lock:		# Wake up all waiting requests
+				for event in self.pending.values():
+					event.set()
+
+
+	def _dispatch(self, message:str|bytes) -> None:
+		"""	Dispatch a received message to the waiting request or the notification handler.
+		"""
+		t = tracing.now()
+		if isinstance(message, str):	# text frame
+			data = RequestUtils.deserializeData(bytes(message, 'utf-8'), ContentSerializationType.JSON)
+		else:							# binary frame
+			data = RequestUtils.deserializeData(message, self.serialization)
+		tracing.complete('parse', 'binding', t)
+		if not isinstance(data, dict):
+			raise ValueError(f'message is not a primitive: {data}')
+		if 'rsc' in data and 'rqi' in data:		# A response
+			with self.lock:
+				if (event := self.pending.get(data['rqi'])):
+					self.responses[data['rqi']] = data
+					event.set()
+		elif 'op' in data:						# A request, ie. a notification
+			self._handleNotification(data)
+		elif verboseRequests:
+			console.print('\n[b u]Received unknown WebSocket message')
+			console.print(data)
+
+
+	def _handleNotification(self, request:JSON) -> None:
+		"""	Store a received notification and send a response via the same connection.
+		"""
+		global nextNotificationResult
+		arrivalTime = time.perf_counter()
+
+		with _notificationLock:
+			setLastNotification(request.get('pc'))
+			setLastNotificationHeaders(headers := fillLastHeaders(request))
+			result = nextNotificationResult
+			nextNotificationResult = ResponseStatusCode.OK
+		if (pc := request.get('pc')) is not None:
+			notificationStore.add(ReceivedNotification(pc, headers, {}, arrivalTime, _notificationSur(pc), request.get('rqi')))
+
+		response = {
+			'fr':	request.get('to'),
+			'to':	request.get('fr'),
+			'rqi':	request.get('rqi'),
+			'rvi':	request.get('rvi', RELEASEVERSION),
+			'rsc':	int(result)
+		}
+
+		# Verbose output
+		if verboseRequests:
+			console.print('\n[b u]Received Notification Request')
+			console.print(request)
+			console.print('\n[b u]Sent Notification Response')
+			console.print(response)
+		self.send(response)
+
+
+	def send(self, data:JSON) -> None:
+		"""	Send a primitive. JSON is sent in text frames, CBOR in binary frames.
+		"""
+		with tracing.span('serialize', 'binding'):
+			message = cast(str|bytes, RequestUtils.serializeData(data, self.serialization))
+		with self.sendLock, tracing.span('send', 'binding'):
+			self.websocket.send(message)
+
+
+	def sendRequest(self, req:JSON, timeout:float = None) -> Optional[JSON]:
+		"""	Send a request and wait for the response with the same request ID.
+
+			Args:
+				req: The request to send.
+				timeout: Time in seconds to wait for the response. Wait forever if None.
+
+			Return:
+				The response, or None in case of a timeout or a closed connection.
+		"""
+		rqi = req['rqi']
+		event = Event()
+		with self.lock:
+			self.pending[rqi] = event
+		try:
+			self.send(req)
+			with tracing.span('wait', 'binding'):
+				event.wait(timeout)
+			with self.lock:
+				return self.responses.pop(rqi, None)
+		finally:
+			with self.lock:
+				self.pending.pop(rqi, None)
+
+
+	def close(self) -> None:
+		self.isOpen = False
+		self.websocket.close()
+
+
+def wsConnectArguments() -> dict[str, Any]:
+	"""	Return the compression and frame size arguments for a WebSocket connect() call,
+		as configured in the test configuration.
+
+		Return:
+			Dictionary with keyword arguments for *connect()*.
+	"""
+	return wsdeflate.connectArguments(wsCompression, wsMaxSize, wsClientMaxWindowBits, wsServerMaxWindowBits, wsCompressionLevel, wsMemLevel)
+
+
+websockets:dict[str, WSClientHandler] = dict()
+websocketsLock = Lock()
+wsin:int = 0
+
+def sendWsRequest(operation:Operation, url:str, originator:str, ty:int=None, data:JSON|str=None, ct:str=None, timeout:float=10.0, headers:Parameters=None) -> Tuple[STRING|JSON, int]:	# type: ignore # TODO Constants
+	with tracing.span('pack', 'binding'):
+		req, rqi, urlComponents = _packRequest(operation, url, originator, ty, data, ct, headers)
 
-	
 	# Verbose output
 	if verboseRequests:
 		console.print('\n[b u]Request')
-		console.print(f'[dark_orange]{PROTOCOL}://{wsAddress}:{wsPort}[/dark_orange]')
+		console.print(f'[dark_orange]{urlComponents.scheme}://{wsAddress}:{wsPort}[/dark_orange]')
 		console.print(req)
 
-
 	# TODO addioanl headers: 'X-M2M-Origin': 'CAdmin'
 		
 	additionalHeaders = { }	if not originator else { 'X-M2M-Origin': originator }
 
-	websocket = websockets.get(originator)
-	if not isWSOpen(websocket):
-		websocket.close()
-		websockets.pop(originator)
-		websocket = None
-
-	if not websocket:
-		context:ssl.SSLContext = None
-		if urlComponents.scheme == 'wss':
-			context = ssl.create_default_context()
-			if not verifyCertificate:
-				context.check_hostname = False
-				context.verify_mode = ssl.CERT_NONE
-
-		websocket = connect(f'{PROTOCOL}://{wsAddress}:{wsPort}', 
-					  		subprotocols = wsSubProtocols, 	# type:ignore [arg-type]
-							additional_headers = additionalHeaders, 
-							ssl_context = context)
-		websockets[originator] = websocket
-
-	# TODO support cbor
-
-	websocket.send(cast(bytes, RequestUtils.serializeData(req, ContentSerializationType.JSON)))
-	# TODO Decouple WS receiving to support notifications via 
-	try:
-		while True:
-			if (response := websocket.recv(timeout = timeout)):
-				resp = RequestUtils.deserializeData(bytes(response, 'utf-8') if isinstance(response, str) else response,
-										 			ContentSerializationType.JSON)
-				setLastHeaders(fillLastHeaders(resp))
-				return resp['pc'] if 'pc' in resp else None, resp['rsc']
-			else:
-				print(response)
-				print('.', end='', flush=True)
-				return None
-	except TimeoutError:	# expected
-		print('timeout')
-		pass
-	return None
+	with websocketsLock:
+		if (handler := websockets.get(originator)) and not handler.isOpen:
+			handler.close()
+			websockets.pop(originator)
+			handler = None
+
+		if not handler:
+			context:ssl.SSLContext = None
+			if urlComponents.scheme == 'wss':
+				context = ssl.create_default_context()
+				if not verifyCertificate:
+					context.check_hostname = False
+					context.verify_mode = ssl.CERT_NONE
+
+			websocket = connect(f'{urlComponents.scheme}://{wsAddress}:{wsPort}', 
+								subprotocols = wsSubProtocols, 	# type:ignore [arg-type]
+								additional_headers = additionalHeaders, 
+								ssl_context = context,
+								**wsConnectArguments())
+			handler = websockets[originator] = WSClientHandler(websocket)
+
+	if (resp := handler.sendRequest(req, timeout)) is None:
+		print('WS Timeout')
+		return None, 5103
 
-def sendCoapRequest(operation:Operation, url:str, originator:str, ty:ResourceTypes=None, data:JSON|str=None, ct:str=None, timeout:float=None, headers:Parameters=None) -> Tuple[STRING|JSON, int]:	# type: ignore # TODO Constants
+	# Verbose output
+	if verboseRequests:
+		console.print('\n[b u]Response')
+		console.print(resp)
+
+	setLastHeaders(fillLastHeaders(resp))
+	return resp['pc'] if 'pc' in resp else None, resp['rsc']
+
+def buildCoapRequest(operation:Operation, url:str, originator:str, ty:ResourceTypes=None, data:JSON|str=None) -> Request:
+	"""	Build a CoAP request for a oneM2M request. The request's destination is taken from the URL.
+
+		Args:
+			operation: The request's operation.
+			url: The target URL, with host and port.
+			originator: The request's originator.
+			ty: Optional resource type for CREATE requests.
+			data: Optional content.
+
+		Return:
+			The CoAP request, without message ID and token.
+	"""
 	urlComponents:ParseResult = urlparse(url)
 
 	host, port = urlComponents.netloc.split(':')
-	port = int(port)
-	coap_client = HelperClient(server=(host, port))
 
 	request = Request()
 
@@ -762,7 +1478,7 @@ def sendCoapRequest(operation:Operation, url:str, originator:str, ty:ResourceTyp
 		request.code = defines.Codes.POST.number
 
 	request.type = defines.Types['CON']
-	request.destination = host, port
+	request.destination = host, int(port)
 	request.uri_path = urlComponents.path[1:]
 
 	# CoAP Options
@@ -815,30 +1531,52 @@ def sendCoapRequest(operation:Operation, url:str, originator:str, ty:ResourceTyp
 	# Set CoAP payload
 	if data is not None:
 		if isinstance(data, dict):
-			request.payload = json.dumps(data)
+			with tracing.span('serialize', 'binding'):
+				request.payload = json.dumps(data)
 
-	# Send the CoAP request
-	try:
-		response = coap_client.send_request(request)
-	except Exception as e:
-		return 'Failed to send CoAP request', 5103
+	return request
 
-	content_type = response.content_type
 
+def parseCoapResponse(response:Response) -> Tuple[STRING|JSON, int]:
+	"""	Return the content and the oneM2M response status code of a CoAP response.
+
+		Args:
+			response: The CoAP response.
+
+		Return:
+			Tuple (response content, response status code)
+	"""
 	if RELEASEVERSION == '5':
 		rc = json.loads(response.payload)['rsc']
 	else:
 		options = response.options
 		for option in options:
-			if option.number == 307: # oneM2M_RSC
+			if option.number == defines.OptionRegistry.oneM2M_RSC.number:
 				rc = option.value
 				break
 
-	if response.payload is not None and 'pc' in json.loads(response.payload):
-		return json.loads(response.payload)['pc'], rc
+	if response.payload is not None and 'pc' in (payload := json.loads(response.payload)):
+		return payload['pc'], rc
 	else:
 		return response.payload, rc
 
+
+def sendCoapRequest(operation:Operation, url:str, originator:str, ty:ResourceTypes=None, data:JSON|str=None, ct:str=None, timeout:float=None, headers:Parameters=None) -> Tuple[STRING|JSON, int]:	# type: ignore # TODO Constants
+	t = tracing.now()
+	request = buildCoapRequest(operation, url, originator, ty, data)
+	coap_client = HelperClient(server=request.destination)
+	tracing.complete('pack', 'binding', t)
+
+	# Send the CoAP request
+	try:
+		with tracing.span('send+wait', 'binding'):
+			response = coap_client.send_request(request)
+	except Exception as e:
+		return 'Failed to send CoAP request', 5103
+
+	with tracing.span('parse', 'binding'):
+		return parseCoapResponse(response)
+
 _lastRequstID = None
 
 def setLastRequestID(rid:str) -> None:
@@ -894,6 +1632,120 @@ def lastHeaders() -> Parameters:
 	return _lastHeaders
 
 
+###############################################################################
+#
+#	Upper Tester channel
+#
+
+class UpperTesterChannel:
+	"""	Channel for sending commands to the CSE's Upper Tester interface. All commands are sent
+		in order by a single worker thread via a pooled HTTP session. Asynchronous commands return
+		immediately, while synchronous commands wait for their response, and therefore also for
+		all commands that were issued before. Failures of asynchronous commands are logged.
+
+		Asynchronous commands are not ordered with the test requests, which are sent by the
+		test's thread. Call *flush()* before a request that must follow a command.
+	"""
+
+	def __init__(self, url:str) -> None:
+		self.url 					= url
+		self.session:requests.Session = None
+		self.queue:queue.Queue		= queue.Queue()
+		self.worker:Thread			= None
+		self.workerLock				= Lock()
+		self.timeCount				= 0.0		# Accumulated time of the UT requests
+		self.requestCount			= 0
+
+
+	def _run(self) -> None:
+		while (item := self.queue.get()) is not None:
+			headers, future = item
+			if headers is None:				# flush marker
+				future.set_result(None)
+				continue
+			startTime = time.perf_counter()
+			try:
+				with tracing.span('UT', 'ut', { 'command': headers[UTCMD] }):
+					future.set_result(self.session.post(self.url, headers = headers, verify = verifyCertificate))
+			except Exception as e:
+				future.set_exception(e)
+			self.timeCount += time.perf_counter() - startTime
+			self.requestCount += 1
+
+
+	def _put(self, headers:Parameters) -> Future:
+		with self.workerLock:
+			if not self.worker:
+				self.session = requests.Session()
+				self.worker = Thread(target = self._run, daemon = True)
+				self.worker.start()
+		future:Future = Future()
+		self.queue.put((headers, future))
+		return future
+
+
+	def send(self, command:str, wait:bool = True) -> Optional[requests.Response]:
+		"""	Send an Upper Tester command.
+
+			Args:
+				command: The command to send in the *X-M2M-UTCMD* header.
+				wait: If True then wait for and return the response. Otherwise return immediately.
+
+			Return:
+				The response, or None if not waiting for it.
+		"""
+		headers = { UTCMD: command }
+		addHttpAuthorizationHeader(headers)
+		future = self._put(headers)
+		if wait:
+			return future.result()
+		future.add_done_callback(lambda f: self._logFailure(command, f))
+		return None
+
+
+	def _logFailure(self, command:str, future:Future) -> None:
+		if (e := future.exception()):
+			console.print(f'[red]Upper Tester command "{command}" failed: {e}')
+		elif (response := future.result()).status_code != 200:
+			console.print(f'[red]Upper Tester command "{command}" failed: {response.status_code} {response.headers.get(UTRSP, "")}')
+
+
+	def flush(self) -> None:
+		"""	Wait until all previously issued commands have been sent.
+		"""
+		if self.worker:
+			self._put(None).result()
+
+
+	def close(self) -> None:
+		"""	Send the outstanding commands, then stop the worker thread and close the session.
+		"""
+		with self.workerLock:
+			if self.worker:
+				self.queue.put(None)
+				self.worker.join()
+				self.worker = None
+			if self.session:
+				self.session.close()
+				self.session = None
+
+
+upperTester = UpperTesterChannel(UTURL)
+
+
+def clearUTTimeCount() -> None:
+	upperTester.flush()
+	upperTester.timeCount = 0.0
+
+
+def getUTTimeCount() -> float:
+	"""	Return the accumulated time of the Upper Tester requests. Outstanding
+		asynchronous requests are sent first.
+	"""
+	upperTester.flush()
+	return upperTester.timeCount
+
+
 ###############################################################################
 #
 #	Reconfiguring CSE via the upper tester interface
@@ -917,9 +1769,7 @@ def enableShortResourceExpirations() -> None:
 	global _orgExpCheck, _maxExpiration, _tooLargeResourceExpirationDelta
 
 	# Send UT request
-	headers = { UTCMD: f'enableShortResourceExpiration {expirationCheckDelay}'}
-	addHttpAuthorizationHeader(headers)
-	resp = requests.post(UTURL, headers = headers)
+	resp = upperTester.send(f'enableShortResourceExpiration {expirationCheckDelay}')
 	_maxExpiration = -1
 	_orgExpCheck = -1
 	if resp.status_code == 200:
@@ -939,9 +1789,7 @@ def disableShortResourceExpirations() -> None:
 	global _orgExpCheck, _orgREQExpCheck
 	if _orgExpCheck != -1:
 		# Send UT request
-		headers = { UTCMD: f'disableShortResourceExpiration'}
-		addHttpAuthorizationHeader(headers)
-		resp = requests.post(UTURL, headers = headers)
+		resp = upperTester.send('disableShortResourceExpiration')
 		if resp.status_code == 200:
 			_orgExpCheck = -1
 			_orgREQExpCheck = -1
@@ -973,9 +1821,7 @@ def enableShortRequestExpirations() -> None:
 	global _orgRequestExpirationDelta
 
 	# Send UT request
-	headers = { UTCMD: f'enableShortRequestExpiration {requestExpirationDelay}'}
-	addHttpAuthorizationHeader(headers)
-	resp = requests.post(UTURL, headers = headers)
+	resp = upperTester.send(f'enableShortRequestExpiration {requestExpirationDelay}')
 	if resp.status_code == 200:
 		if UTRSP in resp.headers:
 			_orgRequestExpirationDelta = float(resp.headers[UTRSP])
@@ -987,9 +1833,7 @@ def disableShortRequestExpirations() -> None:
 	global _orgRequestExpirationDelta
 	
 	# Send UT request
-	headers = { UTCMD: f'disableShortRequestExpiration'}
-	addHttpAuthorizationHeader(headers)
-	resp = requests.post(UTURL, headers = headers)
+	resp = upperTester.send('disableShortRequestExpiration')
 	if resp.status_code == 200:
 		_orgRequestExpirationDelta = -1.0
 	
@@ -1003,16 +1847,27 @@ def isShortRequestExpirations() -> bool:
 	return _orgRequestExpirationDelta != -1.0
 
 
+testCaseDurations:dict[str, Tuple[float, float, float]] = {}	# Test case name -> (exec time, sleep time, process time)
+_testCaseStartTimes:dict[str, Tuple[float, float, float]] = {}
+
+
+def clearTestCaseDurations() -> None:
+	testCaseDurations.clear()
+	_testCaseStartTimes.clear()
+
+
 def testCaseStart(name:str) -> None:
 	"""	Indicate the start of a new test case to the CSE via the UT interface.
 
 		Args:
 			name: Name of the test case.
 	"""
+	global _notificationMark
+	_notificationMark = notificationStore.sequence
+	_testCaseStartTimes[name] = (time.perf_counter(), _sleepTimeCount, time.process_time())
+	tracing.begin(name, 'test')
 	if UPPERTESTERENABLED:
-		headers = { UTCMD: f'testCaseStart {name}'}
-		addHttpAuthorizationHeader(headers)
-		requests.post(UTURL, headers = headers)
+		upperTester.send(f'testCaseStart {name}', wait = not UTASYNC)
 	if verboseRequests:
 		console.print('')
 		ln  = '=' * int((console.width - 11 - len(name)) / 2)
@@ -1026,10 +1881,11 @@ def testCaseEnd(name:str) -> None:
 		Args:
 			name: Name of the test case.
 	"""
+	if (start := _testCaseStartTimes.pop(name, None)):
+		testCaseDurations[name] = (time.perf_counter() - start[0], _sleepTimeCount - start[1], time.process_time() - start[2])
+		tracing.end(name, 'test')
 	if UPPERTESTERENABLED:
-		headers = { UTCMD: f'testCaseEnd {name}'}
-		addHttpAuthorizationHeader(headers)
-		requests.post(UTURL, headers = headers)
+		upperTester.send(f'testCaseEnd {name}', wait = not UTASYNC)
 	if verboseRequests:
 		console.print('')
 		ln  = '=' * int((console.width - 9 - len(name)) / 2)
@@ -1048,38 +1904,169 @@ if not verifyCertificate:
 #	Notification Server
 #
 
+@dataclass
+class ReceivedNotification:
+	"""	A notification request received by the notification server.
+	"""
+	notification:JSON
+	headers:Parameters
+	arguments:Parameters
+	arrivalTime:float			# perf_counter() time of arrival
+	sur:str						# Subscription reference, if present
+	rqi:str						# Request ID, if present
+	sequence:int = 0			# Sequence number of arrival, assigned by the store
+
+
+class NotificationStore:
+	"""	Bounded store of all received notifications, indexed by subscription reference (*sur*)
+		and request ID (*rqi*). When the store is full the oldest notifications are removed.
+	"""
+
+	def __init__(self, maxSize:int) -> None:
+		self.maxSize 										= maxSize
+		self.notifications:deque[ReceivedNotification]		= deque()
+		self.bySur:dict[str, deque[ReceivedNotification]]	= dict()
+		self.byRqi:dict[str, ReceivedNotification]			= dict()
+		self.sequence										= 0
+		self.condition										= Condition()
+
+
+	def add(self, notification:ReceivedNotification) -> None:
+		with self.condition:
+			self.sequence += 1
+			notification.sequence = self.sequence
+			if len(self.notifications) >= self.maxSize:
+				self._removeOldest()
+			self.notifications.append(notification)
+			if notification.sur is not None:
+				self.bySur.setdefault(notification.sur, deque()).append(notification)
+			if notification.rqi is not None:
+				self.byRqi[notification.rqi] = notification
+			self.condition.notify_all()
+
+
+	def _removeOldest(self) -> None:
+		oldest = self.notifications.popleft()
+		if oldest.sur is not None and (surs := self.bySur.get(oldest.sur)):
+			surs.popleft()	# always the oldest for this sur as well
+			if not surs:
+				del self.bySur[oldest.sur]
+		if oldest.rqi is not None and self.byRqi.get(oldest.rqi) is oldest:
+			del self.byRqi[oldest.rqi]
+
+
+	def get(self, sur:str = None, since:int = 0) -> list[ReceivedNotification]:
+		"""	Return the stored notifications in order of arrival.
+
+			Args:
+				sur: Only return notifications for this subscription reference.
+				since: Only return notifications with a sequence number greater than this.
+
+			Return:
+				List of notifications.
+		"""
+		with self.condition:
+			notifications = self.notifications if sur is None else self.bySur.get(sur, ())
+			return [ n for n in notifications if n.sequence > since ]
+
+
+	def waitFor(self, predicate:Callable[[ReceivedNotification], bool], count:int, since:int, timeout:float) -> list[ReceivedNotification]:
+		"""	Wait until *count* notifications that match a predicate have arrived, or until a timeout.
+
+			Args:
+				predicate: Function that is called for each notification. Matches all notifications if None.
+				count: The number of matching notifications to wait for.
+				since: Only consider notifications with a sequence number greater than this.
+				timeout: Maximum time in seconds to wait.
+
+			Return:
+				List of matching notifications in order of arrival. It is shorter than *count* after a timeout.
+		"""
+		deadline = time.perf_counter() + timeout
+		checked = since		# notifications up to this sequence number are already checked
+		matches:list[ReceivedNotification] = []
+		with self.condition:
+			while True:
+				for n in self.notifications:
+					if n.sequence > checked and (predicate is None or predicate(n)):
+						matches.append(n)
+				if self.notifications:
+					checked = max(checked, self.notifications[-1].sequence)
+				if len(matches) >= count or (remaining := deadline - time.perf_counter()) <= 0:
+					return matches
+				self.condition.wait(remaining)
+
+
+	def getByRequestID(self, rqi:str) -> Optional[ReceivedNotification]:
+		with self.condition:
+			return self.byRqi.get(rqi)
+
+
+	def clear(self) -> None:
+		with self.condition:
+			self.notifications.clear()
+			self.bySur.clear()
+			self.byRqi.clear()
+
+
+	def __len__(self) -> int:
+		return len(self.notifications)
+
+
+notificationStoreSize = 10000		# Maximum number of stored notifications
+notificationStore = NotificationStore(notificationStoreSize)
+_notificationLock = Lock()
+_notificationMark = 0				# Sequence number of the last notification before the last clear or test case start
+
+
+def _notificationSur(notification:JSON) -> Optional[str]:
+	"""	Return the subscription reference of a single or a batch notification.
+	"""
+	if (sur := findXPath(notification, 'm2m:sgn/sur')) is not None:
+		return sur
+	return findXPath(notification, 'm2m:agn/m2m:sgn/{0}/sur')
+
+
 class SimpleHTTPRequestHandler(BaseHTTPRequestHandler):
 		
 	def do_POST(self) -> None:
 		global nextNotificationResult
-
-		# Construct return header
-		# Always acknowledge the verification requests
-		self.send_response(nextNotificationResult.httpStatusCode())
-		self.send_header(C.hfRSC, str(int(nextNotificationResult)))
-		self.send_header(C.hfOT, DateUtils.getResourceDate())
-		self.send_header(C.hfOrigin, ORIGINATORNotifResp)
-		if C.hfRI in self.headers:
-			self.send_header(C.hfRI, self.headers[C.hfRI])
-		nextNotificationResult = ResponseStatusCode.OK
+		arrivalTime = time.perf_counter()
 
 		# Get headers and content data
 		length = int(self.headers['Content-Length'])
 		post_data = self.rfile.read(length)
-		decoded_data = ''
+		decoded_data = None
 		if len(post_data) > 0:
 			contentType = ''
 			if (val := self.headers.get('Content-Type')) is not None:
 				contentType = val.lower()
 			match contentType:
 				case 'application/json' | 'application/vnd.onem2m-res+json':
-					setLastNotification(decoded_data := json.loads(post_data.decode('utf-8')))
+					decoded_data = json.loads(post_data.decode('utf-8'))
 				case 'application/cbor' | 'application/vnd.onem2m-res+cbor':
-					setLastNotification(decoded_data := cbor2.loads(post_data))	# type:ignore [assignment, arg-type]
+					decoded_data = cbor2.loads(post_data)
+		headers = dict(self.headers)	# make a dict out of the headers
+		arguments = parse_qs(urlparse(self.path).query)	# make a dict out of the query arguments 
+
+		with _notificationLock:
+			if decoded_data is not None:
+				setLastNotification(decoded_data)
+			setLastNotificationHeaders(headers)
+			setLastNotificationArguments(arguments)	# type:ignore[arg-type] 
+			result = nextNotificationResult
+			nextNotificationResult = ResponseStatusCode.OK
+		if decoded_data is not None:
+			notificationStore.add(ReceivedNotification(decoded_data, headers, arguments, arrivalTime, _notificationSur(decoded_data), self.headers.get(C.hfRI)))
 
-		setLastNotificationHeaders(dict(self.headers))	# make a dict out of the headers
-		# make a dict out of the query arguments 
-		setLastNotificationArguments(parse_qs(urlparse(self.path).query))	# type:ignore[arg-type] 
+		# Construct return header
+		# Always acknowledge the verification requests
+		self.send_response(result.httpStatusCode())
+		self.send_header(C.hfRSC, str(int(result)))
+		self.send_header(C.hfOT, DateUtils.getResourceDate())
+		self.send_header(C.hfOrigin, ORIGINATORNotifResp)
+		if C.hfRI in self.headers:
+			self.send_header(C.hfRI, self.headers[C.hfRI])
 
 		# Verbose output
 		if verboseRequests and self.headers.get(C.hfOrigin):
@@ -1097,38 +2084,40 @@ class SimpleHTTPRequestHandler(BaseHTTPRequestHandler):
 		pass
 
 
+notificationServer:ThreadingHTTPServer = None
 notificationServerIsRunning = False
 
 def runNotificationServer() -> None:
-	global notificationServerIsRunning
-	httpd = HTTPServer(('', NOTIFICATIONPORT), SimpleHTTPRequestHandler)
+	"""	Handle notification requests until the server is shut down. Each request is handled
+		in its own thread.
+	"""
+	notificationServer.serve_forever()
+
+
+def startNotificationServer() -> None:
+	global notificationServer, notificationServerIsRunning
+	notificationServer = ThreadingHTTPServer(('', NOTIFICATIONPORT), SimpleHTTPRequestHandler)
+	notificationServer.daemon_threads = True
 	if PROTOCOL == 'https':
 		# init ssl socket
 		context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)					# Create a SSL Context
 		context.load_cert_chain(certfile='../certs/acme_cert.pem', keyfile='../certs/acme_key.pem')	# Load the certificate and private key
-		httpd.socket = context.wrap_socket(httpd.socket, server_side=True)	# wrap the original http server socket as an SSL/TLS socket
+		notificationServer.socket = context.wrap_socket(notificationServer.socket, server_side=True)	# wrap the original http server socket as an SSL/TLS socket
 
+	# The server socket is already bound and listening, so there is no need to wait
 	notificationServerIsRunning = True
-	while notificationServerIsRunning:
-		httpd.handle_request()
-
-
-def startNotificationServer() -> None:
-	notificationThread = Thread(target=runNotificationServer)
+	notificationThread = Thread(target=runNotificationServer, daemon=True)
 	notificationThread.start()
-	waitMessage('Starting notification server', 2)
 
 
 def stopNotificationServer() -> None:
-	global notificationServerIsRunning
+	global notificationServer, notificationServerIsRunning
 
 	if notificationServerIsRunning:
 		notificationServerIsRunning = False
-		try:
-			requests.post(NOTIFICATIONSERVER, verify=verifyCertificate)	# send empty/termination request
-		except Exception:
-			pass
-		waitMessage('Stopping notification server', 2.0)
+		notificationServer.shutdown()
+		notificationServer.server_close()
+		notificationServer = None
 
 
 
@@ -1158,11 +2147,13 @@ def getLastNotification(clear:bool = False, wait:float = 0.0) -> JSON:
 
 
 def clearLastNotification(nextResult:ResponseStatusCode = ResponseStatusCode.OK) -> None:
-	global lastNotification, lastNotificationHeaders, lastNotificationArguments, nextNotificationResult
-	lastNotification = None
-	lastNotificationHeaders = None
-	lastNotificationArguments = None
-	nextNotificationResult = nextResult
+	global lastNotification, lastNotificationHeaders, lastNotificationArguments, nextNotificationResult, _notificationMark
+	_notificationMark = notificationStore.sequence
+	with _notificationLock:
+		lastNotification = None
+		lastNotificationHeaders = None
+		lastNotificationArguments = None
+		nextNotificationResult = nextResult
 
 
 def setLastNotificationHeaders(headers:Parameters) -> None:
@@ -1183,12 +2174,84 @@ def getLastNotificationArguments() -> Parameters:
 	return lastNotificationArguments
 
 
+def getNotifications(sur:str = None, since:int = 0) -> list[ReceivedNotification]:
+	"""	Return all stored notifications in order of arrival.
+
+		Args:
+			sur: Only return notifications for this subscription reference.
+			since: Only return notifications with a sequence number greater than this.
+
+		Return:
+			List of received notifications.
+	"""
+	return notificationStore.get(sur, since)
+
+
+def getNotificationByRequestID(rqi:str) -> Optional[ReceivedNotification]:
+	return notificationStore.getByRequestID(rqi)
+
+
+def clearNotifications() -> None:
+	notificationStore.clear()
+
+
+def waitForNotifications(predicate:Callable[[JSON], bool] = None, wait:float = notificationDelay, count:int = 1, since:int = None) -> list[JSON]:
+	"""	Wait until notifications that match a predicate have arrived, but at most *wait* seconds.
+		The time actually waited is added to the sleep time count.
+
+		Args:
+			predicate: Function that is called with each notification. Matches all notifications if None.
+			wait: Maximum time in seconds to wait.
+			count: The number of matching notifications to wait for.
+			since: Only consider notifications after this sequence number (see *notificationSequence()*).
+				By default only notifications after the last *clearLastNotification()* or test case start are considered.
+
+		Return:
+			List of matching notifications in order of arrival. It is shorter than *count* after a timeout.
+	"""
+	global _sleepTimeCount
+	startTime = time.perf_counter()
+	matches = notificationStore.waitFor(None if predicate is None else lambda n: predicate(n.notification),
+										count,
+										_notificationMark if since is None else since,
+										wait)
+	_sleepTimeCount += time.perf_counter() - startTime
+	return [ n.notification for n in matches ]
+
+
+def waitForNotification(predicate:Callable[[JSON], bool] = None, wait:float = notificationDelay, count:int = 1, since:int = None, last:bool = False) -> Optional[JSON]:
+	"""	Wait until notifications that match a predicate have arrived, but at most *wait* seconds.
+		This returns as soon as the CSE has delivered the notifications, instead of waiting for
+		a fixed time as *getLastNotification()* does. See *waitForNotifications()* for the other arguments.
+
+		Unlike *getLastNotification()* this returns the *count*-th matching notification in order
+		of arrival, i.e. the first one for count=1, even if more matching notifications arrived.
+		Use a predicate that matches only the expected notification, or set *last*.
+
+		Args:
+			last: Return the latest matching notification that arrived until the wait ended, instead of the *count*-th.
+
+		Return:
+			The matching notification, or None if fewer than *count* matching notifications arrived in time.
+	"""
+	if len(matches := waitForNotifications(predicate, wait, count, since)) < count:
+		return None
+	return matches[-1] if last else matches[count - 1]
+
+
+def notificationSequence() -> int:
+	"""	Return the sequence number of the last received notification.
+	"""
+	return notificationStore.sequence
+
+
 _sleepTimeCount:float = 0.0
 
 def testSleep(ti:float) -> None:
 	global _sleepTimeCount
 	_sleepTimeCount += ti
-	time.sleep(ti)
+	with tracing.span('sleep', 'sleep', { 'seconds': ti }):
+		time.sleep(ti)
 
 
 def clearSleepTimeCount() -> None:
@@ -1361,30 +2424,61 @@ def findXPath(dct:JSON, key:str, default:Any=None) -> Any:
 ###############################################################################
 
 
-match PROTOCOL:
-	# Start MQTT Client if test protocol is mqtt
-	case 'mqtt':
-		mqttHandler = MQTTClientHandler()
-		mqttClient = MQTTConnection(mqttAddress, mqttPort, clientID=mqttClientID, username=mqttUsername, password=mqttPassword, messageHandler=mqttHandler)
-		mqttClient.run()
-		while not mqttHandler.connection:
-			testSleep(1)
+###############################################################################
+
+class Probe:
+	"""	A value that is determined by a probe function only when it is first needed, e.g.
+		when a test module evaluates it in a *skipIf()* decorator. The first evaluation of
+		any probe starts all probes concurrently in the background, and then waits only for
+		its own result. An optional check function is called once after the first evaluation.
+	"""
+	probes:list[Probe]	= []
+	lock				= Lock()
 
+	def __init__(self, probe:Callable[[], Any], check:Callable[[], None] = None) -> None:
+		self.probe = probe
+		self.check = check
+		self.future:Future = None
+		Probe.probes.append(self)
 
-###############################################################################
 
-# The following code must be executed before anything else because it influences
-# the collection of skipped tests.
-# It checks whether there actually is a CSE running.
-noCSE = not connectionPossible(cseURL)
-noRemote = not connectionPossible(REMOTEcseURL)
+	def _start(self) -> None:
+		if self.future is None:
+			self.future = Future()
+			Thread(target = self._run, daemon = True).start()
 
-if UPPERTESTERENABLED:
+
+	def _run(self) -> None:
+		try:
+			self.future.set_result(self.probe())
+		except Exception as e:
+			self.future.set_exception(e)
+
+
+	def result(self) -> Any:
+		"""	Return the probe's result. Exceptions of the probe function are raised.
+		"""
+		with Probe.lock:
+			for probe in Probe.probes:
+				probe._start()
+			check, self.check = self.check, None
+		result = self.future.result()
+		if check:
+			check()
+		return result
+
+
+	def __bool__(self) -> bool:
+		return bool(self.result())
+
+
+def _checkUpperTester() -> None:
+	"""	Check the result of the Upper Tester status probe, and exit if the UT interface is not usable.
+	"""
+	if not UPPERTESTERENABLED:
+		return
 	try:
-		headers = { UTCMD: f'Status'}
-		addHttpAuthorizationHeader(headers)
-		response = requests.post(UTURL, headers = headers)
-		match response.status_code:
+		match _upperTesterStatus.result().status_code:
 			case 200:
 				pass
 			case 401:
@@ -1400,3 +2494,10 @@ if UPPERTESTERENABLED:
 		shutdown()
 		quit(-1)
 
+
+# The following values influence the collection of skipped tests. They check whether 
+# there actually is a CSE (or remote CSE) running, and whether the Upper Tester interface
+# is usable. The checks are only done when a test module needs them.
+_upperTesterStatus = Probe(lambda: upperTester.send('Status') if UPPERTESTERENABLED else None)
+noCSE = Probe(lambda: not connectionPossible(cseURL), check = _checkUpperTester)
+noRemote = Probe(lambda: not connectionPossible(REMOTEcseURL))
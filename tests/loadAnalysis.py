@@ -0,0 +1,290 @@
+#
+#	loadAnalysis.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Analyse the throughput of load runs at increasing concurrency: fit the Universal
+#	Scalability Law (USL) and find the knee of the latency curve.
+#
+#	The USL models the throughput X at concurrency N as
+#
+#		X(N) = λN / (1 + σ(N-1) + κN(N-1))
+#
+#	with the throughput λ of a single client, the contention coefficient σ (serialisation,
+#	e.g. locks and queues) and the coherency coefficient κ (crosstalk between the clients,
+#	which makes the throughput decrease again beyond the peak concurrency).
+#
+
+from __future__ import annotations
+from typing import Optional
+
+import argparse, json, math
+from dataclasses import dataclass, field
+
+from rich.console import Console
+from rich.table import Table
+
+
+@dataclass
+class LoadPoint:
+	"""	The measurement of a load run at a concurrency.
+	"""
+	concurrency:float
+	throughput:float					# Requests per second
+	p99:Optional[float]		= None		# 99th percentile latency in seconds, if known
+
+	@property
+	def latency(self) -> float:
+		"""	The mean latency in seconds, according to Little's law.
+		"""
+		return self.concurrency / self.throughput if self.throughput > 0 else math.inf
+
+
+@dataclass
+class USLModel:
+	"""	The fitted coefficients of the Universal Scalability Law.
+	"""
+	lam:float			# Throughput of a single client
+	sigma:float			# Contention
+	kappa:float			# Coherency
+	r2:float			# Coefficient of determination of the fit
+
+	def throughput(self, n:float) -> float:
+		"""	Return the modelled throughput at concurrency n.
+		"""
+		return self.lam * n / (1.0 + self.sigma * (n - 1.0) + self.kappa * n * (n - 1.0))
+
+
+	@property
+	def peakConcurrency(self) -> float:
+		"""	The concurrency with the highest throughput. Infinite if the throughput doesn't decrease.
+		"""
+		if self.kappa <= 0.0 or self.sigma >= 1.0:
+			return math.inf if self.kappa <= 0.0 else 1.0
+		return math.sqrt((1.0 - self.sigma) / self.kappa)
+
+
+	@property
+	def maxThroughput(self) -> float:
+		"""	The highest throughput, at the peak concurrency. For a model without coherency
+			this is the asymptote λ/σ.
+		"""
+		if math.isinf(n := self.peakConcurrency):
+			return self.lam / self.sigma if self.sigma > 0.0 else math.inf
+		return self.throughput(n)
+
+
+def _fitCoefficients(points:list[LoadPoint], lam:float) -> tuple[float, float]:
+	"""	Fit σ and κ for a given λ with linear least squares, using the linearised form
+		N/C(N) - 1 = σ(N-1) + κN(N-1), with the relative capacity C(N) = X(N)/λ.
+		Both coefficients are constrained to be non-negative.
+	"""
+	sx1x1 = sx1x2 = sx2x2 = sx1y = sx2y = 0.0
+	for p in points:
+		n = p.concurrency
+		x1 = n - 1.0
+		x2 = n * (n - 1.0)
+		y = n * lam / p.throughput - 1.0
+		sx1x1 += x1 * x1
+		sx1x2 += x1 * x2
+		sx2x2 += x2 * x2
+		sx1y += x1 * y
+		sx2y += x2 * y
+	det = sx1x1 * sx2x2 - sx1x2 * sx1x2
+	if abs(det) > 1e-12 * max(1.0, sx1x1 * sx2x2):
+		sigma = (sx1y * sx2x2 - sx2y * sx1x2) / det
+		kappa = (sx2y * sx1x1 - sx1y * sx1x2) / det
+		if sigma >= 0.0 and kappa >= 0.0:
+			return sigma, kappa
+	# Constrained solutions with one coefficient set to 0. Choose the one with the smaller residual
+	candidates = [ (max(0.0, sx1y / sx1x1) if sx1x1 else 0.0, 0.0),
+				   (0.0, max(0.0, sx2y / sx2x2) if sx2x2 else 0.0) ]
+	return min(candidates, key = lambda c: _sse(points, USLModel(lam, c[0], c[1], 0.0)))
+
+
+def _sse(points:list[LoadPoint], model:USLModel) -> float:
+	return sum((p.throughput - model.throughput(p.concurrency)) ** 2 for p in points)
+
+
+def fitUSL(points:list[LoadPoint]) -> USLModel:
+	"""	Fit the Universal Scalability Law to measured throughputs.
+
+		λ is searched with a golden-section search that minimises the squared throughput
+		error, and σ and κ are fitted with linear least squares for each λ.
+
+		Args:
+			points: The measurements. At least three different concurrencies are needed.
+
+		Return:
+			The fitted model.
+
+		Raises:
+			ValueError: If there are not enough measurements.
+	"""
+	points = [ p for p in points if p.concurrency > 0 and p.throughput > 0 ]
+	if len({ p.concurrency for p in points }) < 3:
+		raise ValueError('at least three different concurrencies are needed to fit the USL')
+
+	def _error(lam:float) -> float:
+		sigma, kappa = _fitCoefficients(points, lam)
+		return _sse(points, USLModel(lam, sigma, kappa, 0.0))
+
+	# λ is at least the highest throughput per client, because the model can't scale better than linearly.
+	# The upper end of the search interval is doubled until the error increases there, e.g. because
+	# the smallest measured concurrency already has a lot of contention
+	perClient = max(p.throughput / p.concurrency for p in points)
+	lo, hi = perClient, perClient * 2.0
+	errorHi = _error(hi)
+	for _ in range(64):
+		if (errorNext := _error(hi * 2.0)) > errorHi:
+			break
+		hi, errorHi = hi * 2.0, errorNext
+	hi *= 2.0
+	ratio = (math.sqrt(5.0) - 1.0) / 2.0
+
+	a, b = lo, hi
+	c, d = b - ratio * (b - a), a + ratio * (b - a)
+	fc, fd = _error(c), _error(d)
+	for _ in range(100):
+		if fc <= fd:
+			b, d, fd = d, c, fc
+			c = b - ratio * (b - a)
+			fc = _error(c)
+		else:
+			a, c, fc = c, d, fd
+			d = a + ratio * (b - a)
+			fd = _error(d)
+		if b - a < 1e-9 * hi:
+			break
+	lam = (a + b) / 2.0
+	sigma, kappa = _fitCoefficients(points, lam)
+	model = USLModel(lam, sigma, kappa, 0.0)
+	mean = sum(p.throughput for p in points) / len(points)
+	sst = sum((p.throughput - mean) ** 2 for p in points)
+	model.r2 = 1.0 - _sse(points, model) / sst if sst > 0 else 1.0
+	return model
+
+
+def findKnee(xs:list[float], ys:list[float], logScale:bool = False) -> Optional[int]:
+	"""	Find the knee of an increasing, convex curve, e.g. latency over concurrency, with the
+		Kneedle method: the point that lies furthest below the line from the first to the last point,
+		after both axes are normalised to [0, 1].
+
+		Args:
+			xs: The x values in increasing order.
+			ys: The y values.
+			logScale: Use a logarithmic x axis, e.g. for concurrencies that double from run to run.
+
+		Return:
+			The index of the knee, or None if the curve has no knee, e.g. because it is linear or concave.
+	"""
+	if len(xs) < 3:
+		return None
+	if logScale:
+		xs = [ math.log(x) for x in xs ]
+	x0, x1 = xs[0], xs[-1]
+	y0, y1 = min(ys), max(ys)
+	if x1 <= x0 or y1 <= y0:
+		return None
+	distances = [ (x - x0) / (x1 - x0) - (y - y0) / (y1 - y0) for x, y in zip(xs, ys) ]
+	index = max(range(len(distances)), key = lambda i: distances[i])
+	return index if distances[index] > 0.0 and 0 < index < len(xs) - 1 else None
+
+
+@dataclass
+class LoadAnalysis:
+	"""	The analysis of a load curve.
+	"""
+	points:list[LoadPoint]
+	model:Optional[USLModel]	= None
+	knee:Optional[LoadPoint]	= None		# The measurement at which the latency starts to increase steeply
+	errors:list[str]			= field(default_factory = list)
+
+
+	def toJSON(self) -> dict:
+		result:dict = { 'points': [ { 'concurrency': p.concurrency, 'throughput': p.throughput, 'latency': p.latency, 'p99': p.p99 } for p in self.points ],
+						'knee': self.knee.concurrency if self.knee else None,
+						'errors': self.errors }
+		if self.model:
+			result['usl'] = { 'lambda': self.model.lam,
+							  'sigma': self.model.sigma,
+							  'kappa': self.model.kappa,
+							  'r2': self.model.r2,
+							  'peakConcurrency': None if math.isinf(self.model.peakConcurrency) else self.model.peakConcurrency,
+							  'maxThroughput': None if math.isinf(self.model.maxThroughput) else self.model.maxThroughput }
+		return result
+
+
+def analyze(points:list[LoadPoint]) -> LoadAnalysis:
+	"""	Fit the USL to the measurements and find the knee of the latency curve. Measurements at
+		the same concurrency are averaged.
+
+		The knee is determined from the p99 latencies if all measurements have them, and from the
+		mean latencies otherwise. The concurrencies are assumed to grow geometrically, so the
+		knee is searched on a logarithmic concurrency axis.
+
+		Args:
+			points: The measurements.
+
+		Return:
+			The analysis. If the USL cannot be fitted then the reason is in its *errors*.
+	"""
+	byConcurrency:dict[float, list[LoadPoint]] = {}
+	for p in points:
+		byConcurrency.setdefault(p.concurrency, []).append(p)
+	merged = []
+	for n in sorted(byConcurrency):
+		ps = byConcurrency[n]
+		p99s = [ p.p99 for p in ps if p.p99 is not None ]
+		merged.append(LoadPoint(n, sum(p.throughput for p in ps) / len(ps), max(p99s) if len(p99s) == len(ps) else None))
+
+	analysis = LoadAnalysis(merged)
+	if not merged:
+		analysis.errors.append('no measurements')
+		return analysis
+	try:
+		analysis.model = fitUSL(merged)
+	except ValueError as e:
+		analysis.errors.append(str(e))
+	latencies = [ p.p99 for p in merged ] if all(p.p99 is not None for p in merged) else [ p.latency for p in merged ]
+	if (index := findKnee([ p.concurrency for p in merged ], latencies, logScale = merged[0].concurrency >= 1)) is not None:	# type: ignore [arg-type]
+		analysis.knee = merged[index]
+	return analysis
+
+
+def printAnalysis(analysis:LoadAnalysis, title:str, console:Console) -> None:
+	"""	Print the measurements, the modelled throughput and the coefficients.
+	"""
+	model = analysis.model
+	table = Table(show_header = True, header_style = 'bright_blue', title = title)
+	table.add_column('Concurrency', justify = 'right')
+	table.add_column('Req / s\nMeasured | USL', justify = 'center')
+	table.add_column('Latency ms\nMean | p99', justify = 'center')
+	for p in analysis.points:
+		table.add_row(f'{p.concurrency:g}' + (' [yellow](knee)' if p is analysis.knee else ''),
+					  f'{p.throughput:9.1f} | ' + (f'{model.throughput(p.concurrency):9.1f}' if model else '        -'),
+					  f'{p.latency*1000:8.2f} | ' + (f'{p.p99*1000:8.2f}' if p.p99 is not None else '       -'))
+	console.print(table)
+	if model:
+		peak = model.peakConcurrency
+		console.print(f'USL: λ = {model.lam:.1f} req/s, contention σ = {model.sigma:.5f}, coherency κ = {model.kappa:.6f}, R² = {model.r2:.3f}')
+		console.print(f'     peak concurrency = {"∞" if math.isinf(peak) else f"{peak:.1f}"}, max throughput = {"∞" if math.isinf(model.maxThroughput) else f"{model.maxThroughput:.1f}"} req/s')
+	for e in analysis.errors:
+		console.print(f'[yellow]{e}')
+
+
+if __name__ == '__main__':
+	console = Console()
+
+	parser = argparse.ArgumentParser(description = 'Fit the Universal Scalability Law to load measurements and find the knee of the latency curve')
+	parser.add_argument('measurements', help = 'JSON file with a list of measurements, each with "concurrency" (or "parallel"), "throughput" (req/s) and optionally "p99" (seconds)')
+	parser.add_argument('--json', action = 'store', dest = 'jsonFile', default = None, metavar = 'FILE', help = 'also write the analysis to a JSON file')
+	args = parser.parse_args()
+
+	with open(args.measurements, encoding = 'utf-8') as f:
+		points = [ LoadPoint(m.get('concurrency', m.get('parallel')), m['throughput'], m.get('p99')) for m in json.load(f) ]
+	analysis = analyze(points)
+	printAnalysis(analysis, f'Load curve {args.measurements}', console)
+	if args.jsonFile:
+		with open(args.jsonFile, 'w', encoding = 'utf-8') as f:
+			json.dump(analysis.toJSON(), f, indent = 1)
@@ -0,0 +1,221 @@
+#
+#	loadWorkers.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Run load test tasks in worker processes instead of threads, so that the client
+#	is not limited by the GIL. Each worker process imports its own *init* module, so it
+#	has its own transports, sessions and originators. At the end the workers send
+#	their counters, latency histograms and created resources back to the main process,
+#	where they are merged into the test run's summary.
+#
+
+from __future__ import annotations
+from typing import Any, Callable, Optional, Tuple
+
+import multiprocessing, queue, time
+from dataclasses import dataclass, field
+
+import init
+from init import CREATE, RETRIEVE, DELETE, cseURL, APPID, RELEASEVERSION, ORIGINATOR, findXPath, uniqueRN
+from acme.etc.Types import ResponseStatusCode as RC, ResourceTypes as T
+from histograms import LatencyHistogram, mergeHistograms
+
+
+workerStartTimeout = 120.0
+""" Maximum time in seconds for the worker processes to start, i.e. to import the test modules. """
+
+workerTimeout = 3600.0
+""" Default maximum time in seconds for the worker processes to run a task. Workers that are still running afterwards are terminated. """
+
+
+#########################################################################
+#
+#	Tasks. They are run in the worker processes and return the number of
+#	errors and a list of items, e.g. the identifiers of created resources.
+#
+
+def createAEs(count:int, items:list[Any]) -> Tuple[int, list[Any]]:
+	"""	Create n AEs and return their (ri, rn).
+	"""
+	errors = 0
+	aes = []
+	for _ in range(count):
+		dct = 	{ 'm2m:ae' : {
+					'rn': uniqueRN(),
+					'api': APPID,
+					'rr': False,
+					'srv': [ RELEASEVERSION ]
+				}}
+		r, rsc = CREATE(cseURL, 'C', T.AE, dct)
+		if rsc == RC.CREATED:
+			aes.append((findXPath(r, 'm2m:ae/ri'), findXPath(r, 'm2m:ae/rn')))
+		else:
+			errors += 1
+	return errors, aes
+
+
+def retrieveAEs(count:int, items:list[Any]) -> Tuple[int, list[Any]]:
+	"""	Retrieve each of the (ri, rn) AEs n times.
+	"""
+	errors = 0
+	for _ in range(count):
+		for ri, rn in items:
+			r, rsc = RETRIEVE(f'{cseURL}/{rn}', ORIGINATOR)
+			if rsc != RC.OK or findXPath(r, 'm2m:ae/ri') != ri:
+				errors += 1
+	return errors, []
+
+
+def deleteAEs(count:int, items:list[Any]) -> Tuple[int, list[Any]]:
+	"""	Delete the (ri, rn) AEs and return the deleted ones.
+	"""
+	errors = 0
+	deleted = []
+	for ri, rn in items:
+		if DELETE(f'{cseURL}/{rn}', ORIGINATOR)[1] == RC.DELETED:
+			deleted.append((ri, rn))
+			init.registry.markDeleted(ri)	# The AE may have been created by another worker
+		else:
+			errors += 1
+	return errors, deleted
+
+
+tasks:dict[str, Callable[[int, list[Any]], Tuple[int, list[Any]]]] = {
+	'createAEs':	createAEs,
+	'retrieveAEs':	retrieveAEs,
+	'deleteAEs':	deleteAEs,
+}
+""" The tasks that can be run in the worker processes. """
+
+
+#########################################################################
+
+
+@dataclass
+class WorkerResults:
+	"""	The merged results of all worker processes.
+	"""
+	processes:int
+	requests:int								= 0
+	errors:int									= 0
+	duration:float								= 0.0		# From the common start until the last worker finished
+	cpuTime:float								= 0.0		# Sum of the workers' CPU times
+	latencies:dict[str, LatencyHistogram]		= field(default_factory = dict)
+	items:list[Any]								= field(default_factory = list)
+	failures:list[str]							= field(default_factory = list)		# Workers that crashed or raised an exception
+
+	def __str__(self) -> str:
+		total = mergeHistograms(list(self.latencies.values()))
+		return f'{self.requests} requests in {self.duration:.4f} s ({self.requests / self.duration if self.duration else 0.0:.1f} req/s) by {self.processes} processes, p99 {total.percentile(99)*1000:.2f} ms, client CPU {self.cpuTime:.2f} s'
+
+
+def _worker(task:str, index:int, count:int, items:list[Any], journal:Optional[str], barrier:Any, results:Any) -> None:
+	"""	The main function of a worker process.
+	"""
+	result:dict[str, Any] = { 'index': index }
+	try:
+		if journal:
+			init.registry.persist(journal)	# append to the main process' journal, so that a crash doesn't lose the created resources
+		init.clearLatencyHistograms()
+		init.requestCount = 0
+		barrier.wait(workerStartTimeout)	# start all workers at the same time
+		startTime, startCPU = time.perf_counter(), time.process_time()
+		errors, created = tasks[task](count, items)
+		result.update({ 'errors': errors,
+						'items': created,
+						'duration': time.perf_counter() - startTime,
+						'cpuTime': time.process_time() - startCPU,
+						'requests': init.requestCount,
+						'latencies': { k:h.toDict() for k, h in init.getLatencyHistograms().items() },
+					'transportMetrics': { n:m.toDict() for n, m in init.transportMetrics().items() } })
+	except Exception as e:
+		result['failure'] = f'worker {index}: {type(e).__name__}: {e}'
+	finally:
+		result['registry'] = init.registry.export()	# also the resources that were created before a failure
+		results.put(result)
+		init.shutdown()
+
+
+def runWorkers(task:str, processes:int, count:int, items:Optional[list[Any]] = None, merge:bool = True, timeout:float = workerTimeout) -> WorkerResults:
+	"""	Run a task in several worker processes at the same time.
+
+		Args:
+			task: The name of the task, see *tasks*.
+			processes: The number of worker processes.
+			count: The count that is passed to the task in each worker, e.g. the number of AEs to create.
+			items: Optional list of items, e.g. resource identifiers, which is divided between the workers.
+			merge: If True then the workers' request counts, latency histograms, transport metrics and created resources are merged
+				into this process' counters, so that they are included in the test run's summary.
+			timeout: The maximum time in seconds for the workers to run the task. Workers that are still running afterwards are terminated.
+
+		Return:
+			The merged results of all workers. The start-up of the worker processes is not included in the duration.
+	"""
+	if task not in tasks:
+		raise ValueError(f'unknown task: {task}. Must be one of {list(tasks)}')
+	context = multiprocessing.get_context('spawn')	# new processes with their own transports, not copies of this process' connections
+	barrier = context.Barrier(processes + 1)
+	resultQueue = context.Queue()
+	items = items or []
+	journal = init.registry.journal
+	workers = [ context.Process(target = _worker, args = (task, n, count, items[n::processes], journal, barrier, resultQueue), daemon = True)
+				for n in range(processes) ]
+	for w in workers:
+		w.start()
+
+	result = WorkerResults(processes)
+	try:
+		barrier.wait(workerStartTimeout)
+	except Exception:
+		barrier.abort()
+		result.failures.append('worker processes did not start')
+	startTime = time.perf_counter()
+
+	# Collect the results. Stop waiting when all workers have ended, even if some of them didn't send a result,
+	# or when the timeout is reached
+	collected:list[dict] = []
+	deadline = startTime + timeout
+	while len(collected) < processes:
+		try:
+			collected.append(resultQueue.get(timeout = max(0.0, min(1.0, deadline - time.perf_counter()))))
+		except queue.Empty:
+			if not any(w.is_alive() for w in workers) and resultQueue.empty():
+				break
+			if time.perf_counter() >= deadline:
+				result.failures.append(f'worker processes did not finish within {timeout:.0f} s')
+				break
+	result.duration = time.perf_counter() - startTime
+	for w in workers:
+		w.join(5.0)
+		if w.is_alive():
+			w.terminate()
+			w.join(5.0)
+	if len(collected) < processes:
+		result.failures.append(f'{processes - len(collected)} worker process(es) ended without a result')
+
+	for r in sorted(collected, key = lambda r: r['index']):
+		if merge:
+			init.registry.merge(r['registry'], journal = journal is None)	# The workers already wrote to the journal
+		if (failure := r.get('failure')):
+			result.failures.append(failure)
+			continue
+		result.requests += r['requests']
+		result.errors += r['errors']
+		result.cpuTime += r['cpuTime']
+		if merge:
+			metrics = init.transportMetrics()
+			for n, m in r['transportMetrics'].items():
+				if n in metrics:
+					metrics[n].merge(m)
+		result.items.extend(r['items'])
+		for key, h in r['latencies'].items():
+			histogram = LatencyHistogram.fromDict(h)
+			if key in result.latencies:
+				result.latencies[key].merge(histogram)
+			else:
+				result.latencies[key] = histogram
+	if merge:
+		init.requestCount += result.requests
+		init.mergeLatencyHistograms(result.latencies)
+	return result
@@ -0,0 +1,173 @@
+#
+#	loadgen.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Open-loop load generator. Requests are started at a target rate, independent of
+#	whether earlier requests have already finished. The latency of a request is measured
+#	from its intended start time, so that time spent waiting for a free client (because
+#	the CSE is slow to respond) is counted as well, instead of being omitted.
+#
+
+from __future__ import annotations
+from typing import Callable, Optional
+import math, random, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from threading import Lock
+
+from histograms import LatencyHistogram
+
+
+@dataclass
+class LoadResult:
+	"""	The result of an open-loop load run.
+	"""
+	targetRate:float
+	requests:int								= 0
+	errors:int									= 0
+	duration:float								= 0.0		# From the first intended start until the last response
+	maxLag:float								= 0.0		# Largest delay of an actual start after its intended start
+	latencies:LatencyHistogram					= field(default_factory = LatencyHistogram)		# From the intended start
+	serviceTimes:LatencyHistogram				= field(default_factory = LatencyHistogram)		# From the actual start
+
+	@property
+	def achievedRate(self) -> float:
+		"""	The number of completed requests per second.
+		"""
+		return self.requests / self.duration if self.duration > 0 else 0.0
+
+
+	def __str__(self) -> str:
+		s = self.latencies.summary()
+		return (f'{self.achievedRate:.1f}/{self.targetRate:g} req/s, '
+				f'p50 {s["p50"]*1000:.2f} | p99 {s["p99"]*1000:.2f} | max {s["max"]*1000:.2f} ms, '
+				f'errors {self.errors}')
+
+
+def schedule(rate:float, count:int, arrivals:str = 'poisson', seed:Optional[int] = None) -> list[float]:
+	"""	Return the intended start times of requests, relative to the start of the run.
+
+		Args:
+			rate: The target rate in requests per second.
+			count: The number of requests.
+			arrivals: Either 'poisson' for exponentially distributed, or 'constant' for equal gaps between the requests.
+			seed: Optional seed for the random gaps.
+
+		Return:
+			List of start times in seconds.
+	"""
+	if arrivals == 'constant':
+		return [ i / rate for i in range(count) ]
+	if arrivals != 'poisson':
+		raise ValueError(f'unknown arrival distribution: {arrivals}')
+	rnd = random.Random(seed)
+	times:list[float] = []
+	t = 0.0
+	for _ in range(count):
+		times.append(t)
+		t += rnd.expovariate(rate)
+	return times
+
+
+def rampSchedule(fromRate:float, toRate:float, duration:float, arrivals:str = 'poisson', seed:Optional[int] = None) -> list[float]:
+	"""	Return the intended start times of requests for a rate that changes linearly over time.
+
+		Args:
+			fromRate: The rate at the start in requests per second.
+			toRate: The rate at the end in requests per second.
+			duration: The duration in seconds.
+			arrivals: Either 'poisson' or 'constant', see *schedule()*.
+			seed: Optional seed for the random gaps.
+
+		Return:
+			List of start times in seconds.
+	"""
+	if arrivals not in ('poisson', 'constant'):
+		raise ValueError(f'unknown arrival distribution: {arrivals}')
+	# The expected number of requests until time t is the integral of the rate: fromRate*t + slope*t^2/2.
+	# Constant arrivals are at the times where this reaches 0, 1, 2, ..., Poisson arrivals at
+	# the times where it reaches the partial sums of exponentially distributed gaps with mean 1.
+	slope = (toRate - fromRate) / duration
+	rnd = random.Random(seed)
+	times:list[float] = []
+	n = 0.0
+	while True:
+		if slope == 0:
+			t = n / fromRate if fromRate > 0 else duration
+		else:
+			t = (math.sqrt(max(0.0, fromRate * fromRate + 2 * slope * n)) - fromRate) / slope
+		if t >= duration:
+			return times
+		times.append(t)
+		n += rnd.expovariate(1.0) if arrivals == 'poisson' else 1.0
+
+
+def runOpenLoop(request:Callable[[int], bool],
+				rate:float,
+				count:int,
+				arrivals:str = 'poisson',
+				maxConcurrency:int = 100,
+				seed:Optional[int] = None) -> LoadResult:
+	"""	Run requests at a target rate.
+
+		The requests are started by a dispatcher at their intended times and run by a pool of
+		*maxConcurrency* threads. If all threads are busy then a request waits for a free thread,
+		and this waiting time is part of the request's latency.
+
+		Args:
+			request: Function that sends the n-th request and returns True if it was successful.
+			rate: The target rate in requests per second.
+			count: The number of requests.
+			arrivals: Either 'poisson' or 'constant', see *schedule()*.
+			maxConcurrency: The maximum number of outstanding requests.
+			seed: Optional seed for the random arrivals.
+
+		Return:
+			The result of the run.
+	"""
+	return runSchedule(request, schedule(rate, count, arrivals, seed), rate, maxConcurrency)
+
+
+def runSchedule(request:Callable[[int], bool], times:list[float], targetRate:float, maxConcurrency:int = 100) -> LoadResult:
+	"""	Run requests at their intended start times. See *runOpenLoop()*.
+
+		Args:
+			request: Function that sends the n-th request and returns True if it was successful.
+			times: The intended start times in seconds, relative to the start of the run.
+			targetRate: The (average) target rate, for the result.
+			maxConcurrency: The maximum number of outstanding requests.
+
+		Return:
+			The result of the run.
+	"""
+	result = LoadResult(targetRate)
+	lock = Lock()
+	lastEnd = 0.0
+
+	def _run(n:int, intended:float) -> None:
+		nonlocal lastEnd
+		actual = time.perf_counter()
+		try:
+			ok = request(n)
+		except Exception:
+			ok = False
+		end = time.perf_counter()
+		with lock:
+			result.requests += 1
+			if not ok:
+				result.errors += 1
+			result.latencies.record(end - intended)
+			result.serviceTimes.record(end - actual)
+			result.maxLag = max(result.maxLag, actual - intended)
+			lastEnd = max(lastEnd, end)
+
+	with ThreadPoolExecutor(max_workers = maxConcurrency) as executor:
+		start = time.perf_counter()
+		for n, t in enumerate(times):
+			intended = start + t
+			if (delay := intended - time.perf_counter()) > 0:
+				time.sleep(delay)
+			executor.submit(_run, n, intended)
+	result.duration = lastEnd - start
+	return result
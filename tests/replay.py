@@ -0,0 +1,225 @@
+#
+#	replay.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Replay a request recording against a CSE. A recording is made with the
+#	"--record" option of runTests.py.
+#
+#	Resource names and originators are rewritten for each replay instance, so that
+#	several replays, and replays of the same recording, don't conflict with each other.
+#
+
+from __future__ import annotations
+from typing import Any, Optional
+
+import argparse, json, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from threading import Lock
+
+from rich.console import Console
+from rich.table import Table
+import init
+from histograms import LatencyHistogram, mergeHistograms
+from acme.etc.Types import Operation
+from acme.etc.Constants import Constants as C
+
+
+keptOriginators = [ init.ORIGINATOR, init.ORIGINATORSelfReg, init.ORIGINATOREmpty, init.ORIGINATORNotifResp ]
+""" Originators that are not rewritten. """
+
+
+def loadRecording(filename:str) -> list[dict]:
+	"""	Load a recording.
+
+		Args:
+			filename: The recording's file name.
+
+		Return:
+			List of the recorded requests, sorted by their send time.
+	"""
+	with open(filename, encoding = 'utf-8') as f:
+		entries = [ json.loads(line) for line in f if line.strip() ]
+	return sorted(entries, key = lambda e: e['ts'])
+
+
+class Rewriter:
+	"""	Rewrite the resource names, resource IDs and originators of recorded requests for a replay instance.
+
+		Names of created resources and originators get the instance's tag appended. Resource IDs
+		and AE-IDs that the CSE assigned during the recording are mapped to the ones that the CSE
+		assigned during the replay.
+	"""
+
+	def __init__(self, tag:str) -> None:
+		self.tag = tag
+		self.mapping:dict[str, str] = {}
+
+
+	def _add(self, value:str) -> str:
+		if not (mapped := self.mapping.get(value)):
+			mapped = self.mapping[value] = f'{value}_{self.tag}'
+		return mapped
+
+
+	def string(self, value:str) -> str:
+		"""	Rewrite the path segments of a string, e.g. of a URL or a resource ID.
+		"""
+		if '/' not in value:
+			return self.mapping.get(value, value)
+		return '/'.join([ self.mapping.get(s, s) for s in value.split('/') ])
+
+
+	def originator(self, originator:Optional[str]) -> Optional[str]:
+		if not originator or originator in keptOriginators or not originator.startswith(('C', 'S')):
+			return self.string(originator) if originator else originator
+		return self._add(originator)
+
+
+	def content(self, value:Any, isResource:bool = False) -> Any:
+		"""	Rewrite a request's content. The names of created resources are added to the mapping.
+
+			Args:
+				value: The content to rewrite.
+				isResource: True if value is a resource representation, e.g. the content of a CREATE request.
+		"""
+		if isinstance(value, dict):
+			result = {}
+			for k, v in value.items():
+				if k == 'rn' and isResource and isinstance(v, str):
+					result[k] = self._add(v)
+				else:
+					result[k] = self.content(v, isResource and k.startswith('m2m:'))
+			return result
+		if isinstance(value, list):
+			return [ self.content(v, isResource) for v in value ]
+		if isinstance(value, str):
+			return self.string(value)
+		return value
+
+
+	def learn(self, recordedIDs:dict[str, str], response:Any) -> None:
+		"""	Map the resource ID and AE-ID of a recorded CREATE request to the ones of the replayed request.
+		"""
+		if not isinstance(response, dict) or len(response) != 1:
+			return
+		resource = next(iter(response.values()))
+		if not isinstance(resource, dict):
+			return
+		for k, v in recordedIDs.items():
+			if (n := resource.get(k)) and n != v:
+				self.mapping[v] = n
+
+
+@dataclass
+class ReplayResults:
+	"""	The results of a replay, per operation.
+	"""
+	latencies:dict[str, LatencyHistogram]	= field(default_factory = dict)
+	requests:dict[str, int]					= field(default_factory = dict)
+	mismatches:dict[str, int]				= field(default_factory = dict)		# Response status codes that differ from the recording
+	errors:dict[str, int]					= field(default_factory = dict)		# Requests that could not be sent (RSC 5103)
+	lock:Lock								= field(default_factory = Lock)
+
+	def record(self, operation:str, duration:float, rsc:int, recordedRsc:int) -> None:
+		with self.lock:
+			if not (histogram := self.latencies.get(operation)):
+				histogram = self.latencies[operation] = LatencyHistogram()
+			histogram.record(duration)
+			self.requests[operation] = self.requests.get(operation, 0) + 1
+			if rsc != recordedRsc:
+				self.mismatches[operation] = self.mismatches.get(operation, 0) + 1
+			if rsc == 5103:
+				self.errors[operation] = self.errors.get(operation, 0) + 1
+
+
+def replay(entries:list[dict], results:ReplayResults, speed:Optional[float], tag:str) -> None:
+	"""	Replay a recording once.
+
+		Args:
+			entries: The recorded requests.
+			results: The results to add the replayed requests to.
+			speed: The pacing relative to the recording, e.g. 2.0 for twice as fast. If None then the requests are sent as fast as possible.
+			tag: The tag that is appended to resource names and originators.
+	"""
+	rewriter = Rewriter(tag)
+	startRecording = entries[0]['ts'] if entries else 0.0
+	startReplay = time.perf_counter()
+	for entry in entries:
+		if speed is not None and (delay := (entry['ts'] - startRecording) / speed - (time.perf_counter() - startReplay)) > 0:
+			time.sleep(delay)
+		operation = Operation(entry['op'])
+		headers = { k:rewriter.string(v) if isinstance(v, str) else v for k, v in entry['hd'].items() } if 'hd' in entry else None
+		if headers and C.hfOrigin in headers:
+			headers[C.hfOrigin] = rewriter.originator(headers[C.hfOrigin])
+		startTime = time.perf_counter()
+		response, rsc = init.sendRequest(operation,
+										 rewriter.string(entry['to']),
+										 rewriter.originator(entry['fr']),
+										 ty = entry.get('ty'),
+										 data = rewriter.content(entry['pc'], operation == Operation.CREATE) if 'pc' in entry else None,
+										 ct = entry.get('ct'),
+										 headers = headers)
+		results.record(operation.name, time.perf_counter() - startTime, rsc, entry['rsc'])
+		if 'ids' in entry and rsc == entry['rsc']:
+			rewriter.learn(entry['ids'], response)
+
+
+if __name__ == '__main__':
+	console = Console()
+
+	def checkPositive(value:str) -> float:
+		fvalue = float(value)
+		if not fvalue > 0:
+			raise argparse.ArgumentTypeError(f'{value} is invalid. It must be a positive value')
+		return fvalue
+
+	parser = argparse.ArgumentParser(description = 'Replay a request recording against a CSE')
+	parser.add_argument('recording', help = 'the recording file, made with "runTests.py --record"')
+	groupPacing = parser.add_mutually_exclusive_group()
+	groupPacing.add_argument('--speed', action = 'store', dest = 'speed', type = checkPositive, default = 1.0, help = 'replay n times faster than recorded (default: 1.0, the original pacing)')
+	groupPacing.add_argument('--max-rate', action = 'store_true', dest = 'maxRate', default = False, help = 'replay as fast as possible')
+	parser.add_argument('--instances', '-i', action = 'store', dest = 'instances', type = int, default = 1, help = 'replay n instances of the recording in parallel (default: 1)')
+	parser.add_argument('--notifications', action = 'store_true', dest = 'notifications', default = False, help = 'run the notification server during the replay')
+	args = parser.parse_args()
+
+	entries = loadRecording(args.recording)
+	if not entries:
+		console.print('[yellow]Empty recording')
+		quit()
+	if args.notifications:
+		init.startNotificationServer()
+
+	results = ReplayResults()
+	runID = uuid.uuid4().hex[:6]
+	startTime = time.perf_counter()
+	with ThreadPoolExecutor(max_workers = args.instances) as executor:
+		list(executor.map(lambda i: replay(entries, results, None if args.maxRate else args.speed, f'{runID}{i}'), range(args.instances)))
+	duration = time.perf_counter() - startTime
+
+	if args.notifications:
+		init.stopNotificationServer()
+
+	# Print Summary
+	total = mergeHistograms(list(results.latencies.values()))
+	s = total.summary()
+	table = Table(show_header = True, header_style = 'bright_blue', show_footer = True, footer_style = '',
+				  title = f'Replay of {len(entries)} requests, {args.instances} instance(s), {"max rate" if args.maxRate else f"{args.speed:g}x speed"}')
+	table.add_column('Operation', footer = 'Totals', no_wrap = True)
+	table.add_column('Requests', footer = f'{total.count}', justify = 'right')
+	table.add_column('Req / s', footer = f'{total.count / duration:.1f}', justify = 'right')
+	table.add_column('Errors', footer = f'{sum(results.errors.values())}', justify = 'right')
+	table.add_column('RSC Mismatches', footer = f'{sum(results.mismatches.values())}', justify = 'right')
+	table.add_column('Latency ms\nMean | p50 | p90 | p99 | Max', footer = f'{s["mean"]*1000:7.2f} | {s["p50"]*1000:7.2f} | {s["p90"]*1000:7.2f} | {s["p99"]*1000:7.2f} | {s["max"]*1000:7.2f}', justify = 'center')
+	for operation, histogram in sorted(results.latencies.items()):
+		s = histogram.summary()
+		table.add_row(operation,
+					  f'{results.requests[operation]}',
+					  f'{results.requests[operation] / duration:.1f}',
+					  f'{results.errors.get(operation, 0)}',
+					  f'{results.mismatches.get(operation, 0)}',
+					  f'{s["mean"]*1000:7.2f} | {s["p50"]*1000:7.2f} | {s["p90"]*1000:7.2f} | {s["p99"]*1000:7.2f} | {s["max"]*1000:7.2f}')
+	console.print(table)
+	console.print(f'Duration: {duration:.3f} s')
+	init.shutdown()
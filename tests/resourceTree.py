@@ -0,0 +1,172 @@
+#
+#	resourceTree.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Create a declarative tree of resources in parallel. A parent is always created
+#	before its children, and siblings are created concurrently, with a bounded number
+#	of outstanding requests.
+#
+#	A node of the tree is a dictionary with the resource, e.g. { 'm2m:cnt': { 'rn': 'cnt', 'mni': 10 } },
+#	and these optional entries:
+#
+#	- children:		A list of child nodes.
+#	- count:		Create the node this many times. Resource names get the number appended.
+#	- ty:			The resource type, if it cannot be determined from the resource's type name.
+#	- originator:	The originator for this node and its children. The default is the
+#					AE-ID of the closest AE above the node, or the originator given to *build()*.
+#
+
+from __future__ import annotations
+from typing import Optional
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from threading import Condition
+
+from acme.etc.Types import ResourceTypes as T, ResponseStatusCode as RC, JSON
+from init import CREATE, cseURL, ORIGINATOR, ORIGINATORSelfReg, findXPath
+
+
+resourceTypes:dict[str, T] = {
+	'm2m:ae':	T.AE,
+	'm2m:acp':	T.ACP,
+	'm2m:cnt':	T.CNT,
+	'm2m:cin':	T.CIN,
+	'm2m:grp':	T.GRP,
+	'm2m:sub':	T.SUB,
+	'm2m:crs':	T.CRS,
+	'm2m:ts':	T.TS,
+	'm2m:tsi':	T.TSI,
+	'm2m:fcnt':	T.FCNT,
+	'm2m:nod':	T.NOD,
+	'm2m:smd':	T.SMD,
+}
+""" Resource types for the type names of the resources in a tree. """
+
+treeBuilderWorkers = 16
+""" The default maximum number of concurrent requests. """
+
+
+@dataclass
+class TreeNode:
+	"""	A created resource of a tree.
+	"""
+	ri:str
+	rn:str
+	path:str			# Structured path, relative to the CSEBase
+	url:str
+	ty:T
+	originator:str		# The originator that created the resource
+	resource:JSON		# The created resource as returned by the CSE, e.g. { 'm2m:cnt': { ... } }
+
+
+class TreeBuildError(Exception):
+	"""	Raised when a resource of a tree could not be created. The children of that resource
+		are not created. The resources that were created are in *index*, so they can be removed.
+	"""
+
+	def __init__(self, message:str, index:dict[str, TreeNode], errors:list[str]) -> None:
+		super().__init__(message)
+		self.index = index
+		self.errors = errors
+
+
+def expandNode(node:JSON) -> list[JSON]:
+	"""	Return the copies of a node with a *count*. Resource names get the copy's number appended.
+	"""
+	if (count := node.get('count')) is None:
+		return [ node ]
+	result = []
+	tpe = _typeName(node)
+	for i in range(count):
+		resource = dict(node[tpe])
+		if 'rn' in resource:
+			resource['rn'] = f'{resource["rn"]}{i}'
+		result.append({ k:v for k, v in node.items() if k != 'count' } | { tpe: resource })
+	return result
+
+
+def _typeName(node:JSON) -> str:
+	for k in node:
+		if ':' in k:	# The resource's type name, e.g. m2m:cnt
+			return k
+	raise ValueError(f'no resource in tree node: {node}')
+
+
+def build(nodes:JSON|list[JSON], parentURL:str = cseURL, originator:Optional[str] = None, maxWorkers:int = treeBuilderWorkers) -> dict[str, TreeNode]:
+	"""	Create one or more trees of resources.
+
+		Args:
+			nodes: The root node, or a list of root nodes.
+			parentURL: The URL of the resource under which the roots are created.
+			originator: The originator for the roots. If None then AEs register with a self-registration
+				originator, and all other resources are created with the admin originator.
+			maxWorkers: The maximum number of concurrent requests.
+
+		Return:
+			Dictionary of the created resources' structured paths, relative to *parentURL*, and the resources.
+
+		Raises:
+			TreeBuildError: If one or more resources could not be created. All other resources are still created.
+	"""
+	index:dict[str, TreeNode] = {}
+	errors:list[str] = []
+	condition = Condition()
+	pending = 0
+
+	with ThreadPoolExecutor(max_workers = maxWorkers) as executor:
+
+		def _submit(node:JSON, url:str, path:str, originator:Optional[str]) -> None:
+			nonlocal pending
+			with condition:
+				pending += 1
+			executor.submit(_create, node, url, path, originator)
+
+
+		def _create(node:JSON, url:str, path:str, originator:Optional[str]) -> None:
+			nonlocal pending
+			try:
+				tpe = _typeName(node)
+				ty = node.get('ty', resourceTypes.get(tpe))
+				if ty is None:
+					raise ValueError(f'unknown resource type: {tpe}. Set "ty" in the node')
+				if not (creator := node.get('originator', originator)):
+					creator = ORIGINATORSelfReg if ty == T.AE else ORIGINATOR
+				r, rsc = CREATE(url, creator, ty, { tpe: node[tpe] })
+				if rsc != RC.CREATED:
+					with condition:
+						errors.append(f'{path}/{node[tpe].get("rn", "")}'.lstrip('/') + f': {rsc} {r}')
+					return
+				rn = findXPath(r, f'{tpe}/rn')
+				treeNode = TreeNode(findXPath(r, f'{tpe}/ri'), rn, f'{path}/{rn}'.lstrip('/'), f'{url}/{rn}', ty, creator, r)
+				with condition:
+					index[treeNode.path] = treeNode
+				childOriginator = findXPath(r, f'{tpe}/aei') if ty == T.AE else creator
+				for child in node.get('children', []):
+					for c in expandNode(child):
+						_submit(c, treeNode.url, treeNode.path, childOriginator)
+			except Exception as e:
+				with condition:
+					errors.append(f'{path or parentURL}: {e}')
+			finally:
+				with condition:
+					pending -= 1
+					condition.notify_all()
+
+
+		for root in (nodes if isinstance(nodes, list) else [ nodes ]):
+			for n in expandNode(root):
+				_submit(n, parentURL, '', originator)
+		with condition:
+			condition.wait_for(lambda: pending == 0)
+
+	if errors:
+		raise TreeBuildError(f'{len(errors)} resource(s) could not be created, first: {errors[0]}', index, errors)
+	return index
+
+
+def roots(index:dict[str, TreeNode]) -> list[TreeNode]:
+	"""	Return the root resources of a created tree, e.g. to delete the tree again.
+	"""
+	return [ n for p, n in index.items() if '/' not in p ]
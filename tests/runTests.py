@@ -9,10 +9,12 @@
 
 from __future__ import annotations
 
-import os, fnmatch, importlib, time, argparse
+import os, sys, fnmatch, importlib, time, argparse, ast, json, subprocess, tempfile, queue
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 from types import ModuleType
-from typing import Tuple
-from inspect import getmembers, isfunction, isclass, getsourcelines
+from typing import Optional, Tuple
+from inspect import getmembers, isclass
 from unittest import SkipTest
 
 from rich.console import Console
@@ -20,6 +22,8 @@ from rich.table import Table
 from rich.style import Style
 from rich.progress import track
 import init
+from histograms import LatencyHistogram, mergeHistograms
+import tracing
 from acme.etc.Constants import Constants as C
 
 
@@ -27,10 +31,13 @@ from acme.etc.Constants import Constants as C
 # TODO list all test cases, but don't run them
 
 loadTests 	= [ 'testLoad' ]
+exclusiveTests = [ 'testLoad', 'testExpiration', 'testPCH_PCU', 'testREQ', 'testRequests', 'testRemote', 'testUpperTester' ]	# Not run in parallel with other suites, e.g. because they reconfigure the CSE
 singleTests = []
+catalogFile	= '.testCatalog.json'		# Cache for the test catalog
+historyFile	= '.testDurations.json'		# Durations of the test suites and test cases of earlier runs
+registryFile	= '.createdResources.jsonl'	# Default journal of the created resources, see init.ResourceRegistry
 
-def isRunTest(module:ModuleType) -> bool:
-	name = module.__name__
+def isRunTest(name:str) -> bool:
 	if args.runAll:						# run all tests
 		return True
 	if len(singleTests) > 0:			# run only specified tests
@@ -38,16 +45,250 @@ def isRunTest(module:ModuleType) -> bool:
 	return (len([ n for n in loadTests if name.startswith(n) ]) > 0) == args.loadTestsOnly
 
 
-def getTestFunctionsFromModule(module:ModuleType, sort:bool = False) -> list[Tuple[str, int]]:
-	result:list[Tuple[str, int]] = []
-	for _, cls in getmembers(module, isclass):						# Look for all classes of a module
-		if cls.__module__ == module.__name__:						# If the class defined in the module itself
-			result.extend([ (f[0], getsourcelines(f[1])[1])			# Add the names and line numbers of all functions that start with 'test_'
-							for f in getmembers(cls, isfunction) 
-							if f[0].startswith('test_')
-						  ])
-	
-	return result if sort else sorted(result, key = lambda x:x[1])	# Sort by line number of occurence in the source file
+def scanTestModule(filename:str) -> dict:
+	"""	Scan a test module's source without importing it.
+
+		Args:
+			filename: The file name of the test module.
+		
+		Return:
+			Dictionary with the module's classes, whether it has a *run()* function, and the
+			names and line numbers of all test functions (functions that start with 'test_')
+			of the classes defined in the module.
+	"""
+	with open(filename, encoding = 'utf-8') as f:
+		tree = ast.parse(f.read(), filename)
+	classes:list[str] = []
+	tests:dict[str, int] = {}
+	hasRun = False
+	for node in tree.body:
+		if isinstance(node, ast.ClassDef):
+			classes.append(node.name)
+			for f in node.body:
+				if isinstance(f, (ast.FunctionDef, ast.AsyncFunctionDef)) and f.name.startswith('test_'):
+					tests[f.name] = f.lineno			# A redefinition replaces an earlier one
+		elif isinstance(node, ast.FunctionDef) and node.name == 'run':
+			hasRun = True
+	return { 'classes': classes, 'hasRun': hasRun, 'tests': sorted(tests.items(), key = lambda x:x[1]) }
+
+
+def getTestCatalog(filenames:list[str]) -> dict[str, dict]:
+	"""	Return the test catalog for the test modules. Only modules that have changed since
+		the last run are scanned again, the others are taken from the catalog cache file.
+
+		Args:
+			filenames: The file names of the test modules.
+
+		Return:
+			Dictionary of module names and their scan results, see *scanTestModule()*.
+	"""
+	try:
+		with open(catalogFile, encoding = 'utf-8') as f:
+			cached = json.load(f)
+	except (OSError, ValueError):
+		cached = {}
+	catalog:dict[str, dict] = {}
+	changed = False
+	for filename in filenames:
+		mtime = os.path.getmtime(filename)
+		if (entry := cached.get(filename)) is None or entry['mtime'] != mtime:
+			entry = scanTestModule(filename)
+			entry['mtime'] = mtime
+			changed = True
+		catalog[filename[:-3]] = entry
+		cached[filename] = entry
+	if changed:
+		try:
+			with open(catalogFile, 'w', encoding = 'utf-8') as f:
+				json.dump({ k:v for k,v in cached.items() if k in filenames }, f)
+		except OSError:
+			pass	# Just don't cache
+	return catalog
+
+
+def getTestFunctions(name:str, sort:bool = False) -> list[Tuple[str, int]]:
+	"""	Return the names and line numbers of a test module's test functions.
+
+		Args:
+			name: The module name.
+			sort: If True then sort the functions alphabetically, otherwise by line number of occurence in the source file.
+		
+		Return:
+			List of (name, line number) tuples.
+	"""
+	tests = [ tuple(t) for t in catalog[name]['tests'] ]
+	return sorted(tests) if sort else tests	# type:ignore[return-value]
+
+
+def loadDurationHistory() -> dict[str, dict]:
+	"""	Load the durations of the test suites and test cases of earlier runs.
+
+		Return:
+			Dictionary of test suite names and their durations. Each entry contains the 'exec', 'sleep'
+			and 'proc' times of the suite, and the same times for each test case in 'tests'.
+	"""
+	try:
+		with open(historyFile, encoding = 'utf-8') as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+
+def saveDurationHistory(durations:dict[str, dict], partial:bool) -> None:
+	"""	Merge the durations of this run into the history file.
+
+		Args:
+			durations: Dictionary of test suite names and their durations, see *loadDurationHistory()*.
+			partial: If True then only some test cases of the suites were run. The suites' durations are then not updated.
+	"""
+	history = loadDurationHistory()
+	for name, d in durations.items():
+		entry = history.setdefault(name, { 'tests': {} })
+		entry['tests'].update(d['tests'])
+		if not partial:
+			entry.update({ k:d[k] for k in ('exec', 'sleep', 'proc') })
+	try:
+		with open(historyFile, 'w', encoding = 'utf-8') as f:
+			json.dump(history, f, indent = 1)
+	except OSError:
+		pass
+
+
+def removeRegisteredResources(filename:Optional[str]) -> None:
+	"""	Delete the registered resources that still exist, in parallel. Only the top-level
+		resources are deleted.
+
+		Args:
+			filename: Optional registry journal. Its resources are deleted as well, and the journal is removed if all resources could be deleted.
+	"""
+	if filename:
+		init.registry.load(filename)
+	if init.registry.roots():
+		deleted, failed = init.registry.tearDown()
+		console.print(f'[bright_blue]Deleted [bold]{deleted}[/bold] remaining top-level resources' + (f', [red]{failed} could not be deleted' if failed else ''))
+	else:
+		failed = 0
+	if filename and not failed:
+		init.registry.close()
+		try:
+			os.remove(filename)
+		except FileNotFoundError:
+			pass
+
+
+def isExclusiveTest(name:str) -> bool:
+	return len([ n for n in exclusiveTests if name.startswith(n) ]) > 0
+
+
+def runSuiteInWorker(name:str, slot:int) -> Tuple[dict, str]:
+	"""	Run a test suite in a separate worker process. Each worker slot uses its own namespace
+		for resource names and its own notification server port, so that suites that run at
+		the same time don't collide.
+
+		Args:
+			name: The test suite's module name.
+			slot: The number of the worker slot, starting with 1.
+
+		Return:
+			Tuple (the worker's results, the worker's console output)
+	"""
+	fd, resultsFile = tempfile.mkstemp(suffix = '.json')
+	os.close(fd)
+	cmd = [ sys.executable, sys.argv[0], name, '--results-file', resultsFile, '--run-count', str(args.numberOfRuns) ]
+	if args.verboseRequests:	cmd.append('--verbose-requests')
+	if args.disableTearDown:	cmd.append('--disable-teardown')
+	if args.showSkipped:		cmd.append('--show-skipped')
+	if not args.failFast:		cmd.append('--no-failfast')
+	if args.testCaseName:		cmd.extend([ '--run-tests', *args.testCaseName ])
+	if args.traceFile:			cmd.extend([ '--trace', args.traceFile ])	# the worker returns its events with the results
+	if args.registryFile:		cmd.extend([ '--registry', args.registryFile ])	# the workers append to the same journal
+	env = dict(os.environ, ACMETEST_NAMESPACE = f'w{slot}', ACMETEST_NOTIFICATIONPORT = str(init.NOTIFICATIONPORT + slot))
+	process = subprocess.run(cmd, env = env, capture_output = True, text = True)
+	try:
+		with open(resultsFile, encoding = 'utf-8') as f:
+			workerResults = json.load(f)
+	except (OSError, ValueError):
+		workerResults = { 'results': { name: ( 0, 1, 0, 0, 0, 0, 0.0, 0.0 ) }, 'requestCount': 0, 'durations': {}, 'latencies': {}, 'traceEvents': [], 'transportMetrics': {} }	# count the crashed worker as an error
+	finally:
+		os.remove(resultsFile)
+	return workerResults, process.stdout + process.stderr
+
+
+def runSuitesInParallel(names:list[str], jobs:int) -> Tuple[dict, int, dict, dict, list]:
+	"""	Run test suites in parallel in worker processes. Exclusive test suites are run afterwards, one at a time.
+
+		The suites are scheduled longest first, according to the durations of earlier runs. Suites
+		without a known duration are scheduled first.
+
+		Args:
+			names: The module names of the test suites to run.
+			jobs: The number of parallel worker processes.
+
+		Return:
+			Tuple (merged results of all suites, number of requests, durations of all suites, latency histograms of all suites, trace events of the workers)
+	"""
+	results:dict = {}
+	durations:dict = {}
+	latencies:dict = {}
+	traceEvents:list = []
+	requestCount = 0
+	mergeLock = Lock()		# The results are merged by the pool's threads
+	history = loadDurationHistory()
+	slots:queue.Queue = queue.Queue()
+	for slot in range(1, jobs + 1):
+		slots.put(slot)
+
+	def _run(name:str) -> None:
+		nonlocal requestCount
+		slot = slots.get()
+		try:
+			workerResults, output = runSuiteInWorker(name, slot)
+		finally:
+			slots.put(slot)
+		with mergeLock:
+			console.print(f'[bright_blue]Results from [bold]{name}[/bold] (worker {slot})')
+			console.print(output, markup = False, highlight = False)
+			results.update(workerResults['results'])
+			durations.update(workerResults['durations'])
+			latencies.update({ n:{ k:LatencyHistogram.fromDict(h) for k, h in l.items() } for n, l in workerResults['latencies'].items() })
+			traceEvents.extend(workerResults['traceEvents'])
+			metrics = init.transportMetrics()
+			for n, m in workerResults['transportMetrics'].items():
+				if n in metrics:
+					metrics[n].merge(m)
+			requestCount += workerResults['requestCount']
+
+	with ThreadPoolExecutor(max_workers = jobs) as executor:
+		list(executor.map(_run, sorted([ n for n in names if not isExclusiveTest(n) ], 
+									   key = lambda n: history.get(n, {}).get('exec', float('inf')), 
+									   reverse = True)))
+	for name in [ n for n in names if isExclusiveTest(n) ]:
+		_run(name)
+	return { n:results[n] for n in sorted(results) }, requestCount, durations, latencies, traceEvents
+
+
+def formatLatencies(histogram:LatencyHistogram) -> str:
+	"""	Format the percentiles and the maximum of a latency histogram in milliseconds for the summary.
+	"""
+	s = histogram.summary()
+	return f'{s["p50"]*1000:7.2f} | {s["p90"]*1000:7.2f} | {s["p99"]*1000:7.2f} | {s["p99.9"]*1000:7.2f} | {s["max"]*1000:7.2f}'
+
+
+def exportLatencies(filename:str, latencies:dict[str, dict[str, LatencyHistogram]]) -> None:
+	"""	Write the latency histograms of all test suites to a JSON file.
+
+		For each test suite the file contains the summary of all requests ("total"), and the summary
+		and the histogram for each combination of binding, operation and resource type ("requests").
+
+		Args:
+			filename: The file to write to.
+			latencies: Dictionary of test suite names and their histograms.
+	"""
+	data = { name: { 'total': mergeHistograms(list(histograms.values())).summary(),
+					 'requests': { k:dict(h.summary(), histogram = h.toDict()) for k, h in sorted(histograms.items()) } }
+			 for name, histograms in latencies.items() }
+	with open(filename, 'w', encoding = 'utf-8') as f:
+		json.dump(data, f, indent = 1)
 
 
 if __name__ == '__main__':
@@ -56,8 +297,10 @@ if __name__ == '__main__':
 	totalRunTests 				= 0
 	totalSuites   				= 0
 	totalSkipped  				= 0
-	modules:list[ModuleType]	= []
 	results						= {}
+	durations					= {}
+	latencies					= {}
+	traceEvents					= []
 
 	def checkPositive(value:str) -> int:
 		ivalue = int(value)
@@ -76,6 +319,12 @@ if __name__ == '__main__':
 	parser.add_argument('--run-tests', '-run', action='store', dest='testCaseName', nargs='+', type=str, default=None, help='run only the specified test cases from the set of test suites')
 	parser.add_argument('--show-skipped', action='store_true', dest='showSkipped', default=False, help='show skipped test cases in summary')
 	parser.add_argument('--no-failfast', action='store_false', dest='failFast', default=True, help='continue running test cases after a failure')
+	parser.add_argument('--jobs', '-j', action='store', dest='jobs', type=checkPositive, default=1, help='run n test suites in parallel worker processes (default: 1)')
+	parser.add_argument('--latency-file', action='store', dest='latencyFile', default=None, help='write the request latency percentiles and histograms per test suite to a JSON file')
+	parser.add_argument('--trace', action='store', dest='traceFile', default=None, metavar='FILE', help='record spans of the test cases, requests, sleeps and Upper Tester calls, and write them as a Chrome trace file (can be opened with Perfetto)')
+	parser.add_argument('--record', action='store', dest='recordFile', default=None, metavar='FILE', help='append all sent requests to a recording file, which can be replayed with replay.py')
+	parser.add_argument('--registry', action='store', dest='registryFile', nargs='?', const=registryFile, default=None, metavar='FILE', help=f'persist the registry of created resources to a journal file (default: {registryFile}), so that --run-teardown can delete them after a crashed run')
+	parser.add_argument('--results-file', action='store', dest='resultsFile', default=None, help=argparse.SUPPRESS)	# used by the worker processes
 
 	
 	groupList = parser.add_mutually_exclusive_group()
@@ -84,50 +333,35 @@ if __name__ == '__main__':
 
 	parser.add_argument('TESTSUITE', nargs='*', help='specific test suites to run. Run all test suites if empty')
 	args = parser.parse_args()
+	if args.recordFile and args.jobs > 1:
+		parser.error('--record cannot be used with parallel test suites (--jobs)')
 
 	# Clean optional single tests
 	singleTests = [ testSuite if not testSuite.endswith('.py') else testSuite[:-3] for testSuite in args.TESTSUITE ]
 
 
-	# Get all filenames with tests and load them as modules
+	# Get all filenames with tests and build the catalog of test suites and test cases
+	# from their sources. The modules are only imported when they are actually run.
 	filenames = fnmatch.filter(os.listdir('.'), 'test*.py')
 	filenames.sort()
 	init.verboseRequests = args.verboseRequests 
-
-	# Import all test* modules.
-	for name in filenames:
-		modules.append(importlib.import_module(name[:-3]))
+	catalog = getTestCatalog(filenames)
+	names = list(catalog.keys())
 	
 	# List the test functions for all test suites. Then exit.
-	if args.listTests:
-		for m in modules:
-			if isRunTest(m):
-				console.print(f'[bright_blue]{m.__name__}')
-				for f in getTestFunctionsFromModule(m):
-					console.print(f'    {f[0]}')
-		init.shutdown()
-		quit()
-	
-	# List the test functions for all test suites (sorted). Then exit.
-	if args.listTestsSorted:
-		for m in modules:
-			if isRunTest(m):
-				console.print(f'[bright_blue]{m.__name__}')
-				for f in getTestFunctionsFromModule(m, True):
+	if args.listTests or args.listTestsSorted:
+		for n in names:
+			if isRunTest(n):
+				console.print(f'[bright_blue]{n}')
+				for f in getTestFunctions(n, args.listTestsSorted):
 					console.print(f'    {f[0]}')
 		init.shutdown()
 		quit()
 		
 	# If test cases are given then only run those modules that contain the test cases
 	if args.testCaseName:
-		_modules:list[ModuleType] = []
-		for m in modules:
-			if isRunTest(m):
-				for f in getTestFunctionsFromModule(m):
-					if f[0] in args.testCaseName:
-						_modules.append(m)
-						break
-		modules = _modules
+		names = [ n for n in names 
+				  if isRunTest(n) and any(f[0] in args.testCaseName for f in getTestFunctions(n)) ]
 	
 
 
@@ -135,16 +369,27 @@ if __name__ == '__main__':
 	totalTimeStart		  = time.perf_counter()
 	totalProcessTimeStart = time.process_time()
 	totalSleepTime		  = 0.0
+	totalUTTime			  = 0.0
 	init.requestCount	  = 0
 	init.testCaseNames	  = args.testCaseName
 	init.enableTearDown   = not args.disableTearDown
+	if args.traceFile:
+		tracing.enable()
+	if args.recordFile:
+		init.startRecording(args.recordFile)
+	if args.registryFile:
+		init.registry.persist(args.registryFile)
 
 	# Run the tearDown functions of the test cases and then exit
 	if args.runTearDown:
+		if args.registryFile:
+			console.print(f'[bright_blue]Deleting the resources from the registry [bold]{args.registryFile}')
+			removeRegisteredResources(args.registryFile)
 		console.print('[bright_blue]Running tear-down functions for test suites: ')
 		# for module in track(modules, 'Tearing down test cases', console=console, show_speed=False):
-		for module in modules:
-			if isRunTest(module):
+		for n in names:
+			if isRunTest(n):
+				module = importlib.import_module(n)
 				for nm, cls in getmembers(module, isclass):									# Look for all classes of a module
 					if nm.lower().startswith(module.__name__.lower()):		# find the class with the module name
 						console.print(f'    - {nm}')
@@ -158,41 +403,92 @@ if __name__ == '__main__':
 			
 
 	
-	for module in modules:
-		if hasattr(module, 'run'):
-			totalSuites += 1
-			name = module.__name__
-			if isRunTest(module): 	# exclude / include some tests
-				for n in range(args.numberOfRuns):
-					if args.numberOfRuns > 1:
-						name = f'{module.__name__}_{n}'
-					console.print(f'[bright_blue]Running tests from [bold]{name}{" (skipping tear-down)" if args.disableTearDown else ""}')
-					startProcessTime = time.process_time()
-					startPerfTime = time.perf_counter()
-					startRequestCount = init.requestCount
-
-					# Clear counters
-					init.clearSleepTimeCount()
-
-					testExecuted, errors, skipped, sleepTimeCount = module.run(testFailFast = args.failFast)	# type: ignore
-					init.stopNotificationServer()	# In case something prevented the module to stop the notification server
-
-					durationProcess = time.process_time() - startProcessTime
-					duration = time.perf_counter() - startPerfTime
-					if testExecuted > 0:	# don't count none-run tests
-						totalErrors += errors
-						totalRunTests += testExecuted
-					totalSkipped += skipped
-					totalSleepTime += sleepTimeCount
-					results[name] = ( testExecuted, errors, duration, durationProcess, skipped, init.requestCount - startRequestCount, sleepTimeCount )
-					console.print(f'[spring_green3]Successfully executed tests: {testExecuted}')
-					if errors > 0:
-						console.print(f'[red]Errors: {errors}')
-				else:
-					if args.showSkipped:
-						results[name] = ( 0, 0, 0, 0, 1, init.requestCount - startRequestCount, 0.0 )
+	if args.jobs > 1:
+		totalSuites = len([ n for n in names if catalog[n]['hasRun'] ])
+		console.print(f'[bright_blue]Running test suites in [bold]{args.jobs}[/bold] parallel workers')
+		results, init.requestCount, durations, latencies, traceEvents = runSuitesInParallel([ n for n in names if catalog[n]['hasRun'] and isRunTest(n) ], args.jobs)
+		for v in results.values():
+			if v[0] > 0:	# don't count none-run tests
+				totalErrors += v[1]
+				totalRunTests += v[0]
+			totalSkipped += v[4]
+			totalSleepTime += v[6]
+			totalUTTime += v[7]
+		if args.showSkipped:
+			for n in names:
+				if catalog[n]['hasRun'] and not isRunTest(n):
+					results[n] = ( 0, 0, 0, 0, 1, 0, 0.0, 0.0 )
+	else:
+		for moduleName in names:
+			if catalog[moduleName]['hasRun']:
+				totalSuites += 1
+				name = moduleName
+				if isRunTest(moduleName): 	# exclude / include some tests
+					module = importlib.import_module(moduleName)
+					for n in range(args.numberOfRuns):
+						if args.numberOfRuns > 1:
+							name = f'{moduleName}_{n}'
+						console.print(f'[bright_blue]Running tests from [bold]{name}{" (skipping tear-down)" if args.disableTearDown else ""}')
+						startProcessTime = time.process_time()
+						startPerfTime = time.perf_counter()
+						startRequestCount = init.requestCount
+
+						# Clear counters
+						init.clearSleepTimeCount()
+						init.clearUTTimeCount()
+						init.clearTestCaseDurations()
+						init.clearLatencyHistograms()
+
+						with tracing.span(name, 'suite'):
+							testExecuted, errors, skipped, sleepTimeCount = module.run(testFailFast = args.failFast)	# type: ignore
+						init.stopNotificationServer()	# In case something prevented the module to stop the notification server
+
+						durationProcess = time.process_time() - startProcessTime
+						duration = time.perf_counter() - startPerfTime
+						if testExecuted > 0:	# don't count none-run tests
+							totalErrors += errors
+							totalRunTests += testExecuted
+						totalSkipped += skipped
+						totalSleepTime += sleepTimeCount
+						totalUTTime += (utTimeCount := init.getUTTimeCount())
+						results[name] = ( testExecuted, errors, duration, durationProcess, skipped, init.requestCount - startRequestCount, sleepTimeCount, utTimeCount )
+						latencies[name] = init.getLatencyHistograms()
+						if testExecuted > 0:
+							durations[moduleName] = { 'exec': duration, 'sleep': sleepTimeCount, 'proc': durationProcess, 'tests': dict(init.testCaseDurations) }
+						console.print(f'[spring_green3]Successfully executed tests: {testExecuted}')
+						if errors > 0:
+							console.print(f'[red]Errors: {errors}')
+					else:
+						if args.showSkipped:
+							results[name] = ( 0, 0, 0, 0, 1, init.requestCount - startRequestCount, 0.0, 0.0 )
+
+
+	# Delete the resources that the test suites left behind, e.g. after failures.
+	# The workers only delete their own resources, the main process also those from the journal
+	if not args.disableTearDown:
+		removeRegisteredResources(None if args.resultsFile else args.registryFile)
+
+	# Worker process: return the results to the main process and exit
+	if args.resultsFile:
+		with open(args.resultsFile, 'w', encoding = 'utf-8') as f:
+			json.dump({ 'results': results, 
+						'requestCount': init.requestCount, 
+						'durations': durations,
+						'latencies': { n:{ k:h.toDict() for k, h in l.items() } for n, l in latencies.items() },
+						'traceEvents': tracing.events() if args.traceFile else [],
+						'transportMetrics': { n:m.toDict() for n, m in init.transportMetrics().items() } }, f)
+		init.shutdown()
+		quit()
+	if durations:
+		saveDurationHistory(durations, partial = args.testCaseName is not None)
+	if args.latencyFile:
+		exportLatencies(args.latencyFile, latencies)
+	if args.traceFile:
+		tracing.export(args.traceFile, traceEvents)
 
 	totalProcessTime	= time.process_time() - totalProcessTimeStart
+	if args.jobs > 1:	# the process times of the worker processes
+		totalProcessTime += sum([ v[3] for v in results.values() ])
 	totalExecTime 		= time.perf_counter() - totalTimeStart
 
 	# No test run?
@@ -208,13 +504,15 @@ if __name__ == '__main__':
 	table.add_column('Count', footer=f'[spring_green3]{totalRunTests if totalErrors == 0 else str(totalRunTests)}[/spring_green3]', justify='right')
 	table.add_column('Skipped', footer=f'[yellow]{totalSkipped}[/yellow]' if totalSkipped > 0 else '[spring_green3]0[spring_green3]', justify='right')
 	table.add_column('Errors', footer=f'[red]{totalErrors}[/red]' if totalErrors > 0 else '[spring_green3]0[spring_green3]', justify='right')
-	table.add_column('Times\nExec | Sleep | Proc', footer=f'{totalExecTime:8.4f} | {totalSleepTime:6.2f} | {totalProcessTime:8.4f}', justify='center')
+	table.add_column('Times\nExec | Sleep | UT | Proc', footer=f'{totalExecTime:8.4f} | {totalSleepTime:6.2f} | {totalUTTime:6.2f} | {totalProcessTime:8.4f}', justify='center')
 	# table.add_column('Exec Time', footer=f'{totalExecTime:.4f}', justify='right')
 	# table.add_column('Sleep Time', footer=f'{totalSleepTime:.2f}' if totalRunTests != 0 else '0.0', justify='right')
 	# table.add_column('Proc Time', footer=f'{totalProcessTime:.4f}', justify='right')
 	table.add_column('Exec Time per\nTest | Request', footer=f'{totalExecTime/totalRunTests:7.4f} | {totalExecTime/init.requestCount:7.4f}' if totalRunTests != 0 else '000.0000 | 000.0000', justify='center')
 	table.add_column('Proc Time per\nTest | Request', footer=f'{totalProcessTime/totalRunTests:7.4f} | {totalProcessTime/init.requestCount:7.4f}' if totalRunTests != 0 else '000.0000 | 000.0000', justify='center')
 	table.add_column('Requests', footer=f'{init.requestCount}', justify='right')
+	suiteLatencies = { n:mergeHistograms(list(l.values())) for n, l in latencies.items() }
+	table.add_column('Request Latency ms\np50 | p90 | p99 | p99.9 | Max', footer=formatLatencies(mergeHistograms(list(suiteLatencies.values()))), justify='center')
 	# Styles
 	styleDisabled = Style(dim=True)
 	styleDisabled2 = Style(dim=True, bgcolor='grey11')
@@ -231,12 +529,27 @@ if __name__ == '__main__':
 						str(v[0]), 
 						f'[yellow]{v[4]}[/yellow]' if v[4] > 0 and v[0] > 0 else str(v[4]),
 						f'[red]{v[1]}[/red]' if v[1] > 0 and v[0] > 0 else str(v[1]),
-						f'{v[2]:8.4f} | {v[6]:6.2f} | {v[3]:8.4f}' if v[0] > 0 else f'{0:8.4f} | {0:6.2f} | {0:8.4f}', 
+						f'{v[2]:8.4f} | {v[6]:6.2f} | {v[7]:6.2f} | {v[3]:8.4f}' if v[0] > 0 else f'{0:8.4f} | {0:6.2f} | {0:6.2f} | {0:8.4f}', 
 						# f'{v[6]:.2f}',
 						# f'{v[3]:.4f}' if v[0] > 0 else '',
 						f'{(v[2]/v[0]):7.4f} | {(v[2]/v[5]):7.4f}' if v[0] > 0 else f'{0:7.4f} | {0:7.4f}',
 						f'{(v[3]/v[0]):7.4f} | {(v[3]/v[5]):7.4f}' if v[0] > 0 else f'{0:7.4f} | {0:7.4f}',
 						f'{v[5]}',
+						formatLatencies(suiteLatencies[k]) if k in suiteLatencies and v[0] > 0 else formatLatencies(LatencyHistogram()),
 						style=style)
 	console.print(table)
+
+	# Print the metrics of the transports that were used
+	if (metrics := { n:m.toDict() for n, m in init.transportMetrics().items() if m.requests }):
+		table = Table(show_header=True, header_style='bright_blue', title='Transports')
+		table.add_column('Transport', no_wrap=True)
+		table.add_column('Requests', justify='right')
+		table.add_column('Errors', justify='right')
+		table.add_column('Request Time\nTotal | Mean ms', justify='center')
+		for n, m in sorted(metrics.items()):
+			table.add_row(n, 
+						  f'{m["requests"]}', 
+						  f'[red]{m["errors"]}[/red]' if m['errors'] else '0', 
+						  f'{m["time"]:8.4f} | {m["time"] / m["requests"] * 1000:7.2f}')
+		console.print(table)
 	init.shutdown()
\ No newline at end of file
@@ -0,0 +1,308 @@
+#
+#	scenario.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Run a declarative load scenario against a CSE. A scenario file describes the
+#	phases of a load run (ramp, step, steady, spike, soak) with their target rates,
+#	and a weighted mix of operations. See the files in the "scenarios" directory.
+#
+#	The requests are sent via the binding that is configured in config.py.
+#
+
+from __future__ import annotations
+from typing import Any, Callable, Optional
+
+import argparse, json, random, time
+from dataclasses import dataclass, field
+from threading import Lock
+
+from rich.console import Console
+from rich.table import Table
+from init import *
+from acme.etc.Types import ResponseStatusCode as RC, ResourceTypes as T
+from histograms import LatencyHistogram
+from loadgen import LoadResult, rampSchedule, runSchedule
+
+
+phaseTypes = [ 'ramp', 'step', 'steady', 'spike', 'soak' ]
+""" The supported phase types. Steady, spike and soak phases have a constant rate and only differ in their intent. """
+
+
+def phaseSchedule(phase:JSON, arrivals:str, seed:Optional[int] = None) -> list[float]:
+	"""	Return the intended start times of a phase's requests.
+
+		Args:
+			phase: The phase's definition.
+			arrivals: Either 'poisson' or 'constant'.
+			seed: Optional seed for the random arrivals.
+
+		Return:
+			List of start times in seconds, relative to the start of the phase.
+	"""
+	duration = phase['duration']
+	match phase['type']:
+		case 'ramp':
+			return rampSchedule(phase['from'], phase['to'], duration, arrivals, seed)
+		case 'step':
+			steps = phase['steps']
+			stepDuration = duration / steps
+			times:list[float] = []
+			seeds = random.Random(seed)		# a different seed for each step
+			for i in range(steps):
+				rate = phase['from'] + (phase['to'] - phase['from']) * i / max(1, steps - 1)
+				stepSeed = None if seed is None else seeds.getrandbits(64)
+				times.extend([ i * stepDuration + t for t in rampSchedule(rate, rate, stepDuration, arrivals, stepSeed) ])
+			return times
+		case 'steady' | 'spike' | 'soak':
+			return rampSchedule(phase['rate'], phase['rate'], duration, arrivals, seed)
+	raise ValueError(f'unknown phase type: {phase["type"]}. Must be one of {phaseTypes}')
+
+
+def phaseRate(phase:JSON) -> float:
+	"""	Return the configured average target rate of a phase in requests per second.
+	"""
+	match phase['type']:
+		case 'ramp' | 'step':
+			return (phase['from'] + phase['to']) / 2.0
+		case 'steady' | 'spike' | 'soak':
+			return phase['rate']
+	raise ValueError(f'unknown phase type: {phase["type"]}. Must be one of {phaseTypes}')
+
+
+def scaleScenario(scenario:JSON, rateScale:float = 1.0, durationScale:float = 1.0) -> JSON:
+	"""	Return a copy of a scenario with scaled rates and durations, e.g. for a short trial run.
+	"""
+	result = dict(scenario)
+	result['phases'] = [ { k:(v * rateScale if k in ('rate', 'from', 'to') else v * durationScale if k == 'duration' else v) for k, v in p.items() }
+						 for p in scenario['phases'] ]
+	return result
+
+
+@dataclass
+class PhaseResult:
+	"""	The result of a scenario phase, in total and per operation.
+	"""
+	name:str
+	type:str
+	duration:float
+	load:LoadResult
+	operations:dict[str, LatencyHistogram]	= field(default_factory = dict)
+	errors:dict[str, int]					= field(default_factory = dict)
+
+
+class ScenarioRunner:
+	"""	Run the phases of a scenario.
+
+		Before the first phase an AE with a number of containers is created. The operations
+		work on these containers. All resources are deleted afterwards.
+	"""
+
+	def __init__(self, scenario:JSON) -> None:
+		self.scenario = scenario
+		self.arrivals = scenario.get('arrivals', 'poisson')
+		self.maxConcurrency = scenario.get('maxConcurrency', 100)
+		self.aern = uniqueRN('scenarioAE')
+		self.aeri:str = None
+		self.containers:list[str] = []
+		self.createdAEs:list[str] = []
+		self.lock = Lock()
+		self.operations:dict[str, Callable[[random.Random], int]] = {
+			'createAE':			self.createAE,
+			'createCIN':		self.createCIN,
+			'retrieveLatest':	self.retrieveLatest,
+			'discovery':		self.discovery,
+			'update':			self.update,
+		}
+		for p in scenario['phases']:
+			for op in p.get('mix', scenario['mix']):
+				if op not in self.operations:
+					raise ValueError(f'unknown operation: {op}. Must be one of {list(self.operations)}')
+			if p['type'] not in phaseTypes:
+				raise ValueError(f'unknown phase type: {p["type"]}. Must be one of {phaseTypes}')
+
+
+	def setUp(self) -> None:
+		setup = self.scenario.get('setup', {})
+		r, rsc = CREATE(cseURL, 'C', T.AE, { 'm2m:ae': { 'rn': self.aern, 'api': APPID, 'rr': False, 'srv': [ RELEASEVERSION ] }})
+		if rsc != RC.CREATED:
+			raise RuntimeError(f'cannot create the scenario AE: {rsc} {r}')
+		self.aeri = findXPath(r, 'm2m:ae/ri')
+		for i in range(setup.get('containers', 10)):
+			r, rsc = CREATE(f'{cseURL}/{self.aern}', self.aeri, T.CNT, { 'm2m:cnt': { 'rn': f'cnt{i}', 'mni': setup.get('mni', 100) }})
+			if rsc != RC.CREATED:
+				raise RuntimeError(f'cannot create a scenario container: {rsc} {r}')
+			self.containers.append(f'{cseURL}/{self.aern}/cnt{i}')
+			CREATE(self.containers[-1], self.aeri, T.CIN, { 'm2m:cin': { 'con': 'initial' }})
+
+
+	def tearDown(self) -> None:
+		for rn in self.createdAEs:
+			DELETE(f'{cseURL}/{rn}', ORIGINATOR)
+		DELETE(f'{cseURL}/{self.aern}', ORIGINATOR)
+
+
+	#########################################################################
+	#
+	#	Operations. They return the response status code.
+	#
+
+	def createAE(self, _:random.Random) -> int:
+		rn = uniqueRN()
+		_, rsc = CREATE(cseURL, 'C', T.AE, { 'm2m:ae': { 'rn': rn, 'api': APPID, 'rr': False, 'srv': [ RELEASEVERSION ] }})
+		if rsc == RC.CREATED:
+			with self.lock:
+				self.createdAEs.append(rn)
+		return rsc
+
+
+	def createCIN(self, rnd:random.Random) -> int:
+		return CREATE(rnd.choice(self.containers), self.aeri, T.CIN, { 'm2m:cin': { 'con': 'Hello, world' }})[1]
+
+
+	def retrieveLatest(self, rnd:random.Random) -> int:
+		return RETRIEVE(f'{rnd.choice(self.containers)}/la', self.aeri)[1]
+
+
+	def discovery(self, _:random.Random) -> int:
+		return RETRIEVE(f'{cseURL}/{self.aern}?fu=1&ty={T.CNT.value}&lim=10', self.aeri)[1]
+
+
+	def update(self, rnd:random.Random) -> int:
+		return UPDATE(rnd.choice(self.containers), self.aeri, { 'm2m:cnt': { 'lbl': [ f'tag{rnd.randint(0, 9)}' ] }})[1]
+
+
+	expectedRSCs = {
+		'createAE':			RC.CREATED,
+		'createCIN':		RC.CREATED,
+		'retrieveLatest':	RC.OK,
+		'discovery':		RC.OK,
+		'update':			RC.UPDATED,
+	}
+
+
+	#########################################################################
+
+	def runPhase(self, phase:JSON, seed:Optional[int] = None) -> PhaseResult:
+		"""	Run a single phase.
+
+			Args:
+				phase: The phase's definition.
+				seed: Optional seed for the arrivals and the operation mix.
+
+			Return:
+				The phase's result.
+		"""
+		mix = phase.get('mix', self.scenario['mix'])
+		times = phaseSchedule(phase, self.arrivals, seed)
+		rnd = random.Random(seed)
+		ops = rnd.choices(list(mix.keys()), weights = list(mix.values()), k = len(times))
+		result = PhaseResult(phase.get('name', phase['type']), phase['type'], phase['duration'], None)	# type:ignore[arg-type]
+		resultLock = Lock()
+
+		def _request(n:int) -> bool:
+			op = ops[n]
+			startTime = time.perf_counter()
+			rsc = self.operations[op](random.Random(n if seed is None else seed + n))
+			duration = time.perf_counter() - startTime
+			ok = rsc == self.expectedRSCs[op]
+			with resultLock:
+				if not (histogram := result.operations.get(op)):
+					histogram = result.operations[op] = LatencyHistogram()
+				histogram.record(duration)
+				if not ok:
+					result.errors[op] = result.errors.get(op, 0) + 1
+			return ok
+
+		result.load = runSchedule(_request, times, phaseRate(phase), self.maxConcurrency)
+		return result
+
+
+	def run(self, seed:Optional[int] = None, progress:Callable[[JSON], None] = None) -> list[PhaseResult]:
+		"""	Set up the resources, run all phases in order, and remove the resources again.
+
+			Args:
+				seed: Optional seed for the arrivals and the operation mix.
+				progress: Optional function that is called with each phase before it is run.
+
+			Return:
+				The results of the phases.
+		"""
+		seeds = random.Random(seed)		# a different seed for each phase
+		try:
+			self.setUp()
+			results = []
+			for phase in self.scenario['phases']:
+				if progress:
+					progress(phase)
+				results.append(self.runPhase(phase, None if seed is None else seeds.getrandbits(64)))
+			return results
+		finally:
+			self.tearDown()
+
+
+def _latencies(histogram:LatencyHistogram) -> str:
+	s = histogram.summary()
+	return f'{s["p50"]*1000:7.2f} | {s["p90"]*1000:7.2f} | {s["p99"]*1000:7.2f} | {s["max"]*1000:7.2f}'
+
+
+def resultsToJSON(scenario:JSON, results:list[PhaseResult]) -> JSON:
+	"""	Return the results of a scenario run as a JSON serializable dictionary.
+	"""
+	return { 'scenario': scenario.get('name'),
+			 'phases': [ { 'name': r.name,
+			 			   'type': r.type,
+						   'duration': r.duration,
+						   'targetRate': r.load.targetRate,
+						   'achievedRate': r.load.achievedRate,
+						   'requests': r.load.requests,
+						   'errors': r.load.errors,
+						   'latency': r.load.latencies.summary(),
+						   'operations': { op:dict(h.summary(), errors = r.errors.get(op, 0)) for op, h in sorted(r.operations.items()) } }
+						 for r in results ] }
+
+
+if __name__ == '__main__':
+	console = Console()
+
+	parser = argparse.ArgumentParser(description = 'Run a load scenario against a CSE')
+	parser.add_argument('scenario', help = 'the scenario file (JSON)')
+	parser.add_argument('--rate-scale', action = 'store', dest = 'rateScale', type = float, default = 1.0, help = 'multiply all rates by this factor (default: 1.0)')
+	parser.add_argument('--duration-scale', action = 'store', dest = 'durationScale', type = float, default = 1.0, help = 'multiply all durations by this factor (default: 1.0)')
+	parser.add_argument('--seed', action = 'store', dest = 'seed', type = int, default = None, help = 'seed for the arrivals and the operation mix, for repeatable runs')
+	parser.add_argument('--json', action = 'store', dest = 'jsonFile', default = None, metavar = 'FILE', help = 'also write the results to a JSON file')
+	args = parser.parse_args()
+
+	with open(args.scenario, encoding = 'utf-8') as f:
+		scenario = scaleScenario(json.load(f), args.rateScale, args.durationScale)
+	if noCSE:
+		console.print('[red]CSE is not reachable')
+		quit(1)
+
+	runner = ScenarioRunner(scenario)
+	results = runner.run(args.seed, lambda p: console.print(f'[bright_blue]Running phase [bold]{p.get("name", p["type"])}[/bold] ({p["type"]}, {p["duration"]:g} s)'))
+
+	# Print Summary
+	table = Table(show_header = True, header_style = 'bright_blue', title = f'Scenario {scenario.get("name", args.scenario)} ({BINDING})')
+	table.add_column('Phase', no_wrap = True)
+	table.add_column('Type')
+	table.add_column('Req / s\nTarget | Achieved', justify = 'center')
+	table.add_column('Requests', justify = 'right')
+	table.add_column('Errors', justify = 'right')
+	table.add_column('Latency ms\np50 | p90 | p99 | Max', justify = 'center')
+	for r in results:
+		table.add_row(r.name,
+					  r.type,
+					  f'{r.load.targetRate:8.1f} | {r.load.achievedRate:8.1f}',
+					  f'{r.load.requests}',
+					  f'[red]{r.load.errors}[/red]' if r.load.errors else '0',
+					  _latencies(r.load.latencies))
+		for op, histogram in sorted(r.operations.items()):
+			table.add_row(f'  {op}', '', '', f'{histogram.count}', f'{r.errors.get(op, 0)}', _latencies(histogram), style = 'dim')
+		table.add_section()
+	console.print(table)
+
+	if args.jsonFile:
+		with open(args.jsonFile, 'w', encoding = 'utf-8') as f:
+			json.dump(resultsToJSON(scenario, results), f, indent = 1)
+	shutdown()
@@ -15,6 +15,7 @@ from acme.etc.Types import DesiredIdentifierResultType as DRT, NotificationEvent
 from acme.etc.Types import ResultContentType as RCN
 from acme.etc.DateUtils import getResourceDate
 from init import *
+import resourceTree
 
 cntRN1 = f'{cntRN}1'
 cntRN2 = f'{cntRN}2'
@@ -22,6 +23,16 @@ cntRN3 = f'{cntRN}3'
 subRN1 = f'{subRN}1'
 subRN2 = f'{subRN}2'
 
+
+def isCRSNotification(notification:JSON) -> bool:
+	"""	Return True for an aggregated notification of the current <CRS>, but not for its
+		verification request or deletion notification.
+	"""
+	return (findXPath(notification, 'm2m:sgn/sur') == toSPRelative(findXPath(TestCRS.crs, 'm2m:crs/ri'))
+			and not findXPath(notification, 'm2m:sgn/vrq')
+			and not findXPath(notification, 'm2m:sgn/sud'))
+
+
 class TestCRS(unittest.TestCase):
 	ae 				= None
 	cnt1 			= None
@@ -49,36 +60,23 @@ class TestCRS(unittest.TestCase):
 		assert isNotificationServerRunning(), 'Notification server cannot be reached'
 
 
-		# create AE
-		dct = 	{ 'm2m:ae' : {
-					'rn'  : aeRN, 
-					'api' : APPID,
-				 	'rr'  : True,
-				 	'srv' : [ RELEASEVERSION ],
-					'poa' : [ NOTIFICATIONSERVER ],
-				}}
-		cls.ae, rsc = CREATE(cseURL, 'C', T.AE, dct)	# AE to work under
-		assert rsc == RC.CREATED, 'cannot create parent AE'
+		# create AE with CNT1 & CNT2 & CNT3
+		tree = resourceTree.build({ 'm2m:ae' : {
+										'rn'  : aeRN, 
+										'api' : APPID,
+										'rr'  : True,
+										'srv' : [ RELEASEVERSION ],
+										'poa' : [ NOTIFICATIONSERVER ],
+									},
+									'children': [ { 'm2m:cnt' : { 'rn' : rn }} for rn in (cntRN1, cntRN2, cntRN3) ]
+								  }, originator = 'C')	# AE to work under
+		cls.ae = tree[aeRN].resource
 		cls.originator = findXPath(cls.ae, 'm2m:ae/aei')
-
-		# create CNT1 & CNT2 & CNT3
-		dct = 	{ 'm2m:cnt' : { 
-					'rn'  : cntRN1
-				}}
-		cls.cnt1, rsc = CREATE(aeURL, cls.originator, T.CNT, dct)
-		assert rsc == RC.CREATED, 'cannot create container'
+		cls.cnt1 = tree[f'{aeRN}/{cntRN1}'].resource
 		cls.cnt1RI = findXPath(cls.cnt1, 'm2m:cnt/ri')
-		dct = 	{ 'm2m:cnt' : { 
-					'rn'  : cntRN2
-				}}
-		cls.cnt2, rsc = CREATE(aeURL, cls.originator, T.CNT, dct)
-		assert rsc == RC.CREATED, 'cannot create container'
+		cls.cnt2 = tree[f'{aeRN}/{cntRN2}'].resource
 		cls.cnt2RI = findXPath(cls.cnt2, 'm2m:cnt/ri')
-		dct = 	{ 'm2m:cnt' : { 
-					'rn'  : cntRN3
-				}}
-		cls.cnt3, rsc = CREATE(aeURL, cls.originator, T.CNT, dct)
-		assert rsc == RC.CREATED, 'cannot create container'
+		cls.cnt3 = tree[f'{aeRN}/{cntRN3}'].resource
 		cls.cnt3RI = findXPath(cls.cnt3, 'm2m:cnt/ri')
 
 		testCaseEnd('Setup TestCRS')
@@ -733,8 +731,7 @@ class TestCRS(unittest.TestCase):
 		self.assertEqual(rsc, RC.CREATED, r)	
 
 		# wait and check notification
-		testSleep(crsTimeWindowSize + 1.0)
-		self.assertIsNotNone(notification := getLastNotification())
+		self.assertIsNotNone(notification := waitForNotification(isCRSNotification, wait = crsTimeWindowSize + 1.0))
 		self.assertIsNotNone(findXPath(notification, 'm2m:sgn'))
 		self.assertEqual(findXPath(notification, 'm2m:sgn/sur'), toSPRelative(findXPath(self.crs, 'm2m:crs/ri')))
 
@@ -768,8 +765,7 @@ class TestCRS(unittest.TestCase):
 		self.assertIsNone(notification := getLastNotification())
 
 		# wait second half
-		testSleep(crsTimeWindowSize * 1.2)
-		self.assertIsNotNone(notification := getLastNotification())
+		self.assertIsNotNone(notification := waitForNotification(isCRSNotification, wait = crsTimeWindowSize * 1.2))
 		self.assertIsNotNone(findXPath(notification, 'm2m:sgn'))
 		self.assertEqual(findXPath(notification, 'm2m:sgn/sur'), toSPRelative(findXPath(self.crs, 'm2m:crs/ri')))
 
@@ -824,8 +820,7 @@ class TestCRS(unittest.TestCase):
 		r, rsc = CREATE(f'{aeURL}/{cntRN2}', self.originator, T.CIN, dct)
 		self.assertEqual(rsc, RC.CREATED, r)	
 
-		testSleep(crsTimeWindowSize * 0.8)
-		self.assertIsNotNone(notification := getLastNotification())
+		self.assertIsNotNone(notification := waitForNotification(isCRSNotification, wait = crsTimeWindowSize * 0.8))
 		self.assertIsNotNone(findXPath(notification, 'm2m:sgn'))
 		self.assertEqual(findXPath(notification, 'm2m:sgn/sur'), toSPRelative(findXPath(self.crs, 'm2m:crs/ri')))
 
@@ -1006,7 +1001,7 @@ class TestCRS(unittest.TestCase):
 		clearLastNotification()
 		r, rsc = DELETE(crsURL, TestCRS.originator)
 		self.assertEqual(rsc, RC.DELETED, r)
-		notification = getLastNotification(wait = notificationDelay)
+		notification = waitForNotification(lambda n: findXPath(n, 'm2m:sgn/sud') is not None)
 		self.assertTrue(findXPath(notification, 'm2m:sgn/sud'))
 
 
@@ -1241,8 +1236,7 @@ class TestCRS(unittest.TestCase):
 		self.assertEqual(rsc, RC.CREATED, r)	
 
 		# wait and check notification
-		testSleep(crsTimeWindowSize + 1.0)
-		self.assertIsNotNone(notification := getLastNotification())
+		self.assertIsNotNone(notification := waitForNotification(isCRSNotification, wait = crsTimeWindowSize + 1.0))
 		self.assertIsNotNone(findXPath(notification, 'm2m:sgn'))
 		self.assertEqual(findXPath(notification, 'm2m:sgn/sur'), toSPRelative(findXPath(self.crs, 'm2m:crs/ri'))) # type: ignore
 
@@ -1284,8 +1278,7 @@ class TestCRS(unittest.TestCase):
 		self.assertEqual(rsc, RC.CREATED, r)
 
 		# wait and check notification
-		testSleep(crsTimeWindowSize + 1.0)
-		self.assertIsNotNone(notification := getLastNotification())
+		self.assertIsNotNone(notification := waitForNotification(isCRSNotification, wait = crsTimeWindowSize + 1.0))
 		self.assertIsNotNone(findXPath(notification, 'm2m:sgn'))
 		self.assertEqual(findXPath(notification, 'm2m:sgn/sur'), toSPRelative(findXPath(self.crs, 'm2m:crs/ri')))
 
@@ -1406,8 +1399,7 @@ class TestCRS(unittest.TestCase):
 		self.assertEqual(rsc, RC.CREATED, r)
 
 		# wait and check notification
-		testSleep(crsTimeWindowSize + 1.0)
-		self.assertIsNotNone(notification := getLastNotification())
+		self.assertIsNotNone(notification := waitForNotification(isCRSNotification, wait = crsTimeWindowSize + 1.0))
 		self.assertIsNotNone(findXPath(notification, 'm2m:sgn'))
 		self.assertEqual(findXPath(notification, 'm2m:sgn/sur'), toSPRelative(findXPath(self.crs, 'm2m:crs/ri')))
 
@@ -1444,8 +1436,7 @@ class TestCRS(unittest.TestCase):
 
 		# wait and check notification
 		clearLastNotification()
-		testSleep(crsTimeWindowSize + 1.0)
-		self.assertIsNotNone(notification := getLastNotification())
+		self.assertIsNotNone(notification := waitForNotification(isCRSNotification, wait = crsTimeWindowSize + 1.0))
 		self.assertIsNotNone(findXPath(notification, 'm2m:sgn'))
 		self.assertEqual(findXPath(notification, 'm2m:sgn/sur'), toSPRelative(findXPath(self.crs, 'm2m:crs/ri')))
 
@@ -1566,8 +1557,7 @@ class TestCRS(unittest.TestCase):
 		# Create NO CIN
 
 		# wait and check notification
-		testSleep(crsTimeWindowSize + 1.0)
-		self.assertIsNotNone(notification := getLastNotification())
+		self.assertIsNotNone(notification := waitForNotification(isCRSNotification, wait = crsTimeWindowSize + 1.0))
 		self.assertIsNotNone(findXPath(notification, 'm2m:sgn'))
 		self.assertEqual(findXPath(notification, 'm2m:sgn/sur'), toSPRelative(findXPath(self.crs, 'm2m:crs/ri')))
 
@@ -1611,8 +1601,7 @@ class TestCRS(unittest.TestCase):
 		self.assertEqual(rsc, RC.CREATED, r)	
 
 		# wait and check notification
-		testSleep(crsTimeWindowSize + 1.0)
-		self.assertIsNotNone(notification := getLastNotification())
+		self.assertIsNotNone(notification := waitForNotification(isCRSNotification, wait = crsTimeWindowSize + 1.0))
 		self.assertIsNotNone(findXPath(notification, 'm2m:sgn'))
 		self.assertEqual(findXPath(notification, 'm2m:sgn/sur'), toSPRelative(findXPath(self.crs, 'm2m:crs/ri'))) # type: ignore
 
@@ -1654,8 +1643,7 @@ class TestCRS(unittest.TestCase):
 		self.assertEqual(rsc, RC.CREATED, r)
 
 		# wait and check notification
-		testSleep(crsTimeWindowSize + 1.0)
-		self.assertIsNotNone(notification := getLastNotification())
+		self.assertIsNotNone(notification := waitForNotification(isCRSNotification, wait = crsTimeWindowSize + 1.0))
 		self.assertIsNotNone(findXPath(notification, 'm2m:sgn'))
 		self.assertEqual(findXPath(notification, 'm2m:sgn/sur'), toSPRelative(findXPath(self.crs, 'm2m:crs/ri')))
 
@@ -1776,8 +1764,7 @@ class TestCRS(unittest.TestCase):
 		self.assertEqual(rsc, RC.CREATED, r)
 
 		# wait and check notification
-		testSleep(crsTimeWindowSize + 1.0)
-		self.assertIsNotNone(notification := getLastNotification())
+		self.assertIsNotNone(notification := waitForNotification(isCRSNotification, wait = crsTimeWindowSize + 1.0))
 		self.assertIsNotNone(findXPath(notification, 'm2m:sgn'))
 		self.assertEqual(findXPath(notification, 'm2m:sgn/sur'), toSPRelative(findXPath(self.crs, 'm2m:crs/ri')))
 
@@ -1898,8 +1885,7 @@ class TestCRS(unittest.TestCase):
 		self.assertEqual(rsc, RC.CREATED, r)
 
 		# wait and check notification
-		testSleep(crsTimeWindowSize + 1.0)
-		self.assertIsNotNone(notification := getLastNotification())
+		self.assertIsNotNone(notification := waitForNotification(isCRSNotification, wait = crsTimeWindowSize + 1.0))
 		self.assertIsNotNone(findXPath(notification, 'm2m:sgn'))
 		self.assertEqual(findXPath(notification, 'm2m:sgn/sur'), toSPRelative(findXPath(self.crs, 'm2m:crs/ri')))
 
@@ -15,20 +15,28 @@ from typing import Tuple
 import threading
 from acme.etc.Types import ResponseStatusCode as RC, ResourceTypes as T
 from init import *
+from loadgen import runOpenLoop
+import resourceTree
+from idstore import IdentifierStore
+from loadWorkers import runWorkers
+from loadAnalysis import LoadPoint, analyze, printAnalysis
+from histograms import mergeHistograms
 
 image = 'iVBORw0KGgoAAAANSUhEUgAAA4QAAAOECAYAAAD5Tv87AAAAAXNSR0IArs4c6QAAAKRlWElmTU0AKgAAAAgABgESAAMAAAABAAEAAAEaAAUAAAABAAAAVgEbAAUAAAABAAAAXgEoAAMAAAABAAIAAAExAAIAAAATAAAAZodpAAQAAAABAAAAegAAAAAAAABIAAAAAQAAAEgAAAABUGl4ZWxtYXRvciBQcm8gMS44AAAAA6ABAAMAAAABAAEAAKACAAQAAAABAAADhKADAAQAAAABAAADhAAAAACEh1UgAAAACXBIWXMAAAsTAAALEwEAmpwYAAADZ2lUWHRYTUw6Y29tLmFkb2JlLnhtcAAAAAAAPHg6eG1wbWV0YSB4bWxuczp4PSJhZG9iZTpuczptZXRhLyIgeDp4bXB0az0iWE1QIENvcmUgNS40LjAiPgogICA8cmRmOlJERiB4bWxuczpyZGY9Imh0dHA6Ly93d3cudzMub3JnLzE5OTkvMDIvMjItcmRmLXN5bnRheC1ucyMiPgogICAgICA8cmRmOkRlc2NyaXB0aW9uIHJkZjphYm91dD0iIgogICAgICAgICAgICB4bWxuczp0aWZmPSJodHRwOi8vbnMuYWRvYmUuY29tL3RpZmYvMS4wLyIKICAgICAgICAgICAgeG1sbnM6ZXhpZj0iaHR0cDovL25zLmFkb2JlLmNvbS9leGlmLzEuMC8iCiAgICAgICAgICAgIHhtbG5zOnhtcD0iaHR0cDovL25zLmFkb2JlLmNvbS94YXAvMS4wLyI+CiAgICAgICAgIDx0aWZmOlhSZXNvbHV0aW9uPjcyMDAwMC8xMDAwMDwvdGlmZjpYUmVzb2x1dGlvbj4KICAgICAgICAgPHRpZmY6T3JpZW50YXRpb24+MTwvdGlmZjpPcmllbnRhdGlvbj4KICAgICAgICAgPHRpZmY6WVJlc29sdXRpb24+NzIwMDAwLzEwMDAwPC90aWZmOllSZXNvbHV0aW9uPgogICAgICAgICA8dGlmZjpSZXNvbHV0aW9uVW5pdD4yPC90aWZmOlJlc29sdXRpb25Vbml0PgogICAgICAgICA8ZXhpZjpQaXhlbFlEaW1lbnNpb24+OTAwPC9leGlmOlBpeGVsWURpbWVuc2lvbj4KICAgICAgICAgPGV4aWY6UGl4ZWxYRGltZW5zaW9uPjkwMDwvZXhpZjpQaXhlbFhEaW1lbnNpb24+CiAgICAgICAgIDx4bXA6Q3JlYXRvclRvb2w+UGl4ZWxtYXRvciBQcm8gMS44PC94bXA6Q3JlYXRvclRvb2w+CiAgICAgICAgIDx4bXA6TWV0YWRhdGFEYXRlPjIwMjAtMTAtMjFUMTM6NTY6NDNaPC94bXA6TWV0YWRhdGFEYXRlPgogICAgICA8L3JkZjpEZXNjcmlwdGlvbj4KICAgPC9yZGY6UkRGPgo8L3g6eG1wbWV0YT4KcfrptAAAQABJREFUeAHs3Ql4XFd58PF3Rstol2zL8hbbcmwnduLEIQtLwhbShBBCEkJZEvoBJUBZ2pJSvpa2tHxlpy1toRslCaUFkhDKFlJo2VpIgUASEieO43iVd1uWZEnWNtrmu2fM2GPdkTzLveece8//Pg9odOfOWX5nIs877z3nJCYnJ/8pmUz+n0Qi0SgcCCCAAAIIIIAAAggggAACsRfIZDLD09PTX0h4/zdEMBj78aaDCCCAAAIIIIAAAggggMBpAiooTHj/lzntLL8ggAACCCCAAAIIIIAAAgg4IZB0opd0EgEEEEAAAQQQQAABBBBAwCdAQOgj4QQCCCCAAAIIIIAAAggg4IYAAaEb40wvEUAAAQQQQAABBBBAAAGfAAGhj4QTCCCAAAIIIIAAAggggIAbAgSEbowzvUQAAQQQQAABBBBAAAEEfAIEhD4STiCAAAIIIIAAAggggAACbggQELoxzvQSAQQQQAABBBBAAAEEEPAJEBD6SDiBAAIIIIAAAggggAACCLghQEDoxjjTSwQQQAABBBBAAAEEEEDAJ0BA6CPhBAIIIIAAAggggAACCCDghgABoRvjTC8RQAABBBBAAAEEEEAAAZ8AAaGPhBMIIIAAAggggAACCCCAgBsCBIRujDO9RAABBBBAAAEEEEAAAQR8AgSEPhJOIIAAAggggAACCCCAAAJuCBAQujHO9BIBBBBAAAEEEEAAAQQQ8AkQEPpIOIEAAggggAACCCCAAAIIuCFAQOjGONNLBBBAAAEEEEAAAQQQQMAnQEDoI+EEAggggAACCCCAAAIIIOCGAAGhG+NMLxFAAAEEEEAAAQQQQAABnwABoY+EEwgggAACCCCAAAIIIICAGwIEhG6MM71EAAEEEEAAAQQQQAABBHwCBIQ+Ek4ggAACCCCAAAIIIIAAAm4IEBC6Mc70EgEEEEAAAQQQQAABBBDwCRAQ+kg4gQACCCCAAAIIIIAAAgi4IUBA6MY400sEEEAAAQQQQAABBBBAwCdAQOgj4QQCCCCAAAIIIIAAAggg4IYAAaEb40wvEUAAAQQQQAABBBBAAAGfAAGhj4QTCCCAAAIIIIAAAggggIAbAgSEbowzvUQAAQQQQAABBBBAAAEEfAIEhD4STiCAAAIIIIAAAggggAACbggQELoxzvQSAQQQQAABBBBAAAEEEPAJEBD6SDiBAAIIIIAAAggggAACCLghQEDoxjjTSwQQQAABBBBAAAEEEEDAJ0BA6CPhBAIIIIAAAggggAACCCDghgABoRvjTC8RQAABBBBAAAEEEEAAAZ8AAaGPhBMIIIAAAggggAACCCCAgBsCBIRujDO9RAABBBBAAAEEEEAAAQR8AgSEPhJOIIAAAggggAACCCCAAAJuCBAQujHO9BIBBBBAAAEEEEAAAQQQ8AkQEPpIOIEAAggggAACCCCAAAIIuCFAQOjGONNLBBBAAAEEEEAAAQQQQMAnQEDoI+EEAggggAACCCCAAAIIIOCGAAGhG+NMLxFAAAEEEEAAAQQQQAABnwABoY+EEwgggAACCCCAAAIIIICAGwIEhG6MM71EAAEEEEAAAQQQQAABBHwCBIQ+Ek4ggAACCCCAAAIIIIAAAm4IEBC6Mc70EgEEEEAAAQQQQAABBBDwCRAQ+kg4gQACCCCAAAIIIIAAAgi4IUBA6MY400sEEEAAAQQQQAABBBBAwCdAQOgj4QQCCCCAAAIIIIAAAggg4IYAAaEb40wvEUAAAQQQQAABBBBAAAGfAAGhj4QTCCCAAAIIIIAAAggggIAbAgSEbowzvUQAAQQQQAABBBBAAAEEfAIEhD4STiCAAAIIIIAAAggggAACbggQELoxzvQSAQQQQAABBBBAAAEEEPAJEBD6SDiBAAIIIIAAAggggAACCLghQEDoxjjTSwQQQAABBBBAAAEEEEDAJ0BA6CPhBAIIIIAAAggggAACCCDghgABoRvjTC8RQAABBBBAAAEEEEAAAZ8AAaGPhBMIIIAAAggggAACCCCAgBsCBIRujDO9RAABBBBAAAEEEEAAAQR8AgSEPhJOIIAAAggggAACCCCAAAJuCBAQujHO9BIBBBBAAAEEEEAAAQQQ8AkQEPpIOIEAAggggAACCCCAAAIIuCFAQOjGONNLBBBAAAEEEEAAAQQQQMAnQEDoI+EEAggggAACCCCAAAIIIOCGAAGhG+NMLxFAAAEEEEAAAQQQQAABnwABoY+EEwgggAACCCCAAAIIIICAGwIEhG6MM71EAAEEEEAAAQQQQAABBHwCBIQ+Ek4ggAACCCCAAAIIIIAAAm4IEBC6Mc70EgEEEEAAAQQQQAABBBDwCRAQ+kg4gQACCCCAAAIIIIAAAgi4IUBA6MY400sEEEAAAQQQQAABBBBAwCdAQOgj4QQCCCCAAAIIIIAAAggg4IYAAaEb40wvEUAAAQQQQAABBBBAAAGfAAGhj4QTCCCAAAIIIIAAAggggIAbAgSEbowzvUQAAQQQQAABBBBAAAEEfAIEhD4STiCAAAIIIIAAAggggAACbggQELoxzvQSAQQQQAABBBBAAAEEEPAJEBD6SDiBAAIIIIAAAggggAACCLghQEDoxjjTSwQQQAABBBBAAAEEEEDAJ0BA6CPhBAIIIIAAAggggAACCCDghgABoRvjTC8RQAABBBBAAAEEEEAAAZ8AAaGPhBMIIIAAAggggAACCCCAgBsCBIRujDO9RAABBBBAAAEEEEAAAQR8AgSEPhJOIIAAAggggAACCCCAAAJuCBAQujHO9BIBBBBAAAEEEEAAAQQQ8AkQEPpIOIEAAggggAACCCCAAAIIuCFAQOjGONNLBBBAAAEEEEAAAQQQQMAnQEDoI+EEAggggAACCCCAAAIIIOCGAAGhG+NMLxFAAAEEEEAAAQQQQAABnwABoY+EEwgggAACCCCAAAIIIICAGwIEhG6MM71EAAEEEEAAAQQQQAABBHwCBIQ+Ek4ggAACCCCAAAIIIIAAAm4IEBC6Mc70EgEEEEAAAQQQQAABBBDwCRAQ+kg4gQACCCCAAAIIIIAAAgi4IUBA6MY400sEEEAAAQQQQAABBBBAwCdAQOgj4QQCCCCAAAIIIIAAAggg4IYAAaEb40wvEUAAAQQQQAABBBBAAAGfAAGhj4QTCCCAAAIIIIAAAggggIAbAgSEbowzvUQAAQQQQAABBBBAAAEEfAIEhD4STiCAAAIIIIAAAggggAACbggQELoxzvQSAQQQQAABBBBAAAEEEPAJEBD6SDiBAAIIIIAAAggggAACCLghQEDoxjjTSwQQQAABBBBAAAEEEEDAJ0BA6CPhBAIIIIAAAggggAACCCDghgABoRvjTC8RQAABBBBAAAEEEEAAAZ8AAaGPhBMIIIAAAggggAACCCCAgBsCBIRujDO9RAABBBBAAAEEEEAAAQR8AgSEPhJOIIAAAggggAACCCCAAAJuCBAQujHO9BIBBBBAAAEEEEAAAQQQ8AkQEPpIOIEAAggggAACCCCAAAIIuCFAQOjGONNLBBBAAAEEEEAAAQQQQMAnQEDoI+EEAggggAACCCCAAAIIIOCGAAGhG+NMLxFAAAEEEEAAAQQQQAABnwABoY+EEwgggAACCCCAAAIIIICAGwIEhG6MM71EAAEEEEAAAQQQQAABBHwCBIQ+Ek4ggAACCCCAAAIIIIAAAm4IEBC6Mc70EgEEEEAAAQQQQAABBBDwCRAQ+kg4gQACCCCAAAIIIIAAAgi4IUBA6MY400sEEEAAAQQQQAABBBBAwCdAQOgj4QQCCCCAAAIIIIAAAggg4IYAAaEb40wvEUAAAQQQQAABBBBAAAGfAAGhj4QTCCCAAAIIIIAAAggggIAbAgSEbowzvUQAAQQQQAABBBBAAAEEfAIEhD4STiCAAAIIIIAAAggggAACbggQELoxzvQSAQQQQAABBBBAAAEEEPAJEBD6SDiBAAIIIIAAAggggAACCLghQEDoxjjTSwQQQAABBBBAAAEEEEDAJ0BA6CPhBAIIIIAAAggggAACCCDghgABoRvjTC8RQAABBBBAAAEEEEAAAZ8AAaGPhBMIIIAAAggggAACCCCAgBsCBIRujDO9RAABBBBAAAEEEEAAAQR8AgSEPhJOIIAAAggggAACCCCAAAJuCBAQujHO9BIBBBBAAAEEEEAAAQQQ8AkQEPpIOIEAAggggAACCCCAAAIIuCFAQOjGONNLBBBAAAEEEEAAAQQQQMAnQEDoI+EEAggggAACCCCAAAIIIOCGAAGhG+NMLxFAAAEEEEAAAQQQQAABnwABoY+EEwgggAACCCCAAAIIIICAGwIEhG6MM71EAAEEEEAAAQQQQAABBHwCBIQ+Ek4ggAACCCCAAAIIIIAAAm4IEBC6Mc70EgEEEEAAAQQQQAABBBDwCRAQ+kg4gQACCCCAAAIIIIAAAgi4IUBA6MY400sEEEAAAQQQQAABBBBAwCdAQOgj4QQCCCCAAAIIIIAAAggg4IYAAaEb40wvEUAAAQQQQAABBBBAAAGfAAGhj4QTCCCAAAIIIIAAAggggIAbAgSEbowzvUQAAQQQQAABBBBAAAEEfAIEhD4STiCAAAIIIIAAAggggAACbggQELoxzvQSAQQQQAABBBBAAAEEEPAJEBD6SDiBAAIIIIAAAggggAACCLghQEDoxjjTSwQQQAABBBBAAAEEEEDAJ0BA6CPhBAIIIIAAAggggAACCCDghgABoRvjTC8RQAABBBBAAAEEEEAAAZ8AAaGPhBMIIIAAAggggAACCCCAgBsCBIRujDO9RAABBBBAAAEEEEAAAQR8AgSEPhJOIIAAAggggAACCCCAAAJuCBAQujHO9BIBBBBAAAEEEEAAAQQQ8AkQEPpIOIEAAggggAACCCCAAAIIuCFAQOjGONNLBBBAAAEEEEAAAQQQQMAnQEDoI+EEAggggAACCCCAAAIIIOCGAAGhG+NMLxFAAAEEEEAAAQQQQAABnwABoY+EEwgggAACCCCAAAIIIICAGwIEhG6MM71EAAEEEEAAAQQQQAABBHwCBIQ+Ek4ggAACCCCAAAIIIIAAAm4IEBC6Mc70EgEEEEAAAQQQQAABBBDwCRAQ+kg4gQACCCCAAAIIIIAAAgi4IUBA6MY400sEEEAAAQQQQAABBBBAwCdAQOgj4QQCCCCAAAIIIIAAAggg4IYAAaEb40wvEUAAAQQQQAABBBBAAAGfAAGhj4QTCCCAAAIIIIAAAggggIAbAgSEbowzvUQAAQQQQAABBBBAAAEEfAIEhD4STiCAAAIIIIAAAggggAACbggQELoxzvQSAQQQQAABBBBAAAEEEPAJEBD6SDiBAAIIIIAAAggggAACCLghQEDoxjjTSwQQQAABBBBAAAEEEEDAJ0BA6CPhBAIIIIAAAggggAACCCDghgABoRvjTC8RQAABBBBAAAEEEEAAAZ8AAaGPhBMIIIAAAggggAACCCCAgBsCBIRujDO9RAABBBBAAAEEEEAAAQR8AgSEPhJOIIAAAggggAACCCCAAAJuCBAQujHO9BIBBBBAAAEEEEAAAQQQ8AkQEPpIOIEAAggggAACCCCAAAIIuCFAQOjGONNLBBBAAAEEEEAAAQQQQMAnQEDoI+EEAggggAACCCCAAAIIIOCGAAGhG+NMLxFAAAEEEEAAAQQQQAABnwABoY+EEwgggAACCCCAAAIIIICAGwIEhG6MM71EAAEEEEAAAQQQQAABBHwCBIQ+Ek4ggAACCCCAAAIIIIAAAm4IEBC6Mc70EgEEEEAAAQQQQAABBBDwCRAQ+kg4gQACCCCAAAIIIIAAAgi4IUBA6MY400sEEEAAAQQQQAABBBBAwCdAQOgj4QQCCCCAAAIIIIAAAggg4IYAAaEb40wvEUAAAQQQQAABBBBAAAGfAAGhj4QTCCCAAAIIIIAAAggggIAbAgSEbowzvUQAAQQQQAABBBBAAAEEfAIEhD4STiCAAAIIIIAAAggggAACbggQELoxzvQSAQQQQAABBBBAAAEEEPAJEBD6SDiBAAIIIIAAAggggAACCLghQEDoxjjTSwQQQAABBBBAAAEEEEDAJ0BA6CPhBAIIIIAAAggggAACCCDghgABoRvjTC8RQAABBBBAAAEEEEAAAZ8AAaGPhBMIIIAAAggggAACCCCAgBsCBIRujDO9RAABBBBAAAEEEEAAAQR8AgSEPhJOIIAAAggggAACCCCAAAJuCBAQujHO9BIBBBBAAAEEEEAAAQQQ8AkQEPpIOIEAAggggAACCCCAAAIIuCFAQOjGONNLBBBAAAEEEEAAAQQQQMAnQEDoI+EEAggggAACCCCAAAIIIOCGAAGhG+NMLxFAAAEEEEAAAQQQQAABnwABoY+EEwgggAACCCCAAAIIIICAGwIEhG6MM71EAAEEEEAAAQQQQAABBHwCBIQ+Ek4ggAACCCCAAAIIIIAAAm4IEBC6Mc70EgEEEEAAAQQQQAABBBDwCRAQ+kg4gQACCCCAAAIIIIAAAgi4IUBA6MY400sEEEAAAQQQQAABBBBAwCdAQOgj4QQCCCCAAAIIIIAAAggg4IYAAaEb40wvEUAAAQQQQAABBBBAAAGfAAGhj4QTCCCAAAIIIIAAAggggIAbAgSEbowzvUQAAQQQQAABBBBAAAEEfAIEhD4STiCAAAIIIIAAAggggAACbggQELoxzvQSAQQQQAABBBBAAAEEEPAJEBD6SDiBAAIIIIAAAggggAACCLghQEDoxjjTSwQQQAABBBBAAAEEEEDAJ0BA6CPhBAIIIIAAAggggAACCCDghgABoRvjTC8RQAABBBBAAAEEEEAAAZ8AAaGPhBMIIIAAAggggAACCCCAgBsCBIRujDO9RAABBBBAAAEEEEAAAQR8AgSEPhJOIIAAAggggAACCCCAAAJuCBAQujHO9BIBBBBAAAEEEEAAAQQQ8AkQEPpIOIEAAggggAACCCCAAAIIuCFAQOjGONNLBBBAAAEEEEAAAQQQQMAnQEDoI+EEAggggAACCCCAAAIIIOCGAAGhG+NMLxFAAAEEEEAAAQQQQAABnwABoY+EEwgggAACCCCAAAIIIICAGwIEhG6MM71EAAEEEEAAAQQQQAABBHwCBIQ+Ek4ggAACCCCAAAIIIIAAAm4IEBC6Mc70EgEEEEAAAQQQQAABBBDwCRAQ+kg4gQACCCCAAAIIIIAAAgi4IUBA6MY400sEEEAAAQQQQAABBBBAwCdAQOgj4QQCCCCAAAIIIIAAAggg4IYAAaEb40wvEUAAAQQQQAABBBBAAAGfAAGhj4QTCCCAAAIIIIAAAggggIAbAgSEbowzvUQAAQQQQAABBBBAAAEEfAIEhD4STiCAAAIIIIAAAggggAACbggQELoxzvQSAQQQQAABBBBAAAEEEPAJEBD6SDiBAAIIIIAAAggggAACCLghQEDoxjjTSwQQQAABBBBAAAEEEEDAJ0BA6CPhBAIIIIAAAggggAACCCDghgABoRvjTC8RQAABBBBAAAEEEEAAAZ8AAaGPhBMIIIAAAggggAACCCCAgBsCBIRujDO9RAABBBBAAAEEEEAAAQR8AgSEPhJOIIAAAggggAACCCCAAAJuCBAQujHO9BIBBBBAAAEEEEAAAQQQ8AkQEPpIOIEAAggggAACCCCAAAIIuCFAQOjGONNLBBBAAAEEEEAAAQQQQMAnQEDoI+EEAggggAACCCCAAAIIIOCGAAGhG+NMLxFAAAEEEEAAAQQQQAABnwABoY+EEwgggAACCCCAAAIIIICAGwIEhG6MM71EAAEEEEAAAQQQQAABBHwCBIQ+Ek4ggAACCCCAAAIIIIAAAm4IEBC6Mc70EgEEEEAAAQQQQAABBBDwCRAQ+kg4gQACCCCAAAIIIIAAAgi4IUBA6MY400sEEEAAAQQQQAABBBBAwCdAQOgj4QQCCCCAAAIIIIAAAggg4IYAAaEb40wvEUAAAQQQQAABBBBAAAGfAAGhj4QTCCCAAAIIIIAAAggggIAbAgSEbowzvUQAAQQQQAABBBBAAAEEfAIEhD4STiCAAAIIIIAAAggggAACbggQELoxzvQSAQQQQAABBBBAAAEEEPAJEBD6SDiBAAIIIIAAAggggAACCLghQEDoxjjTSwQQQAABBBBAAAEEEEDAJ0BA6CPhBAIIIIAAAggggAACCCDghgABoRvjTC8RQAABBBBAAAEEEEAAAZ9Ate8MJ2YVGE+Py+DxQRkdHZOJiQmZnp4WyWRmvZ4nLBFIJKQqmZTa2lppam6S1tZWSxpGMxBAAAEEEEDAZoGBgQEZOj4k4+PjMsXnPpuH6vS2eZ/9kt5nv5qaGmloqJeWlpbs49Mv4recAAFhTqLAz6mpaTl6tFt6e/uk/9gxGRgYlKGhE38UClzOqQgIqIBwUUeHrF69WjoWdUSgxTQRAQQQQAABBHQLdB/plp07d8qR7u5sQKi7fuoLTiCVSklzc7PMXzBfOjoWypIlS0Sd4zglkMh4x6lfeaQE1LdB+/btl8OHDktPT49MTk4CEzOB9vZ2ufjiZxEUxmxc6Q4CCCCAAAKVCqhg8Je/fCz7GbDSsni9fQILFy6UpcuWyooVy7lr7FfDQ0CY9z7t7++Xrq49sm/vvmxQmPcUD2MosHr12fK8y58Xw57RJQQQQAABBBAoV+BnP/2Zlx3cVe7LeV1EBNQUouVeUNjZuVLa2toi0upwmskto56rygju3t3lBYJ7s7eFhkNNqbYJHPG+AVRjz5xC20aG9iCAAAIIIGBGQH0uUJ8POOIvoMZ64MkB2et9/l+x3AsMV3U6Gxg6HRCm02nZsX1HNhhU2UEOtwTUfFA1UZyA0K1xp7cIIIAAAgjMJqA+F6jPBxzuCAx6a4RsHnjKmy62z8sYrpBVqzqd+2zobECobgvdvn27HDx4yJ13PD31CahVwzgQQAABBBBAAAElwOcCd98HavHIgSc3y4H9B7JB4TnnniPV1W6ESm70Mu+9rbKCT2952gsGd4h6zOG2QHYJabcJ6D0CCCCAAAII/EqAzwW8FY55Owuo/6mFJdevXy8LvZVJ4344FRD29vbK5s1eStjLDnIgkBVgkV3eCAgggAACCCCQE+BzQU7C+Z97vXhhcPC4FxSuk9VrVsfaw5mAcL+X/t3spYFVtM+BAAIIIIAAAggggAACCMwloNYYefjhR2RgcFDOP/+82O5f6ERAqOYKbnnqaTl+/PhcY85zCCCAAAIIIIAAAggggMBJAbUf+ZantmTjiA0bNsgCb4P7uB2xDgjVHMGnNm+RZ555RqampuI2dvQHAQQQQAABBBBAAAEENAioKWfpsTG5cOOFsnjxYg016qsiqa8qvTX19fXJQw/9XLZs2UIwqJee2hBAAAEEEEAAAQQQiJ1Ad/dReeyXj8Vul4JYZgi7u7vl8cc3STcbi8buP0Q6hAACCCCAAAIIIICAKYHe3j55/LHHveozsnTpUlPNCLTe2GUIVWaQYDDQ9wiFIYAAAggggAACCCCAwK8EsvHGY5u8TOHBWJjEKiBUcwaf9FYSJTMYi/cmnUAAAQQQQAABBBBAwEqBU0HhISvbV0qjYhUQqgVk2GOwlOHnWgQQQAABBBBAAAEEEChHQAWFmx5/XA4fPlzOy615TWwCQrW1hFpNlAOBkgQSiZIu52IEEEAAAQQQiLEAnwtiPLjhdE3NKXxi0xPS5/2M6hGLgFBtOq/2GWRriai+Dc21uyoZi/8EzAFSMwIIIIAAAjES4HNBjAZTY1fU6qObN2+W8fS4xlqDqyryn4Z7e3tlszdvkE3ng3tTuFRSTW2NS92lrwgggAACCCAwhwCfC+bA4ak5BfZ6+xSq7e6ieEQ6IFSLyGze/JT09PRE0Z42GxZoaGiQxsYmw62gegQQQAABBBCwRUB9LlCfDzgQKEdg+/Ydsnfv3nJeavQ1kQ4In97yNIvIGH37RLvy9vYFMm9eW7Q7QesRQAABBBBAIDAB9blAfT7gQKAcAZWs2vbMdhkZGSnn5cZeE9mAcN++faKicA4EyhGora2V5StWlPNSXoMAAggggAACMRZQnw/U5wQOBMoRUCuObt0arYUuIxkQquh7+7bton5yIFCqgPojv379Olm1qrPUl3I9AggggAACCMRcYNWqzuznBILCmA90iN3buWNnpO5irA7RIrSid3iZwYMHo78JZGhAFFxQQM0JULeBqG/+Vq3qLHgNJxFAAAEEEEAAgQsuvECampu9D/V7vbUqeiN3CyAjaFYgm7zytsTrWNQhqVTKbGOKqD2R8Y4irrPmkoGBAXnwx/8r/f391rQpvyFNTU3S1tYmzc1NUldXJ9U11ZJMeIlYb18bdrzLl9L02HNXS0irVcPURHHmDGpypxoEEEAAAQRiInDsWL8MDw/JxPiETE1Pi0Tro3NMRsFjVz3x7Kcz0zI5MSljY2PeLgND2ZhgaGjIyn4+61kXyfkbzreybfmNilyGcPfuLuuCwfr6elm0eJEsXrRIFnZ0SGtrS74xjxFAAAEEEEAAAQQiKqC+TOYLZXsHb2BgUI52d8vhI0fkyOEjMjo6ak1jVdxy1vKzvNig1Zo2FWpIpDKE/d43NA8++KCogbfhUNnA5SuWy4rly71AcKENTaINCCCAAAIIIIAAAgg4KXDU2yB+r7fw5D5vT0BbsoYbLtggF1200erxiFSGsKury4pgsKamJjsH7ezVZ3tz0tqtHmAahwACCCCAAAIIIICACwIqQaP+t3LlCtm1c5eoDN3ExITRrqt5qJ2dK7NTyow2ZI7KIxMQquygivhNH4u820LXnrM2O7Cm20L9CCCAAAIIIIAAAgggcLqAStio/3V4n9vVzgRHvNtJTR3qzsaurj1eltDeva8jExB27dkjgwZvFa2qqpJzvEBwnbddQWNjo6n3FPUigAACCCCAAAIIIIBAEQIqM7dwYbs8/fTWbGA4NTVVxKuCv0TdwrpqVae1cwkjERCqlUUVpKlDzRU87/zzsgGhqTZQLwIIIIAAAggggAACCJQmoBI5l156ibS0tMiWp7YYmVuYjWX27bc2IIzExvR7vWBQQZo41BYSF19yMcGgCXzqRAABBBBAAAEEEEAgAAF1p9/FFz/LWFB2+NBhmZryti2x8LA+IFQbOx48cNAInQoG1f4hK7yVRDkQQAABBBBAAAEEEEAgugIrvMVmNm68UNTdf7qPnp4eOXq0W3e1RdVnfUB46NAhD+9oUZ0J8iL1RrnQe8MsO2tZkMVSFgIIIIAAAggggAACCBgSUEGhmgqm1gfReUxOTkpvb5/OKouuy/qAsPuI/mBQvUHUG4XMYNHvIy5EAAEEEEAAAQQQQCASAur2UbVrgO6j/9gx3VUWVZ/VAaHaN6Svr7eojgR5kXqDqDcKBwIIIIAAAggggAACCMRPYL23c4DaTk7nobagUNPhbDusDgiPeVG0gtN5qDeGeoNwIIAAAggggAACCCCAQDwF1Oqja89ZI9XV+jZdGBoakuPHj1sHanVAeHzwuKgsoa5DvSHUG4N9BnWJUw8CCCCAAAIIIIAAAmYEOjs7Re1VqOsYHx+X0dFRXdUVXY/dAaHmCFq9IdQbgwMBBBBAAAEEEEAAAQTiL6A++6dSKW0dnZiY1FZXsRVZHRAOagwI1RuBYLDYtw3XIYAAAggggAACCCAQfYHFSxbLkiVLtHVketq+vQitDQjHxsZE3TKq61jivRnUG4IDAQQQQAABBBBAAAEE3BHQGgNkMtbBWhsQqsVkdE66XLSYYNC6dycNQgABBBBAAAEEEEAgZIHFixdJa2tryLXYW7y1AaEKBtUGjjoOtQl9R8dCHVVRBwIIIIAAAggggAACCFgkoGKBhQvbLWqR3qZYGxAOaZw/2NbW5vS3AnrfctSGAAIIIIAAAggggIBdAgsdTg5ZGxDqvF20qbnJrnckrUEAAQQQQAABBBBAAAFtAgsXLhRXYwIrA8J0Oi2DGheUqa+r0/ZmoyIEEEAAAQQQQAABBBCwS6ClpUXaWtvsapSm1lgZEKrs4PDwsCYCkeqaam11URECCCCAAAIIIIAAAgjYJ0CG0KIxGR0dlfHxcW0tSiasjIu19Z+KEEAAAQQQQAABBBBwXcDVuwatjIQmJvSsLnryTZ9InHzIAwQQQAABBBBAAAEEEHBPwNW7Bq0MCKenp7W+AwkHtXJTGQIIIIAAAggggAAC1gm4eteglQGhZDLWvUFoEAIIIIAAAggggAACCMRYwNG7Bu0MCGP8PqNrCCCAAAIIIIAAAgggYJ+Aq3cNEhDa916kRQgggAACCCCAAAIIIICAFgECQi3MVIIAAggggAACCCCAAAII2CdAQGjfmNAiBBBAAAEEEEAAAQQQQECLAAGhFmYqQQABBBBAAAEEEEAAAQTsEyAgtG9MaBECCCCAAAIIIIAAAgggoEWAgFALM5UggAACCCCAAAIIIIAAAvYJEBDaNya0CAEEEEAAAQQQQAABBBDQIkBAqIWZShBAAAEEEEAAAQQQQAAB+wQICO0bE1qEAAIIIIAAAggggAACCGgRICDUwkwlCCCAAAIIIIAAAggggIB9AgSE9o0JLUIAAQQQQAABBBBAAAEEtAgQEGphphIEEEAAAQQQQAABBBBAwD4BAkL7xoQWIYAAAggggAACCCCAAAJaBAgItTBTCQIIIIAAAggggAACCCBgnwABoX1jQosQQAABBBBAAAEEEEAAAS0CBIRamKkEAQQQQAABBBBAAAEEELBPgIDQvjGhRQgggAACCCCAAAIIIICAFgECQi3MVIIAAggggAACCCCAAAII2CdAQGjfmNAiBBBAAAEEEEAAAQQQQECLAAGhFmYqQQABBBBAAAEEEEAAAQTsEyAgtG9MaBECCCCAAAIIIIAAAgggoEWAgFALM5UggAACCCCAAAIIIIAAAvYJEBDaNya0CAEEEEAAAQQQQAABBBDQIlCtpRYqQQABBBAwJjCdHpOp44MyPToimYlxyUxPi2QyhduTSEgimZRETa0k6xukqrlFkqm6wtdyFgEEEEAAAQQiL0BAGPkhpAMIIIDACYHpdFomeo7IxKF9Mr6vS8Z2PiNj27fIWNdOGT/QJVMD/SVRVbW2Se2yTqnrXC11a8+TutXnSu3yTqlZslxq2hd5gWKqpPK4GAEEEEAAAQTsEyAgtG9MaFHMBabH0zI1OFBctmamRX72pqFRqr0P7InqmplX8bsjAlPDQ5Lu2iEjm38pQw//REafelzSe3dm319BEKgAcnTgcRnd8rhX3FdPFlnV0iqpFaul/vyLpOmyK6Rhw8WS6lwjVY1NJ6/hQbACmclJmRw4JtMjw2fO8lZate/vzDzv70w8Pi5U9Pe3VNeZjm2eY1W0HTOTE977sF/P+7BUb64/XSCG77/TO8hvQQpE+y9TkBKUhUCIAuk9u+T4T38oQz//sYxue8r70L7by9Ycq6jG6nkLJLVqrTReeKm0/Nr10vqil1ZUHi+2X0Dd+qkCwOFNj2TfTyoAHNvxtKhgQeehvtBQQaj6X++XP5cNFurWrM8GiM2Xv0QaN16aDRC51bTyUVGBfv93vibDjz2UzfhOHuutvNASSlB/Z1RmuPFZz5W2l92c/QKghJdbcan6e5v9+/vQjwL7+1tqx6rnt0vdmnXS9OwXyPwbb5X6dRtKLcLo9QM/+i8Z/P4DMvzEI5LevV10vw+Ndj4GlZ/2/rvJe/+dG633XwyGwPouJDLeYVsrd2zfIQ899HNtzXruc58ja9au0VYfFbkjoP7RPPwPH89+oEvv3RVax9VcL/VhbfHb/6/Ur78wtHooWL+AymiMbNkkx//nP6X/u/fL6NYnsxki/S0pvkY1/7B+3QXSds0N0vzia6XhvI2SrOX20uIFvSme3rgf/Os/l96vfF4mug+V8tLQrq3pWCILXv0mWfqeD0giAuOpvkA5/Pcfk2P33ytju7aF5lJqwY0bL5PF73pf9m92qa/Vff3o00/I4c/8ZfbfMDUHmSP6AlF6/5nQ1hGD2Bh3kCE08W6jTicEJo4clL1//I7sh/iwO6z+oe772hdlqr9PVv7VXVKzcHHYVVJ+yAKTvUel/wcPSO/dd8rQoz8NubZgi1cL14w8+Wj2f/LJD0jTJZfLglvfIm1eJrt6/sJgK4tpaSoYPPwPH7OqdyowzbVp2fs+alXb/I3JyP4/f48c/cI/+Z8yfGZ408PSc+9d0vyCq6Wqqdlwa2avfqL7sBz4+B/JwA+/PftFPBM5gdz7r+VF10iygdv8IzeAITWYbSdCgqVYtwUyU5Oy/8P/V0swmC+t/uHuve/z+ad4HDGBiaOHpfuuT8kzr36x7Pn9N0cuGCzErQJa1RfVp+7PfVomersLXca5XwkMPfy/2cygrSAqa6luZbX5OPrFf7YyGMyZDT3y0xNfmOROWPiz5947CQYtHJcgmjT8y4e826e3BFEUZcREgIAwJgNJN+wS6Pv6l6TvG3cbadTgj78rmakpI3VTafkC6tv4I3f+jWx7zZWy7//dnl0dtPzS7HzlmPcBZN8H3i3bX/dr0nPPXTI9NmpnQw23qv87X7fmNtFCFCpTqOY12nqo9vV4AaHNx9RgvzfGh61tolo85viDP7C2fTSsMoFJ724ibgGuzDBur+aW0biNKP0xLqCyH0fu+Btj7VBzzCaOHJDapSuMtYGKixdQGcG+b94jPV/6rLdAzNbiXxjhK9V7dM8fvEWO/cdXZMntfypNl14R4d4E2/TMxISob+9tP9QiN2oxIxtXH+396hdkxFtwyf7DuiUcTpKphdBGno6C4ckm86BEgSSrQpcoFu/LCQjjPb70zoBA3zfu8Zbp32Sg5hNVTvb1yPjBfQSExkaguIonerpPBIJf/IwzgeBMmUFv5UI117Djtttl0Vtu9+azNM68xLnfVXZrbKf9XwyoPS7VNhg1C+yaE6r8eu/7l0i8b5KN9s4fVKsXl7pvaSTQaWRWoKp1nvffbgcaCJwU4JbRkxQ8QKByAXULUI/3Ad/0oZZZ57BTQN0mqW6X3H7Lr8l+dWuoI1nB2UZDfYFx8C/fL7t/51YZ3c6cFvVljrqdy/ZDraCs9kS07ej7preiaET+m7ItmM4fS7W6KEd8BWqXrZBqy77Mia92NHpGhjAa40QrIyLQd/89VnwYSVu0xHpEhk5LM4ce+Ykc+tsPicqMcZwuoLbUULepLf3Dj0rb1a84/UmHfkvvi86XOWo1WZuO7Bdyd3/WpibN2paq1jap7rB3NejRZzbP2naeiL5AXecaSdbVR78j9CAwATKEgVFSkOsC2Q8j3jwwG44xMi02DMPJNqhMyqFPf0R23nYTweBJFf8D9SF092/fIof/8ROi9pBz8Uh7t2JG5chMT1vVVFu+kCsGpXbZSmtv2VN3MYzt2l5MN7gmogJ1a9ZHtOU0OywBAsKwZCnXOQGbPoyMde1w9gO1bW88dRukuh1S3Rapbo/kmFtABc8HPvY+2fOe35TxQ/vnvjiGz6q5W5E5MvYsiqIWZ1ILM0XlsDlDM9FzRMYjlKmOypjb1M7U6nNtag5tsUCAgNCCQaAJ0RewKTuoNMf374nEPKToj/zcPej/3rdk9zteq30/yrlbFY1n++6/V3a/6xZxaS5TNjPjfZkTncOegPDY/V+24nb9YsfO5gzNxKEDMnV8oNiucF0EBVLLV0Ww1TQ5TAECwjB1KdsZAZuygwpd7XFFNsrc20/d7qhue1S3PzIXp/xxUBu0d733Nhl+/BflFxKhV57IzHRFpsW2JAgne4/K0QhlB9UA25yhidI81sj8x2JRQ6uaW6VmyTKLWkRTbBAgILRhFGhDpAVsyw7mMCe9bQ049Auo2xzV7Y7qtkcbV2HUL1JZjSNPPCJ7//gdTgSFkcvMZOyYQ9j/gwckavOmbc7QRGkea2V/Xdx8de3yTqlpX+Rm5+n1rAIEhLPS8AQCxQnYlh3MtdrF+Ve5vpv6qW5vVLc5qtsdOYITGHnyl7L3T94V+9tHo5aZyUxOBDfIZZaksvE9d99R5qvNvMz2DE2k5rGaGcJI12rz/NVIw0a88QSEER9Amm9WwNbsoFJJR2ouktlxDKL24cd+kb29Ud3myBG8QDZT6AWFcf6iI2qZmenR0eAHusQSRzY9IsOP/qzEV5m93OYMzfToiIztZoVRs++QcGu3ef5quD2n9LkECAjn0uE5BM4gYGt2UDU7vXPrGVrP00EJDHkfSNVtjSpo4QhPQAXbBz76hzI9ng6vEoMlRy0zM+3NVTZ99H3ry6abUHL9NmdoJroPefuB7iy5T7wgOgJ1q9dFp7G0VJsAAaE2aiqKm4DN2UFlzdYTet5xQ4/8VPa9/7dlZPMv9VToeC1937hber7wmdgpRDEzo7Z6MHmk93VJ/7e/arIJZdVtc4ZGmTL3uaxhjcyLalewwmhkBktjQwkINWJTVbwEbM4OKmm2ngj//ZYNBv/0dwgGw6c+rYZDn/6wKPs4HVHMzJjOJB174D5RblE7bM7QjG57KmqctLcEgaq2eVK79KwSXsGlrggQELoy0vQzUAHbs4Oqs2w9EeiQ+wojGPSRaDuhtlQ5+Fd/6r3H47NXWhQzMybnPKpAsPfeu7S954KsqHZFZ5DFBVrWyKaHAy2PwuwSqDv7XKlZuMSuRtEaKwQICK0YBhoRNQHbs4M5T7aeyEkE+1PNGdxHZjBY1BJLO/6TH0r35/62xFfZe3kUMzMmb0s/9q37ZGzXNnsHdJaWnVhh1M4MjVqxdXTr5llazuk4CDRd9nxJ1NTEoSv0IWABAsKAQSku/gJRyA7mRiHOKzLm+qj7p1pNlDmDutUL19f9ub+ToYd/UvjJiJ2NYmZm/MAemTo+qF06ihvR55Bql6+ydg+4iZ4jMr5vd66p/IyZQKKmVlqvennMekV3ghIgIAxKknKcEYhKdlANCFtPBPu2VPsM7n3/u5gzGCxr2aVNHuuVQ5/6kKgFWaJ8RDUzMzXQ79kPa6eP4kb0OaT6dRskmarL/WrVz4lD+70APz63YVuFa0Fj2q5+hTQ/94UWtIQm2ChQbWOjaBMCtgpEKTuoDNl6Irh3ksq2qs3Ro7K1RLKhUVIrV0v9uRuk/vyLso+rFyyUZH3jyVuGMpOTMj02Kmr7ALViZLprp6itD9SteOq9k5maCg4wpJIGf/Rf0veNe6T9lttCqiH8YqOcmclM6N2cPoob0ee/gxo2Xpb/q1WPx/d2WdUeGhOcQMMFF0vH294jkiAPFJxqvEoiIIzXeNKbkAWilB1UFLk5PrZ+Ix3ycAVWvPoQeuAjf+Ddnvi/gZUZdEGpFWdL/Xkbpek5L5D6dReK+r2mY7Ek6+pLrmpqeEjGD+6V0Wc2y9BDP5bB//6OpPfuKrkcXS/o/tynpNX79rumvUNXlYHWE+XMTGZ6OlCLMxUWxY3o8/tUf875+b9a9XiMvWutGo8gGqNuE1WZwYVvfrc0XXJ5EEVSRkwFCAhjOrB0K3iBqGUHlUBu64naRUuDB3GoxKP/+o/S9817rOtx9fz27D/2bde/RhovvFTU70EcVY1NUr/2vOz/5ntlTw4ck+HHfi699/2LqMU8bDtGtz6ZHZ9Ft73btqYV1Z5IZ2YymaL6GNRFUdyIPtf3bNZ+eWfuV+t+qrsDOKIvUD1vgaRWrZUG79+E1pdcJ60veqlIksxg9Ec23B4QEIbrS+kxEohadlDR57aeICAs/404+OPvycFP/ln5BYTwSvXBcsGr3ygL3/iubNAWQhWnFVndOk9aX3yttLzwGln4hnfJoU9/SI4/+P3TrjH9S88XPyPzX/HabFbUdFtKrT/KmZmMxoAwqhvR594P6hbumg47l/xXt46rO0psOFpfeqO3+Mn1kupcI2pVVpXlShDQzD00iUTWSFmpfx+qW9skUc1qonOj8Wy+AAFhvgaPEZhFIIrZwVxX2HoiJ1H6T3Wb5P4PvkemR/QvnDFba5svv1IWv/tPpcX7qftQH8rUogQNF3xd+r72RTnwF38iU/19uptRsL6xHVtFfWmz6C2/V/B5m09GOjOT0XfLaFQ3os+99+q8rE2yviH3q1U/T8xj7TLapkR9vaz6+3vUl0+ZZG0qYbQxVI6AYwLkkB0bcLpbnkAUs4O5nrL1RE6itJ/ZeYMf/6PsPLrSXhnO1dVt82XZn/ylrL7zG0aCwfxeqVtKF/6ft8s5X/6BtKjbkSw5er702eziOJY0p6hm2JSZKarBMy7KTOpZVCbKG9HnyOrWrM89tO7nxKEDxlcYXX3X/TLvmhuFYNC6twcNckCAgNCBQaaLlQlEOTuoes7WE+WN/9Ev/rM18+Vann+VrPnSd2Xx29/r3ULVUl6HQnhVw3kXydmf+Yos+f0/l0SV+RtOVJbw2P1fDqGn4RVpQ2amkt5Nj45W8vKiX9v3zXsjuRF9fgdTq8/N/9Wqx2nD+w8ufe8HpfUFV1llQmMQcEmAgNCl0aavZQlEOTuoOszWE6UPu1pA5fCnP1z6CwN+hVodVn1QOvuOr3uLxlwScOnBFFfV1CxLb/8zWflXd0pV27xgCq2glKN33yGTfT0VlKD3pTZkZirpsdqyJOxDbYnSc/dnw64m9PJT3qb0th7pnc8Ya5r6GzL/ptd79XOXqLFBoGLnBQgInX8LADCXQNSzg6pvua0n5uonz50SUJucH/zkB4wHFakVq2Tl3/yrLPHmC6oPTLYfC379jbL8A39jPFM4tu0pGfjht23nOtk+05mZkw0p84EK1sI+VNZXZX+jfKjFUWqWLLO2Cybnsba97FXePqlnW2tDwxBwQYCA0IVRpo9lC0Q9O6g6ntt6omwEx17Y6y2WojY7N3nUr7tAVnziDm/VzNeYbEbJdaugcPG731/y64J+Qe+//6tkpqeCLjaU8kxmZoLoUHrPziCKmbWMyd6jctSbGxr1o9bbbqKmfZGV3TA9j9WmechWDhCNQkCDAAGhBmSqiKZAHLKDSj639UQ0R0Fvq8cP7JXuO/9Wb6UzalPB4PIP/72oeYNRPNQqn2olVJPH8GO/kPSu7SabUHTdJjMzRTdyjgvDDmj7f/CAjG3fMkcLovFUnbeFQrKu3srGGp3H6q1cXL/+QitdaBQCLgkQELo02vS1JIE4ZAdzHWbriZzE3D+77/qUd2uauc2ZUyvOlrO82y6bn/PCuRtq8bNq0Ztlf/RxqWo0d5vr9MiQqHmgth+mMzNB+IR5S7pa6bfHmxMah4MVRguPYt2adVK7bHnhJzmLAALaBAgItVFTUZQE4pIdzJmz9UROYvafx3/+Y+m5987ZLwj5GZU9WPZHH4tsZjCfp/GiZ8vC296df0r74+M/+aH2Okut0GhmptTGznL9+IE93nYFg7M8W9npkU2PyPCjP6usEEtezQqjhQeibvU6o18eFW4VZxFwT4CA0L0xp8dFCMQpO6i6y9YTcw+6Wkjm8Kc/EtoH27lrP/Gs2mx+3vXRmjM4V7/ab32rqIynqWPkqcdkanjIVPVF1Rv1FUZVJ6cG+mV6dLio/pZ6Ud+3orWFyFz9Y4XRwjr1a88r/ARnEUBAqwABoVZuKouCQNyyg8qcrSfmfuf1feNuGfzxd+e+KMRn2657lSx6y+0h1qC/6NSyFaKCQlOHuvU33WX3PMKorzCaG9vMxETuYWA/0/u6pP/bXw2sPJMFscLo7Po2Z05nbzXPIBA/AQLC+I0pPapQIG7ZQcUR5jyfCrmNv3yip1u6P/dpY+2oP3eDLPvjT1i74EQlMPNueK3UdCyupIiyX5uZnJSRJx4t+/U6Xhj2giw6+qDqyExPB17VsQfuk4nuQ4GXa6JAq1cY9e6OGNtt7osTmzOnJt4r1ImAKQECQlPy1GulQByzgwo6O89HwwbSVg7qGRrV9817ZHTrk2e4Kpynk/UN2WCwbuXqcCowXKr6sNd27c3GWnH8Zz8yVncxFZtcwKiY9hV9TSZT9KXFXKgCwd577yrm0khcY/UKo5512FuHzDZItmdOZ2s35xGIowABYRxHlT6VLRDH7KDCUPN8JkNa+KFsbAtemP0C4IufMdaSjrf+nrS+5Dpj9euouO3lv66jmoJ1jD69ydp5hGreqsnMTEGwMk9mAg4I+755r4zt2lZma+x7mc0rjKpbc6dHwpkDeqaRsDlzeqa28zwCcRMgIIzbiNKfsgXimh3Mgaj9CDlOFzD5BUDz814si972+6c3KIa/NV54idQZWjjixDzCHVaqqiyYqcxM4CCZ4G4ZnTh62NtqIvob0ecbq5U0bT1Gtz1lrGk2Z06NoVAxAoYECAgNwVOtfQImgwMdGlP9fTqqiUwdJr8AUHv0Lbn9z6S6dV5kvMptaFVTi7Rec0O5L6/oddl5hJt/WVEZYb3YZGYm6D5lJoNbVObY/V/29gLdGnQTjZZXu6LTaP1zVT6y6eG5ng71OZszp6F2nMIRsFCAgNDCQaFJ+gVMBge6ejtx5KCuqiJRj8kvABa87jZpvvzKSDgF0ciWF14TRDFllTH08E/Kel3YLzKZmQm6b9Ojo4EUOdl7VI5+KV7ZwRPz5M4KxCfoQqbTY9786c1BF1t0eTZnTovuBBciEBMBAsKYDCTdqEzAZHBQWcuLf3Vsbk8rvsuzXmnyCwC1N1/Hm3931rbF8YmG9RdKauXZRro2+tTjMp1OG6l7rkpNZmbmalc5z00HdDt6/w8ekLHtW8ppgrWvqfUWVqppX2Rl+yZ6jsj4vt3G2mZz5tQYChUjYEiAgNAQPNXaI5CdsxKzb6UL6cZliftCfSv1nMkvAFR2MLViValNjvT11fMWSP26C430Ib13p6gPvjYdpjMzQVuov6GVHsqk5+47Ki3GutfXr9sgyVSdde1SDZo4tF+mjg8YaZvNmVMjIFSKgGEBAkLDA0D15gXiOGelkCp7EZ5QMZkdrOlYIvNvuqXQ8MT+XOOznmukj1ODA94H331G6p6tUtOZmdnaVe75IO4+GNn0iAw/+rNym2Dt6xo2XmZt28b3dhlrm82ZU2MoVIyAQQECQoP4VG1eII5zVmZTHd+/RyZZWEZMZgfbrrtZXN2IOXX22tnemqGfH/eW1rfpMJmZCcMhiLsP+r715TCaZrzM+nPON96G2RowttPc4j02Z05n8+I8AnEWICCM8+jStzMKxHHOymydVttOTPb1zPa0E+dN3x487xWvdcK5UCer2zsKndZybmznM1rqKbYSU5mZRDKcf/IrvftArbja/+2vFssXmeuSDY3eF0Cd1rZXbcti6rA5c2rKhHoRMCkQzr8OJntE3QgUKRDXOStzdX+yp3uup2P/nMnbgxuf9RxptPj2sbAHX20/YeqwbaESU5mZsFa2HT+wx5uLNlj28B574D5R+zKGeSRTqTCLL1h2auVqUbeJ23hMj42KCuRNHTZnTk2ZUC8CJgUICE3qU7dRAVNzVlRg0H7rW+Sce37wL+oDg85j3FtEwNXD9O3BC177ZmsXl9DxnlDZElOHmuOmvgCy5TCRmUlU10jjS264IgyDqYF+mR4dLqtoFQj23ntXWa8t9kV1q8+V2rM6i708sOvqVq2VZH1DYOUFWdCJeaxdQRZZdFm2Z06L7ggXIhAjAQLCGA0mXSlNQPeclexm5O9+v6y+8+uy8hN3SPPzr3zjio/8ozRerG+xjbTBb4RLG53grzZ5e3DN4mXSeuXLgu9UhEqsamoWtdqoiWP84D5RQYsNh4nMTMMlz5Nlf/6p4wvf8Fuvbg5pT8jMRHmb0/d9814Z27UttKGpWbRUlv7ZJ99p4m+fzRuvTxw6YGyFUZszp6G9ESkYAcsFCAgtHyCaF46A7jkriaoqWewFg0vf+6G8W4gSyZYXXSMdb/od71tkPQSSgnYAAEAASURBVNmTtMFFBMIZyeJKnR5Pe0va31ncxSFc1XbtK6V26fIQSo5OkdWt80VlakwcU0ODMjV83ETVvjp1Z2ZqvTlsS977oUz769/WXFVTc/tZH/z0VLP3dyfoIzM9XXKR2Tm9d4e3EX3H298rZ//L/cebn3/1m9vf8M7SG1hyj05/QcrQ+/30VhT+LW1w/0GbM6eFtTiLQPwFCAjjP8b0sICAjjkr+dUufMM7ZfE7/iD/1MnH8195q7bsUaWLP5xsdMQejHibkw8/+lNjrW677lXG6ral4kR1tZjaeiJZV28Lg7cFht7MTMebb5fWK17ifSdVJUlvUZmG1edWLf7tPw7eI5Mpucww5/Su+MRnZenvf3C66YJLVCB8acdt787UX3hJyW2s5AU2rygcxMqw5drYnDktt0+8DoGoCxAQRn0EaX/JAjrmrOQ3qunSK2TR234//5TvcfMLfs13LowTrm49MfjDb4fBWVSZdWvPk8YL9H4QLaphBi5qe9nNeRlyfQ1QH0BrDK5ymt9TnZkZNX+t7aU3SiKRyG+CNHnzmFuvufG0c5X/UlpAGOac3qV/8BFpf82bpKquPvsZR/W/dtnKqpYXXF15N4ss4cTG68uKvFr/ZSbmseZ6aXPmNNdGfiLgmgABoWsjTn8l7DkrM4kXeB9Mas9aOfP0ab+3PP8qSa1Yddq5MH5xceuJqeEhOWZwSXsVBKn5cxwiTZddIQte/SbtFG1e8KM+oNtw6MzMzH/l6yVV4G9PMlUnLQF/CVVqgjCsOb3Z2/Df+C5Ri+jkH0kvQ61zxU91q25N+6L8Jljz2MQ81vzO25w5zW8njxFwSaDapc7SVwQmug97c8nCm7MyU7j1JS+XBb/+xpmnfb+nOtdI3bkbJL13t++5oE+4tvXE6JZNMrbtqaAZiy6v9cXXFn2tCxcufc8Hst3s/crnQ99qQC0o0v7a35RF7yx8u7YJb52ZmeYrrhIvPViwm6mzA57PmSl+il5YW/6ohbvUPO2qllmC/6nJghZhnKzz/qbbdKtyfh91z2PNr9v2zGl+W3mMgEsCBIQujTZ9lb7775GxHVu1SbRdc4Mkak7/pnq2ynVtQeHa1hODP/rP2chDP193znlSf97G0OuJUgWJ2pQse99HpfWql0v/d74mw489JGrj+MljvYF0Q61kqhavUfMV1dzNpksvD6TcIArRmpnx5gvWr7tg1mZXz2+f9blynihlldGwtvxZ+JbbpfGiZ8/a/LD3Osyv2OZ5crrnsea72Jw5zW8njxFwTYCA0LURd7i/2ezgl/RlB9V+g2p1yWIPXbcXmVh+vViDoK/L3i7qBR2mjnnqdtHGJlPVW12vun1U/S8zOSmTA8dkemRYMhPjkl2tstT7D70sWMILgBI1taL2OKtunefdMmjfP286MzN1a9Z58+ZmX9k26NuYp0eGin6/hbHlj/pCbeGtb52zDek9u+Z8PsgnbZ4np3Me60xTmzOnM9vK7wi4JGDfv5gu6dNXrQK6s4MqA1K9YGHRfUxqChxc2npi9OknvNtFtxQ9BkFf2PIibhc9k6kK3GrUfycl/LdypjJtfV5nZqZu9Trvy4jZ566qgLCqpU3UvOIgDrVITDFHWFv+qJWc59raRWVn03t2FtPEQK6xeZ6cznmsMzFtzpzObCu/I+CSAIvKuDTaDvdVd3ZQrSw5r8StBpLerXQ6Dpe2nhh88Ls6SAvWwe2iBVmcPqkzM1Pv/Q2a61Bzuc602NVcr5/5XHpvcdm3MLb8UcHv/Jtumdmk036f7O8TtcqyjsP2eXI657HO9LY5czqzrfyOgEsCBIQujbbDfdWdHVS3iqqgsJQjkdITELqy9YRauGLgew+UMgSBXsvtooFyxqIwnZmZM33wViuNqtv3gjpGvb0+z3SEteVP++vfdsYVRNUc1aCyoWfqp83z5KZHR2Rs9/YzdSG0523OnIbWaQpGIAICBIQRGCSaWJmA9uygN3dn/g2vLbnRVU0tJb+mnBe4svWEmis5uvXJcogCeQ23iwbCGKtCdGZmivngfaagsRT8kc2/lClvHuhcR9/X75axXdvmuqTk5+rOPkfm3/i6M75O5+rKNs+TU0G5zltn8wfG9sxpflt5jIBrAgSEro24g/3Vnx28ec7V/WYbArVHVlVr22xPB3pe54ejQBteQmHDmx7JLlJSwksCu/TE7aIXBlYeBUVfQOcKo8V+8A5yZeOx7U/L+MF9sw5Uen+XHP23f5z1+XKfWPC6286YHVRl61xd2eZ5cmoOp1rAycRhc+bUhAd1ImCTAAGhTaNBWwIX0J4dVN9W3/Casvqh9iKsXTb3BvZlFVzgRTo/HBWoXsup4z/9oZZ6ClWS3Qh9jgU9Cr2Gc/EW0LnCaLEfvGsWLg4UfeSJRwqX560ae/Tzf+/ts1rcPMPChfjPqi/R5l1f3N/bdJe+2yTVnEZbj1GDe7LanDm1dbxoFwK6BAgIdUlTjxEB3dnB1mtulPr15e07l90/LcA5PXOBx33rCbXdRDFzmuYyquS55hdcXcnLeW0MBbSuMFrkpuhJb5XRII++r39JbSEyNbPMvgfukyP//MmZpyv+Xe0zmVreWVQ5OvefrV1RXJuKanjAF41sejjgEosvzubMafG94EoE4ilAQBjPcaVXnoDu7KD6trrtpTdVZK8rQxj3rSdUNkDnfK38QVe34TWs53bRfBMei+hcYbTYuYFqz8Ygj8H/+U/p/tzfVWUymX3e/0Ynerunjt5zl3T97m8EWc3Jsua/ori52mohFV1fgp24Xfesk2206YFaaGt062ZjTbI5c2oMhYoRsESAfQgtGQiaEbyA7uxg8/OvkqZLL6+oI6XsW1hJRbmtJ9RKg3E8Rp54NLvhuYm+NZy3UVS2lwOBfAGtK4x2rs2vetbHydraWZ8r94lDf/0Babj08t8Z/N43vzH00I9k9OlwFnZqvOR50rDx0qKaqXMhldrlq6SmfVFR7dJ90YnblnfrrvZkfTZnTk82kgcIOCpAQOjowMe927qzg8qz5YXXVMyqa3P63NYTtYuWVtxmGws4/rMfGWtW42XPN1Y3FdsroDNjXbukuAxVojacL4R23nr1N8IeifZb3yrFfqGlcyGV+nUbim5X2EYzy584tF+mjg/MPK3ld5szp1oAqAQBywW4ZdTyAaJ55Qnozg6qb6tbr3p5eY3Ne1Wipibvt/Aexnnriez8wac3hYd3hpLr111whit42jUB3Xu/Vbd3FEVc5d0yqmtl46IaVORFao/XtquuL/JqEZ0LqTRsvKzodum+cHxvl+4qT9ZX7EJHJ1/AAwQQ0CpAQKiVm8p0CJjIDrZeeZ1Ut82vuHuJKn1J+7huPaHmCunMxuQPupqTlVqxKv8UjxHw5jPr2/utylsopnp+e1HqVc0t2lY2LqpBRV600NuIvpTb63UupFJ/zvlF9kL/ZWM7t+qv9Fc11q8939rMqTEUKkbAIgECQosGg6YEI6A7O6i+rZ533c2BND5RE/ycntkaFtetJ9QG2ZnJydm6Hep5taCMWlyIA4F8AZ23LNaetbLoL6fULZdqK4AoHXVr1sm8G4pbTEb1S+3/GNY8xplu2S+ElnfOPG3N76a+KFMA9Sy0Zc37gIYgUEiAgLCQCuciK2AiO9h27U2igsIgjqqm5iCKKaoMXavuFdWYAC8aevgnAZZWWlF1q9ZKsr6htBdxdewFdN6ymN3rrYTFoopdkdSWQWr3soOl7J+o/k1I79mhpfk2fyGkAmO1mJipo2bJMlNVUy8CCBQhQEBYBBKXREdAe3ZQbURf5NLnxSiq7JKuOT1x3Hoiu6y6lyE0dbDPlil5u+vVectiqV9OqSAmKofKDs6/4ZaSmpvet0umR4ZLek25F9v8hdCJFUa7yu1axa9LVOubDlFxYykAAQcFCAgdHPS4dtlEdvDERvTB7TmX8m7f0rUXYW7riTi9H9RcLZPfgrPPVpzeTcH0RffebynvS6pSjlKybaWUG8a12exgx+KSih59ZktJ11dysc1fCE0cOmBshVFlqv42cyCAgL0CBIT2jg0tK1FAd3YwiI3oZ3ZR7V+na07P+IE9olYbjdOR3utlA4aHjHWJfbaM0Vtbse6931LePnilHElvEZooHOVkB1W/Rjb9Qlv3bL79Nr3P3P6DagAGf/w9NZ8zo20wqAgBBEoSICAsiYuLbRUwkR0MYiP6Qp66MoRTA/0yeXywUBMie05nNmAmEvtszRThdyWgc++3E+/B0uZqqYVQonC03+rNHSwxO6hzQRllWGowrtM9vfMZndX56hr87+9I/w/+I+F7ghMIIGCFAAGhFcNAIyoV0J0dVO0NYiP6Qv0uZTn1Qq8v5VzcMoQ6swEzndlna6YIvysBnXu/lfMeTNbqW9m43HdEnZqrfePrSn65zgVlygnGS+5QBS8wucJortm73/5q6fv2V2V6PD2dO8dPBBCwQ4BZvnaMA62oQMBEdjCojegLdTvZ2FTodCjnpvr7QinXRKG652rN7GP9uRvYZ2smCr+Lzr3fsiuM1tWXpJ6orSvpehMXL3jdbWVt56JzQZlygnFdlqZXGM3v5+7f+nVpveaGZOuvvULUnHkVSKvtlhJJh/ITiUS2v6rfKkNf3TZPdO5BnD8ePEYgJ0BAmJPgZ2QFTGQHg9qIvhB6orqm0OlQzk0cORhKuSYK1T1Xa2YfGzZcPPMUvyMgOjMz5SxqUuV9IFUrG6tbyG081Fztede/pqym6byFvJxgvKxOlfEi0yuMzmzywHfvF/U/DpHq+e2i5sc2P+9KLwt+i7eF1XpYEDAi4NBXMkZ8qTRkARPZwSA3oi/Eo/Ob0vSenYWaEMlzOudqFQIqdXXHQmVwLl4CujMz5SxqUtXcom1l43JGt+26V3lz8zrLeanWBWXKCcbL6lQZLzK9wmgZTXbmJZN9PTL0i/+VQ5/6kHT93htl4AcPONN3OmqXAAGhXeNBa0oUMJEdbLv2lYFtRF+wuxpvnTG90EDB/pd5UudcrUJNrF1c2mIehcrgXLwEdGdmylnUJOltYq9rZeNyRrfcfV5130JeTjBejkc5rzG9wmg5bXbxNcObHpajX/xnUe9dDgR0CxAQ6hanvsAEjGQHsxsjvzawPhQqSM0r0HXEaS9CnXO1Zo6PmgdT3d4x8zS/Oy6gMzNTyaImtgYzaq52w8ZLy3oX6b6FvJxgvKyOlfGiOH3xV0b3I/WSES8oHN/fFak209h4CBAQxmMcneyFmezgzVK/7oJQvauamkMtP7/w8f17ZDImC8vonKuVb6geqwUl1B6SHAjkC+jMzFSyqElq5er8ZlvzuP3Wt5a9UJPOW8grCcZ1YJv826ijf3GqY2pwQDJTU3HqEn2JiAABYUQGimaeLmAkO6iWPr+hvMUNTm/93L+pRRTUIg86DrXthJrDEPVD91ytmV7ZBSW8W+84EMgX0JmZqWRRk5qFi/ObbcVjNVe77arry26LzlvIKwnGy+5gkS80/bexyGZy2a8E1Crj6gsGDgR0CxAQ6hanvkAETGQHW6+5UerXbwyk/XMVopbi1rU5vWrHZE/3XM2JxHO652rNRLH1lruZ7eR3vQI6MzOVvAeTLXq+gCpFf+Hr3yaV7Mmq8xbySoLxUkzKudb038Zy2uzya2qXnMXdJi6/AQz2nYDQID5VlydgIjuosnZtL72pvAaX+Cp166HORR7GD+0vsYX2Xa5zrlah3tt6y12htnJOj4DuzEyqc23ZHVN7odl0qGX4591Q2VxtncE4K4za9O6JdlvUvyXJEvcSjXaPab0tAgSEtowE7ShawER2sPn5V0nTpZcX3cZKL9SZIUx37ai0ucZfr3OuVqHO1ixaWug05xwW0J2ZUZmFco9krb6FrIppY7uXHazkNtbp0REZ2729mKoCuaZu9bpAygmjENN/G8PoU5zLtPnLhTi70zcRAkLeBZESMJEdVEAtL7xGq1Mlt0qV2tD0zq2lvsS669O7thltU1XbfKP1U7l9Arqz1pWscpuotWf+q8oOzr/hlooGdKL7kOjcY7V2RWdF7Q3zxTrnsYbZD1fKtvnLBVfGwNV+EhC6OvIR7beJ7KBa+rz1qpdrFVMTy3Udcdh6Ymz7Fl1cBeupsnAOVsGGclKbgM7MjHr/Vc9vL7tvVd4to7oWsjpTI7PZwY7KFrlJ7+uS6ZHhM1UVyPMnVhgtPzsbSCPmKETnrbNzNIOnihSw+cuFIrvAZREVICCM6MC52GxT2cHWK6+Tas0ZoERNjbYhjvrWE2oTXxXUmjrUB+nq5hZT1VOvpQI6MzO1Z62s6G9Ulff+1Xmb+mxDFkR2UJU9uu2p2aoI/Hzt8lVS074o8HKDKFD3rbNBtNnlMmz/csHlsXGh7wSELoxyTPpoIjuolj6fd93N2gUTVdXa6oz61hNqH0UV1Jo61AdpMoSm9O2tV2dmptJtT5Lelik6F7KabdTab/XmDlaYHVRlq829dR316zaUvVdi2G3Ufets2P2Je/k2f7kQd3v6xxxC3gMRETCVHWy79iZRQaHuI1Gjd5GHKG89ofZRVEGtqaPSD+Om2k294QnozswE8Teqkm0rgpCsU/u83vi6iotSq7uOPv1kxeUUW0DDxsuKvVT7dTpvndXeuRhWaPOXCzHkpkszBMgQzgDhVzsFjGQH1QeUV1S29Hm5mlVNzeW+tKzXRXnrCdPBbMriFQbLejPwoooFdGdmUt7fqkoP01unLHjdbV52cEml3RD15WF6j75byOvPOb/iNodVgM5bZ8Pqg0vl2vzlgkvj4GpfCQhdHfkI9dtUdvDERvQXGpFSH4x0LvIQ5a0nTAezqc41Rt4jVGqvgO7MTMqbx1bpUck2DxXX7f29m3f9ayotJvv69L5d2haUUfs3ppZ3BtLuMArReetsGO13rUybv1xwbSxc7C8BoYujHrE+m8gO6tyIvtBwqCBD5yIPUd56wnQwW8n+b4XGnnPRF9CZmTmxEMWyitGSBlfKbbvuVYEFVqPP6FtxWGVVg8hqVjx4BQpQi22Nbt1c4BlO2SigVhYP4osdG/tGm6IhQEAYjXFytpWmsoO6N6KfOcDV8xZoXeQhyltPmA5mK9n/bea483s8BHRmZmq9DFUQq1yqbJepI8hb80c2/UJbN+pWrZVkfYO2+kqpaKLniIzv213KS7jWoICai16zqPJbpg12gaojLkBAGPEBjHvzTWQHlanujegLjaPODGFUt54wvuVEhfu/FRp3zkVbQHdmJruoUV19xWjJWr0LWeUarPZ5bdh4ae7Xin7qXlCmbs36itob5osnDu2XqeMDYVZB2QEK1HlzUZMB/HccYJMoyjEBAkLHBjxK3TWVHTSxEX2hcalesLDQ6VDORXXrCeNbTlS4/1sog0mhRgV0Z2aCCkoStXVG3NpvfWtg2zboXlDG9Mqscw3Y+N6uuZ7mOcsEGi9+rmUtojmuCRAQujbiEeqvqeygiY3oCw2LmlOg8zC9Wmc5fWXLiXLUeE2YArozM0EFJVXeLaM6F7JSY6C2y2i76vrAhkPngjKq0TbP+RrbuTUwVwoKV0B9+dv07BeEWwmlI3AGAQLCMwDxtBmBiaOHpedLn9VeuamN6At1NFFdU+h0aOdMr9ZZTsdMB7FsOVHOqMX7NbozM0EFJVXNLVoXslLvgoWvf5sEeSeEzgVlglrMJ6z/GsZ2PB1W0ZQbsICaotJw3saAS6U4BEoTICAszYurNQkcu//LMrZD/zecbde+0shG9IVYE0m9/3maXq2zkMGZzpkOYtly4kwj5N7zOjMzQQYlyVSd1oWs6task3k3BLvPq84FZYJazCeM/0LUXEq1UBiH/QINF14qHb/5O/Y3lBbGXqA69j2kg5ETmOw9KkdNZAe9DyjzA/6AUhG+7oAwgrcYpbu2V0Rc6YvZcqJSwfi9XmdmJuigJKjbT4sZ1XYvOxjk3odRXcynGKtSrzkxj7Wr1JdxvUaBRE2ttF39Cum47d3S+KznaKyZqhAoLEBAWNiFswYF+n/wgIxt17eXVK6rbdfeLPXrLsj9avyn+gdD55HbekJlCqJypHc+Y7SpbDlhlN+6ynVnZoJaYTQHqfbV03Go7OD8G24JtKqoLuYTKMKvCps4dIAVRsOArbBMtZ1UytuqRGUFW19ynbS+6KUimr/4rbALvDzGAgSEMR7cKHZNfcvbc/cd2pted/Y53geU12ivd64Kq5qa53o68OfGD+wRtdpocuHiwMsOo0DdH75n9qGKLSdmkjj/u+7MTNAZvSAzdnO9GbLZwY5g/85EdTGfuZzKfS5t0f6DC9/4Lmm87AqpXbpckg1NkqipkURC73SIch0DeV0iIWr6h/qCV+31Wd3aJrrXBwikHxQSewECwtgPcbQ6OLLpERl+9GfaG916zY1Sv96uSd01HUuyq/5NDfRr8VD1TB4fDPQ2rjAbrvvD98y+1LLlxEwS53/XnZlJda4N1DzpfckR9hFGdlC1OaqL+YThbfrOCdWnBa9+kyx65x9K3epzvQAwEUY3KRMBBAIUICAMEJOiKhfo+9aXKy+kxBJU4NX20ptKfFX4l6sFS9Tm9KOaAkLVI5UhjMqh+8P3TJfs7XoRur12Zvv5PXgB3ZmZoOewJusbgkeZUWL7rd7cwYCzg6qKqC7mM4MnkF91zmMt1OAFr32znPVnn8xUt7QRCRYC4hwCFgo4lLe3UJ8mnSaQ3tcl/d/+6mnndPzS/PyrpOnSy3VUVVIdar6BCjp0HlP9fTqrq6gu3R++ZzY26Nv1ZpbP79ET0J2ZCXoOq7qdL8wje2v+ja8LpQqdQVDQi/kECWL6Vno1B33xO98nBINBjiplIRC+AAFh+MbUUKTAsQfuk4nuQ0VeHdxlLS+8OrjCAi5JZQh1HhNHDuqsrqK60ru2VfT6Sl+sawGOStvJ6/UJ6AxKwpjDmqgK96ahBa+7zcsOLgl8QKZHR2Rst74Vh4NezCdIENO30nf81nul7uxgb2UO0oeyEECgsAABYWEXzmoWUIFg7713aa5Vsss9t77k5drrLbbCIDdtLqbO9J6dxVxmxTUmVqLN77iuBTjy6+SxvQK6MzNhzGFN1oa3srEKBOddH87CXerfD51/u+rWrLf2jWj6VvqWK6+11oaGIYDA7AIEhLPb8IxGgb5v3itjBjI+LS+8RtStmbYeycYmrU3TfctbuZ1Tq9Ga3nhZxwIc5frwOv0CujMzYcxhTdY3ZheyCkOv7bpXSWp5ZxhFi5puMD0yHErZhQq1+XZxk7fSp1acLfVrzytExjkEELBcgIDQ8gFyoXkT3Ye9rSY+q72rNYuXSetV9mYHFYju5alzexFqH4wSK5zyVkNV22SYPJL19Sarp27LBHRnZupC+OBd1dySXcgqDNr5r3htGMVmyxzd9lRoZRcqOLV8VaHTVpwz+aVew0WXedsqzLPCgUYggEBpAgSEpXlxdQgCffffI2M7toZQ8txFNj/3RdlbRue+yuyzupfrHt+/RyYjsLDMlJcN0LUdx2zvAN3B+mzt4LwdArozMylv79SgD7UgSBgLWTVe8jxp2Hhp0M09Wd7IpodPPg77QVVzq9QsWRZ2NWWXr3Me68xGNl78vJmn+B0BBCIiQEAYkYGKazOz2cEv6c8OKs+m57zQetZMJqO1jWrbicm+Hq11llNZZnysnJcF+xqXNlcOVi6WpenOzISVpQrjdsj2W98qKtgM41BzN0effjKMoguWafUKo5oX15kJVH/uhpmn+B0BBCIiQEAYkYGKazNNZQfVAgeNz3qO9ayZ8bT2Nk72dGuvs9QKp8fHS31J4NcnkmyxFThqhAvUmZkJM0sV9Oq56tbWtquuD21k1ZeK6T07Qit/ZsFWrzCqeXGdfJtkQ2Noc0Tz6+ExAgiEI0BAGI4rpRYhYDI7qDZ0Tq08u4hWmr3ExEbx44f2m+10EbXrXEBituYkklWzPcV5xwR0b3sQZpaqZtHSQEdv4evfJmGulpzet0vrgjI2rzCqe3Gd/DeK+iIhjC1F8uvgMQIIhCdAQBieLSWfQcBUdjDbrOyHefszPOn9XWdQDP7pdJe+b9vLbf20d2ur6SPsTbxN94/6ixfQvu1B5xpJ1oWzqFFV2/ziO36GK+vWrJN5N4S3mIyqfvSZLWdoRbBP161eF2yBAZame3Gd/KbXrVoryfqG/FM8RgCBCAkQEEZosOLUVJPZQeU4fmifpPfuspp03AsGR554VHsb0zv1L/BTaicnjh4u9SWBXl/V2uZ9+GkMtEwKi66A7sxMGPP8cvrVLW25hxX/bPeyg2Hv1zmy6RcVt7OUAmpXdJZyudZrdS6uM7NjNmdOZ7aV3xFAwC9AQOg34YwGAaPZQa9/E4cPSN/Xv6Shp+VX0XPPXd5iCU+UX0CZr4zC1hM6N6EuxFi7bKWoJfo5EFACujMzqc61ocFXtbQGsjeryg7Ov+GW0NqpCta9oMyJuZtnhdqncgtXe7OObt1c7ssrfp3NmdOKO0cBCDggQEDowCDb1kXT2cGcR889d0rv176Q+9Wqn0e/+Bk5+oV/MtKmKGw9oXtFx5kDEcam4DPr4PfoCOjOzKg50GEd1W0LpG71uRUX3/4bb/fmlC2uuJy5CtC9oEytt/9gTfuiuZpk7LmJniMyvm+3sfptzpwaQ6FiBCIkQEAYocGKS1NNZwdzjlMDx2T///s9OfiXfyrjB/fmThv9qW4TVe05+Bfvl8ljvUbaYvvWE9PptLeq4E4jNrlKw7xlL1cHP6MhYCIzU93eERpOorraW4H5uRWV33D+RTL/plsrKqOYF+teUKZ+3YbQts8opr9zXTPhLQY2dXxgrktCe87mzGlonaZgBGImUB2z/tAdywVsyQ7mmFTQdejTH5b+790vDRdeKqmzvFsBvTk0idqUJJLhf1+SmZ4WtbWECsLS3qbwI088YuQ20ZxH7qfNW09MDQ3K+AGzAXzQS/Pn3PkZPQHdmRn196l6fnuoUG0vu1n6vnmPqMVyyjk63v5eqVmwsJyXlvQa3QvKNGy8rKT26bx4fG+XzupOq8vmzOlpDeUXBBCYVYCAcFYanghDwJbs4My+qbl6JubrzWyHLb/bvPVExpsrM2l4ldGwF8qw5X1AO84soDszU+t9aVUd4EqghXrYdNkVsuDVb5LD//CxQk/Pea7jN39XFtz0+jmvCepJ3QvK1J9zflBND7ycMYOLgdmcOQ0cmgIRiKkAAWFMB9bGbtmWHbTRyJY2RWHrCZNWyQBXYjTZD+quXEB3ZkbX/NWl7/lAFqf3K58vKlNYd/Y5Mv9Vb5BFXnZQx6F7QRnbN14f2/G0DvaCddicOS3YYE4igIBPgIDQR8KJsARszQ6G1d8ol2vz1hOJVJ2opfEn+/uMESfrw9kDzliHqLhsAd2Zmbq155Xd1lJeqG6bX/a+j0rrVS+X/u98TYYf+7mM7d52cm5zdes8qT2rU+rPOU+anvtiab7iJZJa3llKFRVdq3tBGZs3XlfBsVod2tRhc+bUlAn1IhA1AQLCqI1YRNtLdjBaA5fbeiLpBV+2HVVNLVK7bIXRgDBRXWMbC+0xJKA7M5PyMnE6D3X7qPpfZnIye6t2xgs+1JH9Yqa51ZtvXauzOSfr0r2gjM0br5+Yx9p10kbnA9szpzotqAuBKAsQEEZ59CLUdrKDERosr6m5rSdqFy21ruHJVErUt/UjTz1urm2J8BccMtc5ai5WwERmJuVtfWDiUKuP1oS8mE0p/dK9oIzNG69PHDpgbIVRmzOnpbyfuBYB1wX4VOP6O0BD/8kOakAOuArbt54wve1DIhEwOMVFUkB3ZubE8v7LImkVdKN1Lyhj+m/OXH5pg/sP2pw5ncuM5xBA4HQBAsLTPfgtBAGygyGgaijS5q0nzG/7QESo4S1ofRW6MzO13hw9WzdG1zlYJvZ+NJWZLcY1vfOZYi4L5RqbM6ehdJhCEYipAAFhTAfWlm6RHbRlJEpvh81bT7DtQ+njySuCF9CdmcmuMFrHgkba93705krWLLE3M6t7Hmv+f0k2Z07z28ljBBCYW4CAcG4fnq1QgOxghYAGX27z1hNs+2DwjUHVJwV0Z2bIxpyg1773o8WZWRPzWE/+B+A9sDlzmt9OHiOAwNwCLCoztw/PViBAdrACPAteavPWE2plO7NHxmz1Max9Op2WqaFByaTHsr1LeJmw6tY2SVTZ+8+U7swM2ZgTb3wjez9ampnVPY81/08Pc1rzNXiMQLQF7P2XNtqutN4TIDsY7beBzVtPJA0tdZ8b0QzxYI7i5M/pcS+gGxyQ6dERyUyMS2Z6WiQPKqMeZ6az2xeoa6YH+2Xi6GFJ79kpKtOmfo4f3CeTA8eyZVZ7K1rWnX2uND37+TL/plul/twNJ+uy4YGJzAzZmBMjr33vxzXrbXjLFWyD7nms+Y1gTmu+Bo8RiLYAAWG0x8/a1pMdtHZoim6YzVtPJGoN74/oBTYcIul9XXL8Jz+UoYf+R0a3PSXpvbtl6lcBXaU+alGjIfW/Xzwoxx/8vix+1/uk7WU3V1psYK/XnZkhG3Nq6MjMnrLQPY/1VM0izGnN1+AxAtEWICCM9vhZ23qyg9YOTdENy209YeNehFXeLaNV3u2EUwP9RfcnyAszkxNBFhe5sjJeNvDwP/+V9P37v8nYrm2ht39408PSc9+/SMuLr5VkfUPo9RVTge7MDNmYE6NCZvb0d6fueaz5tTOnNV+DxwhEW4BFZaI9fla2nuyglcNSVqNs3XqiqrlFapetLKtPQbxoenQ0iGIiW8b+j/+xHPyL92sJBnNII15QOLbL3PL6uXbkfurOzJCNOSFPZjb3DjzxU3e2NL925rTma/AYgWgLEBBGe/ysbD3ZQSuHpaxG2br1RDJVl71dqaxOBfAiNf/N1aP/+w9I951/o737an5iZnJSe72zVag7M0M25sRIkJk99Y5Uc3HHdm8/dULzI+a0aganOgRCFCAgDBHXxaLJDsZr1G3eeqJu7XnGsNViKC4emYkJ6b7jr09bLEaXQ7KxSarnteuq7oz16M7M1K1ed8Y2uXABmdlTozzRfSi7GNOpM/oeMadVnzU1IaBDgIBQh7JDdZAdjNdg27z1RN3qc41hqxUxXTxGnnpMjv/0v410vXbZCqnpWGKk7pmVmsjM1K7onNkMJ38nM3tq2NWiTtMjw6dOaHzEnFaN2FSFgAYBAkINyK5UQXYwfiOd23rCxp6pDySmjrEdW01VbbTegR/+h7H668+9QJJ1hleX/VXvdWdmTmRjzjJmb1PFZGZPjYZa2dfUwZxWU/LUi0A4AgSE4bg6WSrZwfgN+/iBPd7ecnbOl6tZslyqWlqNoKtbadVqhy4dU0PH5dgD/26sy03Pe7GxumdWrDszU7t8ldS0L5rZDOd+JzN7+pCrhZZMHcxpNSVPvQiEI0BAGI6rc6WSHYznkKttHSaPD1rZOfUBObVitZG2qVtGJ3uPGqnbVKXDTz4qY9u3GKk+UVMrjRsvNVJ3oUp1Z2bq120QtZCS6weZ2VPvgOn0mIxu3XzqhOZHzGnVDE51CIQsQEAYMrArxZMdjO9I25ohTKZSUn/+RUbg1byd8SMHjdRtqtL+B75iqmqpX3eBpDrXGKt/ZsW6MzMNGy+b2QQnfycze2rYT2y/sfvUCc2PmNOqGZzqEAhZgIAwZGAXiic7GO9Rnurvs7aDTZddYaxtNu2JFzaC+iDe/59fD7uaWctvvfp6azJkJjIz9eecP6uNS0+QmT012hOH9svU8YFTJzQ+Yk6rRmyqQkCTAAGhJug4V0N2MM6jKzJhcSasYcPFkqiuNjIAw4/+zEi9Jio99sB9om7XM3W0vOAaU1X76tWdmUk2NErK4AJKPgCDJ8jMnsIf39t16hfNj5jTqhmc6hDQIEBAqAE5zlWQHYzz6J7om81bLKjbCE0tbnD8we/LpLdZetwPFQj23nuXsW6q7Fj9+guN1T+zYt2ZmdTK1dZstzHTQufvZGZP1x7baW6lY+a0nj4W/IZAHAQICOMwigb7QHbQIL6mqnXv+1VKt6q8zcrr128s5SWBXasC5dGtTwZWnq0F9X3jbhnbtc1Y89que5Wocbbl0J2ZqVu1VpL1DbZ031g7yMyeTq97+4382pnTmq/BYwTiIUBAGI9xNNILsoNG2LVXavNehAqj+Xkv0m6Sq3DwR/+VexjLn+MH98nRf/sno31recl1RuufWbnuzIypDPjMfpv+nczsqRFQW96ov8umDua0mpKnXgTCEzAz+Sa8/lCyRgGbsoMqi9B65XVS27la1IT3RHWNJJLR+74jMz0tmYnx7GIBaq+7ge9/Swa+e7/GUfVXNb5/j0x6C8vULlrqf9KCMw0XXpKdR5iZnNTemv7vfE0Wv+MPpKqpWXvdOio8evcdYvKW4cZLLpcGQyvJzuarOzOTWn3ubE1x6jyZ2VPDfSJb2nXqhMZHzGnViE1VCGgUICDUiB2nqmzJDtadc54s/+DfSfOzX5BJ1NQk4mQs3kbcC27+jUz/D7+d2P22Vxnrmtp2YrKvx9qAMNW5NjuP0MTtm2pfvuEnHpGWy680Nj5hVTz8+C/k6J1/G1bxRZXbfutbJFmbKupaHReZyMz8//buBMiu6ywQ8OlWr1K3drUs2ZJly/LueM1GNspZ2BKTSoYQswyQBAjDQAIMQ5gBEmoYKAaoGYplqkISmJkiThhgJgmBKUgGCgIJSezEsR0by4ss2ZYsybJae2tpzT2v6emWdCS91/3evfed/m6Vql+fvu+e+3//bbv/d+49Z7BYlN4WgpHZmavgxM5nKpth1DOtM3nwikBOAt03hJKTfhfHUofRwZGXvCps/vAnwtJX3BmyKwb/+dooFqPuWfktbwlXfvBPKr1aTu7dXWn/F+q88RxhhaNIcQbO3LZThw6GZ3/134dThw9WFtrQluvD8te+sbL+Ux2XPTIzNb3/palTWXBtRmZnUj6xo7r1B+NEXp5pncmFVwRyEVAQ5pLJEuOow+jgwMYrwuW/9qEwVKPFqjuZgmV3ftvp5d/85k52ccFjHy/WvKrzNvoNd1Z2evs//ceVTrrSicD3/LffDQc+95lOHLrpY6757h8KfavWNL1/GTuWPTIzUCw30b96bRmh1boPI7NnpqfKib6GNl975sn4jgCBLAQUhFmksdwgKh8dLJ4NvPxXfy8MXXl1uYFX2Fvv4GDPsjdUVxDG5xnrvC25+Y5ilHigklOMt9Pu/fhHKum7E52O//Wfh53/+QOdOHTTxxy66tqw4q7vbHr/snYse2QmfuDVOzRcVni17cfI7JmpKXu0dHbvg8Vz+jYCBPITUBDml9OORlSH0cG1xSQeS1/52o7GWceDx+clq9omKlzzqpmY421Mw9fe1MyuHdlnzx/8djh8/5c6cuwyD3rk4a+FHT/3r0Nc863KbfX3vDv0r7mkylNI9l32yIwZRqfSYGR25nKsYrR0pvdQy9/L2efnNQECcxNQEM7NbcG+q+rRwfhA+9j3vntB+g+MrSue3VhSSex1X3qieNYyLH/DXZXYxE4njxwOz/7G+8Op4mu3bhNPbwtP/Zt3hont1T2fFO1iYb/y2++uJWPZIzNmGJ26DIzMzvw6lD1aOtPz1KvepcvObvI9AQIZCCgIM0hiWSGc2LMr7P3DD5bVXbKfNf/yR8LApZcnf5Z7Y9+KVaGq23Wml56os/HoN35zpad34K//Ijz/R79f6TnMtfPju54J23/2R8KRYsbUqrexd7yneG5urOrTOKf/KkZmzDA6lQYjszOXY9mjpTM9T73qHRg6u8n3BAhkIKAgzCCJZYXwwic/Ho499khZ3Z3TT3xmcOWbv+uc9oXSEJ8lirdGVrFNLz1RRd/N9rn4+pvDSLFuXZXbM7/00+Hgl/6+ylNoue/GyOBPvysc+Jv/0/J72/2Gpa/5puJ3vJ6jg2WPzJhhdObqMjI7Y1H2aOlMz9OvTk+/8JUAgYwEFIQZJbOToZx8fk/YU/Ho4Kq3vzP0F7dNLuQtTrZR1VbnpSeiSVyvblWxbl2VW3z27qmffmc4tu3xKk+j6b7jM4NP/PB31KIYjCPg697z87Wd0r7skRkzjE5dxkZmz/x1Lnu09MzeQ7EUzaGzm3xPgEAGAgrCDJJYRgj7P/tnIS7CXdUWC8EVb3xbVd3Xpt/4DGVVW92Xnogucd26uH5dlVv8g237v3t3mNi5o8rTuGjfcTbRJ9715lrcJhpPds0P/FgYefErLnreVe1Q9siMGUanMm1k9swrvuzR0jN7D2HiyXrPOH32+fqeAIHmBBSEzTkt6L3iqMfej/5epQbLv/WtYbBYk2uhb1XOvFj3pSfitRHXrYvr11W9Hfy7z4SnfuodtRwpjIvO7/rdXw1P/OBbK59AZjpPo6+4M6x953umv63l17JHZswwOnUZGJmd+XWYPHokHHty60xDBa/GP/upMHl8YrKCrnVJgEAHBRSEHcTN5dBH7v9yOHzv5ysNZ+Wb6rcmWRUgvUuXV9Fto8+6Lz0xDRPXr6vy1trp84hF4WPf/221eqbw8Fe/WBSCbwnP/Mr7Kl9aYtqpcavoT7w/LKrw2p4+lwt9LXtkxgyjU9kwMjtzVZ7YvTNMPFXt7ejjf/nJsP+zn/a340xavCKQhYBf6izS2Nkg9n3q453t4CJHX3L7y8PiYuFxW/Gc3PDiyhjqvvTENEwcRV1dg1HCeD5xVGnr3a8Nz/3+bxXP3hycPsXSv048sz088+s/H7a+/XXhwOc+U3r/F+pw7F3vDaMvffWFdqn8Z1WMzJhhdCrtRmZnLv+JHdsaS9zMtFTz6skfemvY9xd/aqSwGn69EuiIQF9Hjuqg2QjE/wHt//M/qTSe1d/1gyGuM2cLoae/vzKG6aUnBtaur+wcmu145V13N5ZIqXJW3OlzPT0xEZ7+hR8P43/5iWLSlF8IIy95ZejpLeezuDi6EmcHjrd8T2x/YvqUavM1rh259l0/UZvzOd+JlD0yY4bRmUyUPTI7tLm6ibtmok6/OvroQ+kfVNAai8Jlb7ird9nr3tSY/Tpesz39A6X9t62CkOffZU9Pwyc69S5eEvqWrwg9i/wZPn9YR2iHgCuxHYoZH+OFP/ujEP8YqmqLE4TEiUJsUwJV/s9jeumJbigI+8eKUcLveXd4+gPvrc2lc/Bznw3x34o3vS2setv3hyW3vLT4g2Bl28/v5L694fAD94b9xSf443/1yeL3d1fb+2jHAYevuTGsf9+vNP4wasfxOnmMskdmzDA6lc0qRmYHNm7q5KU0r2Mfuf9L83p/u98cbx+N/2ytC/StXN14tGHkJa9qLKcV/3toI1ClgIKwSv2a9x0Lwec/9uFKzzJOEBInCrFNCfQODFRKUfelJ2bjrPz2uxvX79FHHpjdXPnrFz71RyH+G7hsU1j6qteFxUVhGAuAvuIZup7BweK+4EWhp/gk+ULb6dPFWmCnJ8PpEyeKW8gOhbgszMSTj4ZD9/5jOPbI12o5Gjg7nvjp+Pqf+eUwXPGMsLPP6UKvyx6ZMcPoVDaqGZm97EKXQmU/i5O7HX3kwcr613F7BeIHd4e++LnGv/i8+SU/+r6w/Fve0t5OHI1ACwIKwhawFtqu+z7xsXDsiUcrCzsuRB9HU2wzAr3DS8KiZcvDqfH9M40lvuqGpSemOfpXj4Wxd7wnPPVv3zXdVKuvx5/eFvbe86EQ4r8FtsX1Bpe//k1dE3XZIzNmGJ26NMofmb0i9K9eW8vrcmr5jSdreW5Oan4Ch4uR373Fh++jr359WLRkdH4H824CcxQo50GWOZ6ct1UnEG8z2/vRD1Z3AkXPFqI/l3/R6NIwcOnl5/6gpJZuWHpiNsXKN98dlr7mm2Y3eV2xwMq73h7Gar7ExGyiKkZm6vwc22ybTr8ue2R2+Noba/u8+omdT4dTB8c7Te74FQkcuvcfwtGHvlpR77olUNycBIFASmDfJ+8JVU7IYSH6VFaKX9hicp14O1lVW7csPTHtE2dlXffenw/xeQ1b9QIjL35luPTnfq22f3SnhKoYmanzc2wpo061lT0yu/jmF3cqlHkf9/j2bfM+hgPUVyDe9XNy/776nqAzy15AQZh9ilsPsDE6+IfVjg5aiP78eatyfbJuWXpitt7IHa8oRqTqM7nM7HNbSK8Xv+iOsPE//k4YWFfPZ7TOl4uyR2amZhjtLqPz2c2nvYqR2eGrb5jPKXf0vccef6Sjx3fw6gXi7KM2AlUJKAirkq9xv1WPDkYaC9Gf/wIZvHzz+X/Y4Z9MLz3R4W7afvi1xVp3cYkDWzUCi2+8LWz8pd8Jw9e9qJoTmEevZY/MDGyo73Ns82Bs+a1lj8zGiY4GN2xq+TzLekPZy2+UFZd+ZgT6Vqya+cYrAiULKAhLBq97d3UYHbQQ/YWvkrjwelXb9NITVfU/134bs1oWSxyY2nuugnN/XywGN/zSb4clt75k7gep8J1lj8zU+Tm2MtNQ9shs/KAtPqpQx23y2NEQ786w5SsQJ4vrW1PPCY3yVRfZbAEF4WwNr0MdRgctRH/hC7G3WJ6gyq2blp6Y7RSXOIhLHcTi0FaOwFQx+Fth5PaXl9NhB3ope2Smzs+xdYD3vIcse2R26IotIT5zXMdtarR0Wx1PzTm1SSBOFte/aqxNR3MYAq0LKAhbN8v2HXUYHbQQ/cUvr6oLmm5aeuJszbjUQVzywNZ5gemRwZHbv6HznXWohypGZur8HFuHmJOHLXtkts5LfZzY+YwZRpNXST6N1h7NJ5fdGomCsFsz14HzrsPooIXoL57Yqhen77alJ84WjUsexKUPbJ0TaEwg88v/tatHBqNO2SMzdX+OrXNXzLlHLntktsrJus6N/syWiR3WHzxTJL/v6vyBRH7aIkoJKAhTKguwrRajgxaib+rK6xkYamq/Tu3UbUtPnO0Ql+6ISx/EJRBs7ReIrpt+/cNd+8zgbJGyR2bq/BzbbJdOv65iZHawmMynrtvE4/9U11NzXm0SsPZomyAdZs4CCsI50+X1xjqMDlqIvrlralHxDFx8AL2qrRuXnjjbKi59EJdAiCNZtvYJrHzzd4UrfueerpxNNKVQ9shMnZ9jS/l0qq3skdmppT4u7VQ48z5u2aOl8z5hB2hZwNqjLZN5Q5sFFIRtBu3Gw9VhdNBC9M1fOYtGl4b4AHpV2/FnngpxttFu3+ISCI2i8Kbbuj2Uys8/Tpe+4QP/JVz+Gx/punUGL4RX9siM28amslH2yOxAsdxE/+p6zvBYxWjphX4n/Kz9AtYebb+pI7YuoCBs3Sy7d9RhdNBC9M1fVvGWx/gAelXbqfH94eTBA1V139Z+l9zykrCxeNbNSOHcWUdfcWfY/JFPhvhsZu/A4NwPVMN3lj0yU+fn2MpMT+kjs8V/T3uHhssMsem+yh4tbfrE7Ng2AWuPto3SgeYhoCCcB14Ob63D6GB0tBB9a1fT4OZrW3tDm/fOYYRwmiQWhfGZN88UTos097Vv+cqw7ic/EDZ/8E/DyB3dO5Po+aKtYmSmzs+xnc+pE+1GZmdUyx4tnenZq7IErD1alrR+LiSgILyQzgL4WR1GBy1E3/qFNljhCGE821P797V+0jV+R7x9ND77Fp+Bs11cII4KXvmh/xXW/8T7w6Klyy7+hi7co+yRmbo/x1ZmCo3MzmiXPVo607NXZQlYe7Qsaf1cSKDvQj/0s7wF6jI6aCH61q+zOClKlVu8dnLboml8Bi6OGO78zf8QTr7wfG4hzjue+Kzgmh/4sbC2uD100dLqJjaadyBNHODEc8+Wuvab28amkmJk9syLs+zR0jN7910ZAtYeLUNZHxcTMEJ4MaGMf77vkx8Lxx57pNIIh66+Pix/3RsrPYdu7Lxv9Vilp33i2e2V9t+pzuMzcPFZuPhMXBwFs80ILH3NN4XNH/7EP48K5l0MxqiP73x6JvgSXg1duaW2z7GVEP7/7+LE87tDnLiqrC2OcPevM8NoWd76OVOgd8lIcKv4mSa+q0ZAQViNe+W9nnh+T3j+ng9Vfh5rvvuHQ9/KNZWfR7edQP+qNSGO1lS1Hd/1TFVdl9JvfCYuPhu3/qd+sVLnUoK9SCfD194ULv9PHwqbf694VvDFr7jI3vn8+MSuZ0sNJjrbQji557kQJ64qa2us/bjmkrK6a6mfOFo68dTjLb3Hzt0lMLRpS+hfu667TtrZZimgIMwyrRcPavwzfxaOPvrQxXfs4B7D198cVnz72zvYQ76H7lu5OgxtvqayACePHK6s77I6jiMH6977C41RsTg6ttC2OHq/4Rd/M2z52GfC6rvfGXqHFy8ogrInThq+4dYF5Xu+YMu+VTverhdnbq7jdnLf3tJHquvokPM5NSaUqekMtzm7i+1cAc8QnmuyIFoO/N9PVx7n2ne8J/SvqvbWx8oR5ngCPX39YcmtLwuHvvwPczzC/N5W1yna5xdV+t1xVCyOju373/eE3R/5zXD0kQfSO2bSGid5is/1xlu5F/LofU9fef97HFi/IRghnPoFOn3ieKm/SSMvfXWp/bXSWfxQYvLwoVbeYt8uE6jz9ddllE53ngLl/R9vnifq7e0TiLehnNi7u30HnMOR4myOK9/6vXN4p7dMCyz/lreEfZ+4J5zYvXO6qbSvQ1deXVpfdegojo7FUbJlr39Tw3zvRz8Yjj369TqcWlvOob+YUGdFcT2teON3NNZkrOuISVuCbfIgZU7cNPoNd4bByy5v8szy3i0uZ7Jo2fJSbhsdKpbvGX3la+sL2ruoMYvv5J5j9T1HZzZngdpff3OOzBu7UcAto92YtXmecxzd6V+7fp5Hmfvbl73uTeHSn/nlUOYn8HM/2/q+M45crfqO7y/9BBffdHtYeue3ld5vHTrsLybziTNsXv3xv24saD9ye/euv9e7eEkYffk3hst/7UPh2k98vnF7aFyLUTE4daVFm5E7Ov/M5JKbXxzG3vHjdbi8a3EOwzfcEsr6vVr5lu+u9YQegxuvCJYkqMVl2ZGTqPv115GgHbS2AkYIa5uazp7Y8jfcFY48eF+YeHJrZzuadfQ4CcqKu94eLvnR94UyP32fdQrZvVz/k+9vxPT8//yDUkYKh6+7uZiF88fDcPF82ULeYmG45nvfXRTk3xcO3fv5MP5XnwqHvvh3jdtJy77lrdk8xA9ghq66LiwunlWLM6guufWlYfCKLaFn0aJmD7Gg9hu4bFNY833/KkwePRyOPPTVtsfe0z8Qlr/+rjD2rveExTfd1vbjd+sBFy0ZDavf/s5wspj47PD9X+pIGPED0VVv+4Hi/0U/25Hjt+ug8cPb1cV5xol2OmXRrnN1nOYFuuX6az4ie+Yg0HO62OoWyGNbHwtf+MI/lnZaL3vZS8NVW64qrb+6dDT+2U+H5//4v4fD930hHO/QMgKxCBy68pqwuPjjc/k3vzmM1vh5jbrkZS7ncehLfx/2/8WfhsNf+UI49vg/tXUNvakJbK4NIy95ZTEJ0N1hcbGIu+1cgcb6aU88Go7c/+Vw8PN/E44+fH+xrMvD4fTJk+fuXELLdAEYi/jRl7+muBX09jBYzGi3qJjm3Na8wNGHv9a4TfjQFz9X/G49EuJEH3Pd4n8PYxG++EV3hGV3fmtYFicr6nWjTsrz6D89WDy3+9HGBy1xeaT5uMfjN/5fVEzEtaQY9V3xrf+i+EDkJalua9k2ZXFPYfG3jaWi5mtRyyAzP6luvv4yT8054ZVRg9Sx7lAQFpdCHRNzzhXawYaT+/eFU4cOhtPHJ8LpyckQ5vsZQU9P6Cn+yImfgMfb0vqWrXB7aAfzN/vQsfg4Of5CiLOAxpGqOefz7BwuL3K4yA0Fs60v9vpUMRnExLbHGiPxsWCBUzUDAAAkwklEQVQ/WowyTWx/PJw6MH6xt87p53FW1MGNm0PjlrviduLFN95WFIBXKQDnpHnum06fKn639s/hd+vs36Xi+bg4KZStOYE5u8fDn2Pf3f8vmpdFc9z2aqdAZtdfO2nqfKyFWhD6C6/OV2VJ5xYf4o//bN0vEEeF4hqFIf6zVSoQR+IWF89DxX+rv/MdYXJiopjM6blwYueOcHzHtsZI7rGtXw/Htj1eLMS9relJNOKEGwOXbgpDmzaHoS3XN5YfGdiwqVhce0PoX722eAZwsNK4c+08fiDid6v87HKfMWcxY+EVAQLtFVAQttfT0QgQIJAUiIXa4KUbG//CrMlKJieOhVMHDxTPqh05/6ju7E+aixlPF40uNflLUlkjAQIECBAg0KqAgrBVMfsTIECgjQJxVk8ze7YR1KEIECBAgACBlgQ8zd4Sl50JECBAgAABAgQIECCQj4CCMJ9cioQAAQIECBAgQIAAAQItCSgIW+KyMwECBAgQIECAAAECBPIRUBDmk0uRECBAgAABAgQIECBAoCUBBWFLXHYmQIAAAQIECBAgQIBAPgIKwnxyKRICBAgQIECAAAECBAi0JKAgbInLzgQIECBAgAABAgQIEMhHQEGYTy5FQoAAAQIECBAgQIAAgZYEFIQtcdmZAAECBAgQIECAAAEC+QgoCPPJpUgIECBAgAABAgQIECDQkoCCsCUuOxMgQIAAAQIECBAgQCAfAQVhPrkUCQECBAgQIECAAAECBFoSUBC2xGVnAgQIECBAgAABAgQI5COgIMwnlyIhQIAAAQIECBAgQIBASwIKwpa47EyAAAECBAgQIECAAIF8BBSE+eRSJAQIECBAgAABAgQIEGhJQEHYEpedCRAgQIAAAQIECBAgkI+AgjCfXIqEAAECBAgQIECAAAECLQkoCFvisjMBAgQIECBAgAABAgTyEVAQ5pNLkRAgQIAAAQIECBAgQKAlAQVhS1x2JkCAAAECBAgQIEAgR4HTOQbVREz1LAh7epo4dbsQIECAAAECBAgQIECgTQKnF2ZJWMuCsLe33NNamKlv0y+OwxAgQIAAAQIECBDIQGDy9GQGUbQeQrmVV5Pn19/f1+SebdptgX4a0CY9hyFAgAABAgQIECDQ9QInT5zs+hjmEkAtC8Lh4eEwMDAwl3jm9J6F+mnAnLC8iQABAgQIECBAgECGAkePHcswqouHVMuCcHR0NCxZsuTiZ9+mPRbqpwFt4nMYAgQIECBAgAABAl0vcOjgoa6PYS4B1LIgHBwcDEuXjs4lnjm9Z6F+GjAnLG8iQIAAAQIECBAgkJnAgQMHwv7x/ZlF1Vw4tSwI46nHUcKytoX6aUBZvvohQIAAAQIECBAgUGeBPXv2hIVaE9S2IBwpsSDcv39/GB8fr/M16twIECBAgAABAgQIEOiQwJ7dezp05PoftrYFYRwh7OsrZ7bRQ4cOhd0L+CKo/2XqDAkQIECAAAECBAh0RiDWAnv27O3MwbvgqLUtCJctW1rqbaPP7drVBelyigQIECBAgAABAgQItFNg167nFvTdgrUtCIeGhsJoiRPL7Ny5K+wq/tkIECBAgAABAgQIEFg4AqXWAD09tYOtbUEYpZaW+BzhxMRE2LZtW+0S5IQIECBAgAABAgQIEOiMQCwGd+7c2ZmDJ47a21u/8qt+ZzQLrsyZRmO327Y9pSic5e8lAQIECBAgQIAAgZwF4oBQHBgqa+vvL2eOlFbiqXdBWNwy2t/f30o889r35MmTYeujj4XDhw/P6zjeTIAAAQIECBAgQIBAvQViMRgHhMraBgYGwvDwcFndNd1PrQvCFStWhDi5TJnbc889Fx5++JEyu9QXAQIECBAgQIAAAQIlCsQBoDgQFAeEytpGRkZKnTSz2bhqXRDG0cGVK1c1G0vb9tv66NbwaPHPRoAAAQIECBAgQIBAfgJxACgOBJW5xYGuwcHBMrtsqq9aF4QxgrG1a5oKpJ07nTp1Knz9oa+H7dt3tPOwjkWAAAECBAgQIECAQMUCceAnDgCVvS0v7n6s41b7gnDdunVhzZryi8K4QOXX7v9aeObpZ+qYN+dEgAABAgQIECBAgECLAtuf2t4Y+IkDQGVufX19YdWqlWV22XRftS8I47Dq+kvXNx1QO3fcv39/+MpXvmqksJ2ojkWAAAECBAgQIECgAoFYDN5fDPjEgZ+yt9WrVxeDXGNld9tUf7UvCGMUGzduKCaXWdZUQO3eKRaF9917n2cK2w3reAQIECBAgAABAgRKEoi3id5331fC+Ph4ST2e2c0l6y4JixbVs/Sq30IYZ9o1vovF4IaiKBx/oJoExk8R7v3yveHggQPh2uuuDUuWLEmcpSYCBAgQIECAAAECBOokEGcTjRPIxGcGy75NdNqhUctsuGz629p97YqCMKptuvzy4tbN7eHA+IFKEOMFFC+mffteCFuu3hI2bbq8kvPQKQECBAgQIECAAAECFxeIawzGQrDs2UTPPrM4sFXV3Y5nn0vq+64pCJevWB42btgQHhx/KBVHaW3xgtq3b1/YXXy9cvOVId4PbCNAgAABAgQIECBAoB4Ce/fuDU88/kR48slt4cSJE5WeVFxqou4DSV1TEMZMbtq0KezYsaO497eaUcLpqyleWPE+5Gef3dm4lTUWqmvGyp8Jdfp8fCVAgAABAgQIECCw0AX27N4Tthe1wo5i6bgqJo5J+W/YuDEsX7489aPatPWcLrbanE0TJ/LVr94fHnzgwSb2LG+X4eHhsPaSteGStWuLwnCsGBJeWl7neiJAgAABAgQIECCwQAXiQNGe3bvDruLuved2PReOHj1aG4lYCL7q1a+s9e2iEavrCsI4M9Df/e3nQpz9s47byMhI41OA0dGRMDQ0FPr6+0JvTzGjUE9P6KnjCed+ToX7ot7e0D/QX0wGNBJWFLce2wgQIECAAAECzQq88ML+cPjwoXDi+IlwanIyhO4aS2k2zNrv1xjBKuwnT0+GkydOhmPHjoWDBw81aoK6jAaejXjrrbeEG2684ezm2n3fVbeMRr34QOYVV2xqrA8Yv6/bFi/Iul6UdbMq+3wWL15cPPO5qrjNd2PjGiq7f/0RIECAAAEC3SMQnz/bUUxouHfv8+HIkSPdc+LOtBYC69evC1dtuaoW53Kxk+i6gjAGFHHj5C7xGT4bgWYF4n/Mt28/EnYVtxMcOngw3PSim5p9q/0IECBAgACBBSTwwNceaMwuf/z48QUUtVDbJTA4OBi2bNkS4tdu2Oq5OuJF5BrIxdIP3YJ8kXD8uGSB+B/3uIRI/OTPRoAAAQIECBCYLRD/Poh/JygGZ6t43YrA5qs2NyaebOU9Ve7blQVhBNtQzOy5pUuGYatMsL7TAvE/8vE2EBsBAgQIECBAYLZA/PtAMThbxOtWBC655JJw7bXXtPKWyvft2oIwyl13/XVdVX1Xnm0ncIZAfCYgPihuI0CAAAECBAhEgfh3Qfz7wEZgLgLx7sWrr9kS4rwV3bR1dUEY0W8sZu6xOHw3XXL1Odf4TGGcNcxGgAABAgQIEIgC8e8CE8i4FuYqEO9e3FhMXthtW1cXhBF71apV4cabbgyjo6PdZu98ayAQp5C2ESBAgAABAgSigL8LXAdzFdi4cUO4/vrr5/r2St/X9QVh1LvsskvD9TdcFxYtWlQpps67T6CxnlD3nbYzJkCAAAECBDog4O+CDqAugEOOja0p7lq8MQwMDnRltFkUhFE+Tu16zTXd9QBnV14xuZ20xWVzy6h4CBAgQIDA3AX8XTB3uwX6zlWrVoYX3fyisLL42q1bNgVhTMANN15vkpluvRKdNwECBAgQIECAAIEuEli5cmW4+ZZbQpxZtJu3rArCOMnMTcXzhGNrx7o5J86dAAECBAgQIECAAIEaC8Ri8JZbbw7r16+r8Vk2d2pZFYQx5EZybrlZUdhc/u1FgAABAgQIECBAgEALAjPF4PoW3lXfXbMrCCP12NhYuOOO290+Wt/rzpkRIECAAAECBAgQ6DqB+MzgLbfeUowM5lEMxgRkWRDGwGLl/rKXvbQx/avZR6OIjQABAgQIECBAgACBuQrE2URvve3WLG4TnW3QN/ub3F7HZwpvu/3WMLp0JHz9oYfDwYMHcwtRPAQIECBAgAABAgQIdFhgQ7HOYFxaIo4Q5rZlXRBOJysuSTE8vDg8+MCDYe/evdPNvhIgQIAAAQIECBAgQOC8An19feHqa64ON9xwfYiDTTluC6IgjImLi9cPDw+FBx98KOzYviPHXIqJAAECBAgQIECAAIE2CSxfvjxcd921YfNVm9t0xHoeZsEUhJF/1apVjecKly1dGrZufSxMTEzUMyvOqjyBnp7y+tITAQIECBAgUG8BfxfUOz8lnt3G4hbR6667LqwpnhvMfVtQBWFMZhzqjTMDxeJw69at4dlnd+aeY/FdQGBRb7bzKl0gaj8iQIAAAQIEUgL+LkipLKy2FStWhCuu2NS4TTTeLroQtoURZSKT8cHQuID9Y8VI4ZNPbgv79+9P7KUpd4GBgYHcQxQfAQIECBAg0KSAvwuahMpwt2XLlhZL1m1sFIPLli3LMMLzh7RgC8JIEkcLb7jxhnDZhssaReGO7dvD+PiB82v5SVYCIyMjYWR0JKuYBEOAAAECBAjMXSD+XRD/Pjh06NDcD+KdXSWwtCgEN27YEDZdsSnEZwYX4ragC8LphMdPAW655eawadPlYdu2pxqTzoyPj0//2NdMBdYWI8QL7ROgTFMpLAIECBAg0BaB+HdB/PtAQdgWzlofJOY63jEY//5fqIXgdIJ6Thfb9De+TgnEYnDHjqfDrp27GstUnDx5Ek1mAqtXrw63FQuLxtuGbQQIECBAgACBaYHdz+0O9933FUuVTYNk9nXNmjVh/aXrQ5w0xsDAVHIVhBe4yE+dmgx79uwOzz+/L+x/4YXG7aTxE6Pjx49f4F1+VGeBeCvI2rGxsHnzZsVgnRPl3AgQIECAQIUCsSh8/PHHw3O7d4dDB90+WmEq5t11fERsdHQ0rCwWlB8rZgxdt25dtusJzhVLQdiC3PGJ4+HAwQPh6NFj4cSJE2FycjIEA6wtCFa0azGFdJw1LD4oHgtCnwZVlAfdEiBAgACBLhOId43FgjAOBpzyd1/3ZK/426+3+Nuvv78/LF48HJYWS87F17a0gIIw7aKVAAECBAgQIECAAAEC2QtYhC37FAuQAAECBAgQIECAAAECaQEFYdpFKwECBAgQIECAAAECBLIXUBBmn2IBEiBAgAABAgQIECBAIC2gIEy7aCVAgAABAgQIECBAgED2AgrC7FMsQAIECBAgQIAAAQIECKQFFIRpF60ECBAgQIAAAQIECBDIXkBBmH2KBUiAAAECBAgQIECAAIG0gIIw7aKVAAECBAgQIECAAAEC2QsoCLNPsQAJECBAgAABAgQIECCQFlAQpl20EiBAgAABAgQIECBAIHsBBWH2KRYgAQIECBAgQIAAAQIE0gIKwrSLVgIECBAgQIAAAQIECGQvoCDMPsUCJECAAAECBAgQIECAQFpAQZh20UqAAAECBAgQIECAAIHsBRSE2adYgAQIECBAgAABAgQIEEgLKAjTLloJECBAgAABAgQIECCQvYCCMPsUC5AAAQIECBAgQIAAAQJpAQVh2kUrAQIECBAgQIAAAQIEshdQEGafYgESIECAAAECBAgQIEAgLaAgTLtoJUCAAAECBAgQIECAQPYCCsLsUyxAAgQIECBAgAABAgQIpAUUhGkXrQQIECBAgAABAgQIEMheQEGYfYoFSIAAAQIECBAgQIAAgbSAgjDtopUAAQIECBAgQIAAAQLZCygIs0+xAAkQIECAAAECBAgQIJAWUBCmXbQSIECAAAECBAgQIEAgewEFYfYpFiABAgQIECBAgAABAgTSAgrCtItWAgQIECBAgAABAgQIZC+gIMw+xQIkQIAAAQIECBAgQIBAWkBBmHbRSoAAAQIECBAgQIAAgewFFITZp1iABAgQIECAAAECBAgQSAsoCNMuWgkQIECAAAECBAgQIJC9gIIw+xQLkAABAgQIECBAgAABAmkBBWHaRSsBAgQIECBAgAABAgSyF1AQZp9iARIgQIAAAQIECBAgQCAtoCBMu2glQIAAAQIECBAgQIBA9gIKwuxTLEACBAgQIECAAAECBAikBRSEaRetBAgQIECAAAECBAgQyF5AQZh9igVIgAABAgQIECBAgACBtICCMO2ilQABAgQIECBAgAABAtkLKAizT7EACRAgQIAAAQIECBAgkBZQEKZdtBIgQIAAAQIECBAgQCB7AQVh9ikWIAECBAgQIECAAAECBNICCsK0i1YCBAgQIECAAAECBAhkL6AgzD7FAiRAgAABAgQIECBAgEBaQEGYdtFKgAABAgQIECBAgACB7AUUhNmnWIAECBAgQIAAAQIECBBICygI0y5aCRAgQIAAAQIECBAgkL2AgjD7FAuQAAECBAgQIECAAAECaQEFYdpFKwECBAgQIECAAAECBLIXUBBmn2IBEiBAgAABAgQIECBAIC2gIEy7aCVAgAABAgQIECBAgED2AgrC7FMsQAIECBAgQIAAAQIECKQFFIRpF60ECBAgQIAAAQIECBDIXkBBmH2KBUiAAAECBAgQIECAAIG0gIIw7aKVAAECBAgQIECAAAEC2QsoCLNPsQAJECBAgAABAgQIECCQFlAQpl20EiBAgAABAgQIECBAIHsBBWH2KRYgAQIECBAgQIAAAQIE0gIKwrSLVgIECBAgQIAAAQIECGQvoCDMPsUCJECAAAECBAgQIECAQFpAQZh20UqAAAECBAgQIECAAIHsBRSE2adYgAQIECBAgAABAgQIEEgLKAjTLloJECBAgAABAgQIECCQvYCCMPsUC5AAAQIECBAgQIAAAQJpAQVh2kUrAQIECBAgQIAAAQIEshdQEGafYgESIECAAAECBAgQIEAgLaAgTLtoJUCAAAECBAgQIECAQPYCCsLsUyxAAgQIECBAgAABAgQIpAUUhGkXrQQIECBAgAABAgQIEMheQEGYfYoFSIAAAQIECBAgQIAAgbSAgjDtopUAAQIECBAgQIAAAQLZCygIs0+xAAkQIECAAAECBAgQIJAWUBCmXbQSIECAAAECBAgQIEAgewEFYfYpFiABAgQIECBAgAABAgTSAgrCtItWAgQIECBAgAABAgQIZC+gIMw+xQIkQIAAAQIECBAgQIBAWkBBmHbRSoAAAQIECBAgQIAAgewFFITZp1iABAgQIECAAAECBAgQSAsoCNMuWgkQIECAAAECBAgQIJC9gIIw+xQLkAABAgQIECBAgAABAmkBBWHaRSsBAgQIECBAgAABAgSyF1AQZp9iARIgQIAAAQIECBAgQCAtoCBMu2glQIAAAQIECBAgQIBA9gIKwuxTLEACBAgQIECAAAECBAikBRSEaRetBAgQIECAAAECBAgQyF5AQZh9igVIgAABAgQIECBAgACBtICCMO2ilQABAgQIECBAgAABAtkLKAizT7EACRAgQIAAAQIECBAgkBZQEKZdtBIgQIAAAQIECBAgQCB7AQVh9ikWIAECBAgQIECAAAECBNICCsK0i1YCBAgQIECAAAECBAhkL6AgzD7FAiRAgAABAgQIECBAgEBaQEGYdtFKgAABAgQIECBAgACB7AUUhNmnWIAECBAgQIAAAQIECBBICygI0y5aCRAgQIAAAQIECBAgkL2AgjD7FAuQAAECBAgQIECAAAECaQEFYdpFKwECBAgQIECAAAECBLIXUBBmn2IBEiBAgAABAgQIECBAIC2gIEy7aCVAgAABAgQIECBAgED2AgrC7FMsQAIECBAgQIAAAQIECKQFFIRpF60ECBAgQIAAAQIECBDIXkBBmH2KBUiAAAECBAgQIECAAIG0gIIw7aKVAAECBAgQIECAAAEC2QsoCLNPsQAJECBAgAABAgQIECCQFlAQpl20EiBAgAABAgQIECBAIHsBBWH2KRYgAQIECBAgQIAAAQIE0gIKwrSLVgIECBAgQIAAAQIECGQvoCDMPsUCJECAAAECBAgQIECAQFpAQZh20UqAAAECBAgQIECAAIHsBRSE2adYgAQIECBAgAABAgQIEEgLKAjTLloJECBAgAABAgQIECCQvYCCMPsUC5AAAQIECBAgQIAAAQJpAQVh2kUrAQIECBAgQIAAAQIEshdQEGafYgESIECAAAECBAgQIEAgLaAgTLtoJUCAAAECBAgQIECAQPYCCsLsUyxAAgQIECBAgAABAgQIpAUUhGkXrQQIECBAgAABAgQIEMheQEGYfYoFSIAAAQIECBAgQIAAgbSAgjDtopUAAQIECBAgQIAAAQLZCygIs0+xAAkQIECAAAECBAgQIJAWUBCmXbQSIECAAAECBAgQIEAgewEFYfYpFiABAgQIECBAgAABAgTSAgrCtItWAgQIECBAgAABAgQIZC+gIMw+xQIkQIAAAQIECBAgQIBAWkBBmHbRSoAAAQIECBAgQIAAgewFFITZp1iABAgQIECAAAECBAgQSAsoCNMuWgkQIECAAAECBAgQIJC9gIIw+xQLkAABAgQIECBAgAABAmkBBWHaRSsBAgQIECBAgAABAgSyF1AQZp9iARIgQIAAAQIECBAgQCAtoCBMu2glQIAAAQIECBAgQIBA9gIKwuxTLEACBAgQIECAAAECBAikBRSEaRetBAgQIECAAAECBAgQyF5AQZh9igVIgAABAgQIECBAgACBtICCMO2ilQABAgQIECBAgAABAtkLKAizT7EACRAgQIAAAQIECBAgkBZQEKZdtBIgQIAAAQIECBAgQCB7AQVh9ikWIAECBAgQIECAAAECBNICCsK0i1YCBAgQIECAAAECBAhkL6AgzD7FAiRAgAABAgQIECBAgEBaQEGYdtFKgAABAgQIECBAgACB7AUUhNmnWIAECBAgQIAAAQIECBBICygI0y5aCRAgQIAAAQIECBAgkL2AgjD7FAuQAAECBAgQIECAAAECaQEFYdpFKwECBAgQIECAAAECBLIXUBBmn2IBEiBAgAABAgQIECBAIC2gIEy7aCVAgAABAgQIECBAgED2AgrC7FMsQAIECBAgQIAAAQIECKQFFIRpF60ECBAgQIAAAQIECBDIXkBBmH2KBUiAAAECBAgQIECAAIG0gIIw7aKVAAECBAgQIECAAAEC2QsoCLNPsQAJECBAgAABAgQIECCQFlAQpl20EiBAgAABAgQIECBAIHsBBWH2KRYgAQIECBAgQIAAAQIE0gIKwrSLVgIECBAgQIAAAQIECGQvoCDMPsUCJECAAAECBAgQIECAQFpAQZh20UqAAAECBAgQIECAAIHsBRSE2adYgAQIECBAgAABAgQIEEgLKAjTLloJECBAgAABAgQIECCQvYCCMPsUC5AAAQIECBAgQIAAAQJpAQVh2kUrAQIECBAgQIAAAQIEshdQEGafYgESIECAAAECBAgQIEAgLaAgTLtoJUCAAAECBAgQIECAQPYCCsLsUyxAAgQIECBAgAABAgQIpAUUhGkXrQQIECBAgAABAgQIEMheQEGYfYoFSIAAAQIECBAgQIAAgbSAgjDtopUAAQIECBAgQIAAAQLZCygIs0+xAAkQIECAAAECBAgQIJAWUBCmXbQSIECAAAECBAgQIEAgewEFYfYpFiABAgQIECBAgAABAgTSAgrCtItWAgQIECBAgAABAgQIZC+gIMw+xQIkQIAAAQIECBAgQIBAWkBBmHbRSoAAAQIECBAgQIAAgewFFITZp1iABAgQIECAAAECBAgQSAsoCNMuWgkQIECAAAECBAgQIJC9gIIw+xQLkAABAgQIECBAgAABAmkBBWHaRSsBAgQIECBAgAABAgSyF1AQZp9iARIgQIAAAQIECBAgQCAtoCBMu2glQIAAAQIECBAgQIBA9gIKwuxTLEACBAgQIECAAAECBAikBRSEaRetBAgQIECAAAECBAgQyF5AQZh9igVIgAABAgQIECBAgACBtICCMO2ilQABAgQIECBAgAABAtkLKAizT7EACRAgQIAAAQIECBAgkBZQEKZdtBIgQIAAAQIECBAgQCB7AQVh9ikWIAECBAgQIECAAAECBNICCsK0i1YCBAgQIECAAAECBAhkL6AgzD7FAiRAgAABAgQIECBAgEBaQEGYdtFKgAABAgQIECBAgACB7AUUhNmnWIAECBAgQIAAAQIECBBICygI0y5aCRAgQIAAAQIECBAgkL2AgjD7FAuQAAECBAgQIECAAAECaQEFYdpFKwECBAgQIECAAAECBLIXUBBmn2IBEiBAgAABAgQIECBAIC2gIEy7aCVAgAABAgQIECBAgED2AgrC7FMsQAIECBAgQIAAAQIECKQFFIRpF60ECBAgQIAAAQIECBDIXkBBmH2KBUiAAAECBAgQIECAAIG0gIIw7aKVAAECBAgQIECAAAEC2QsoCLNPsQAJECBAgAABAgQIECCQFlAQpl20EiBAgAABAgQIECBAIHsBBWH2KRYgAQIECBAgQIAAAQIE0gIKwrSLVgIECBAgQIAAAQIECGQvoCDMPsUCJECAAAECBAgQIECAQFpAQZh20UqAAAECBAgQIECAAIHsBRSE2adYgAQIECBAgAABAgQIEEgLKAjTLloJECBAgAABAgQIECCQvYCCMPsUC5AAAQIECBAgQIAAAQJpAQVh2kUrAQIECBAgQIAAAQIEshdQEGafYgESIECAAAECBAgQIEAgLaAgTLtoJUCAAAECBAgQIECAQPYCCsLsUyxAAgQIECBAgAABAgQIpAUUhGkXrQQIECBAgAABAgQIEMheQEGYfYoFSIAAAQIECBAgQIAAgbSAgjDtopUAAQIECBAgQIAAAQLZCygIs0+xAAkQIECAAAECBAgQIJAWUBCmXbQSIECAAAECBAgQIEAgewEFYfYpFiABAgQIECBAgAABAgTSAgrCtItWAgQIECBAgAABAgQIZC+gIMw+xQIkQIAAAQIECBAgQIBAWkBBmHbRSoAAAQIECBAgQIAAgewFFITZp1iABAgQIECAAAECBAgQSAsoCNMuWgkQIECAAAECBAgQIJC9gIIw+xQLkAABAgQIECBAgAABAmkBBWHaRSsBAgQIECBAgAABAgSyF1AQZp9iARIgQIAAAQIECBAgQCAtoCBMu2glQIAAAQIECBAgQIBA9gIKwuxTLEACBAgQIECAAAECBAikBRSEaRetBAgQIECAAAECBAgQyF5AQZh9igVIgAABAgQIECBAgACBtICCMO2ilQABAgQIECBAgAABAtkLKAizT7EACRAgQIAAAQIECBAgkBZQEKZdtBIgQIAAAQIECBAgQCB7AQVh9ikWIAECBAgQIECAAAECBNICCsK0i1YCBAgQIECAAAECBAhkL6AgzD7FAiRAgAABAgQIECBAgEBaQEGYdtFKgAABAgQIECBAgACB7AUUhNmnWIAECBAgQIAAAQIECBBICygI0y5aCRAgQIAAAQIECBAgkL2AgjD7FAuQAAECBAgQIECAAAECaQEFYdpFKwECBAgQIECAAAECBLIXUBBmn2IBEiBAgAABAgQIECBAIC2gIEy7aCVAgAABAgQIECBAgED2AgrC7FMsQAIECBAgQIAAAQIECKQFFIRpF60ECBAgQIAAAQIECBDIXkBBmH2KBUiAAAECBAgQIECAAIG0gIIw7aKVAAECBAgQIECAAAEC2QsoCLNPsQAJECBAgAABAgQIECCQFlAQpl20EiBAgAABAgQIECBAIHsBBWH2KRYgAQIECBAgQIAAAQIE0gIKwrSLVgIECBAgQIAAAQIECGQvoCDMPsUCJECAAAECBAgQIECAQFpAQZh20UqAAAECBAgQIECAAIHsBRSE2adYgAQIECBAgAABAgQIEEgLKAjTLloJECBAgAABAgQIECCQvYCCMPsUC5AAAQIECBAgQIAAAQJpAQVh2kUrAQIECBAgQIAAAQIEshdQEGafYgESIECAAAECBAgQIEAgLaAgTLtoJUCAAAECBAgQIECAQPYCCsLsUyxAAgQIECBAgAABAgQIpAUUhGkXrQQIECBAgAABAgQIEMheQEGYfYoFSIAAAQIECBAgQIAAgbSAgjDtopUAAQIECBAgQIAAAQLZCygIs0+xAAkQIECAAAECBAgQIJAWUBCmXbQSIECAAAECBAgQIEAgewEFYfYpFiABAgQIECBAgAABAgTSAgrCtItWAgQIECBAgAABAgQIZC+gIMw+xQIkQIAAAQIECBAgQIBAWkBBmHbRSoAAAQIECBAgQIAAgewFFITZp1iABAgQIECAAAECBAgQSAsoCNMuWgkQIECAAAECBAgQIJC9gIIw+xQLkAABAgQIECBAgAABAmkBBWHaRSsBAgQIECBAgAABAgSyF1AQZp9iARIgQIAAAQIECBAgQCAt0Hv69OnD6R9pJUCAAAECBAgQIECAAIFcBWIt2Ds5Ofk/FIW5plhcBAgQIECAAAECBAgQOFcg1oCxFvx/igS5OoZp/wsAAAAASUVORK5CYII'
 
 
 class TestLoad(unittest.TestCase):
-	aes:list[Tuple[str, str]] 	= []
+	aes:IdentifierStore			= IdentifierStore()	# (ri, rn) of the created AEs
 	timeStart:float				= 0
+	loadCurve:list[LoadPoint]	= []		# Throughput and latency of test_retrieveAEsProcesses at increasing concurrency
 
-	def __init__(self, methodName:str='runTest', count:int=None, parallel:int=1):
-		"""	Pass a count to the test cases.
+	def __init__(self, methodName:str='runTest', count:int=None, parallel:int=1, rate:float=None):
+		"""	Pass a count, and for the open-loop tests a target rate, to the test cases.
 		"""
 		super(TestLoad, self).__init__(methodName)
 		self.count = count
 		self.parallel = parallel
+		self.rate = rate
 
 
 	@classmethod
@@ -42,11 +50,15 @@ class TestLoad(unittest.TestCase):
 	@classmethod
 	@unittest.skipIf(noCSE, 'No CSEBase')
 	def tearDownClass(cls) -> None:
+		if len(cls.loadCurve) >= 3:
+			printAnalysis(analyze(cls.loadCurve), f'Load curve RETRIEVE <AE> ({BINDING})', console)
+		cls.loadCurve.clear()
 		if not isTearDownEnabled():
 			return
 		testCaseStart('TearDown TestLoad')
 		for ae in cls.aes:
 			DELETE(f'{cseURL}/{ae[1]}', ORIGINATOR)
+		cls.aes.clear()
 		testCaseEnd('TearDown TestLoad')
 
 
@@ -79,10 +91,10 @@ class TestLoad(unittest.TestCase):
 		return f'{total:.4f} ({total/(count*parallel)/divider:.5f})'
 
 
-	def _createAEs(self, count:int) -> list[Tuple[str, str]]:
-		"""	Create n AEs and return the list of (identifiers, resourceName).
+	def _createAEs(self, count:int) -> IdentifierStore:
+		"""	Create n AEs and return the store of (identifiers, resourceName).
 		"""
-		aes:list[Tuple[str, str]] = []
+		aes = IdentifierStore()
 		for _ in range(count):
 			dct = 	{ 'm2m:ae' : {
 						'rn': uniqueRN(),	# Sometimes needs a set rn
@@ -99,33 +111,40 @@ class TestLoad(unittest.TestCase):
 		return aes
 
 	
-	def _retrieveAEs(self, count:int, aes:list[Tuple[str, str]]=None) -> None:
+	def _retrieveAEs(self, count:int, aes:IdentifierStore=None) -> None:
 		if aes is None:
 			aes = TestLoad.aes
 		self.assertEqual(len(aes), count)
-		for ae in list(aes):
+		for ae in aes:
 			r, rsc = RETRIEVE(f'{cseURL}/{ae[1]}', ORIGINATOR)
 			self.assertEqual(rsc, RC.OK, r)
 			self.assertEqual(findXPath(r, 'm2m:ae/ri'), ae[0], r)
 
 
-	def _deleteAEs(self, count:int, aes:list[Tuple[str, str]]=None) -> None:
-		"""	Delete n AE's. Remove the AE's von the given list (only removed from the global list if no list was given).
+	def _deleteAEs(self, count:int, aes:IdentifierStore=None, start:int=0, step:int=1) -> None:
+		"""	Delete n AE's. Remove the AE's von the given store (only removed from the global store if no store was given).
+			With *start* and *step* only every step-th AE is deleted, e.g. to divide the AEs between threads.
 		"""
 		if aes is None:
 			aes = TestLoad.aes
-		self.assertEqual(len(aes), count)
-		for ae in list(aes):
+		if step == 1:
+			self.assertEqual(len(aes), count)
+		deleted = 0
+		for slot, ae in aes.items(start, step=step):
 			r, rsc = DELETE(f'{cseURL}/{ae[1]}', ORIGINATOR)
 			self.assertEqual(rsc, RC.DELETED, r)
-			aes.remove(ae)
-		self.assertEqual(len(aes), 0)
+			del aes[slot]
+			deleted += 1
+		self.assertEqual(deleted, count)
+		if step == 1:
+			self.assertEqual(len(aes), 0)
+			aes.clear()		# release the memory
 
 
-	def _createCNTs(self, aern:str, originator:str, count:int, mni:int) -> list[Tuple[str, str]]:
-		"""	Create n CNTs and return the list of (identifiers, resourceName).
+	def _createCNTs(self, aern:str, originator:str, count:int, mni:int) -> IdentifierStore:
+		"""	Create n CNTs and return the store of (identifiers, resourceName).
 		"""
-		cnts:list[Tuple[str, str]] = []
+		cnts = IdentifierStore()
 		for _ in range(count):
 			dct = 	{ 'm2m:cnt' : {
 					'mni': mni
@@ -139,17 +158,17 @@ class TestLoad(unittest.TestCase):
 		return cnts
 
 
-	def _createCINs(self, aern:str, cntrn:str, originator:str, count:int) -> list[Tuple[str, str]]:
-		"""	Create n CINs and return the list of (identifiers, resourceName).
+	def _createCINs(self, aern:str, cntrn:str, originator:str, count:int) -> IdentifierStore:
+		"""	Create n CINs and return the store of (identifiers, resourceName).
 		"""
-		cins:list[Tuple[str, str]] = []
+		cins = IdentifierStore()
 		for _ in range(count):
 			dct = 	{ 'm2m:cin' : {
 					'con': 'Hello, world'
 				}}
 			r, rsc = CREATE(f'{cseURL}/{aern}/{cntrn}',  originator, T.CIN, dct)
 			self.assertEqual(rsc, RC.CREATED, r)
-			ri = findXPath(r, 'm2m:cnt/ri')
+			ri = findXPath(r, 'm2m:cin/ri')
 			rn = findXPath(r, 'm2m:cin/rn')
 			cins.append((ri, rn))
 		self.assertEqual(len(cins), count)
@@ -184,7 +203,7 @@ class TestLoad(unittest.TestCase):
 
 
 	@unittest.skipIf(noCSE, 'No CSEBase')
-	@unittest.skipIf(BINDING in ('mqtt', 'ws'), 'No parallel execution for MQTT or WS binding yet')
+	@unittest.skipIf(BINDING == 'mqtt', 'No parallel execution for MQTT binding yet')
 	def test_createAEsParallel(self) -> None:
 		"""	Create n AEs in m threads in parallel"""
 		print(f'{self.count} * {self.parallel} Threads ... ', end='', flush=True)
@@ -196,13 +215,11 @@ class TestLoad(unittest.TestCase):
 
 
 	@unittest.skipIf(noCSE, 'No CSEBase')
-	@unittest.skipIf(BINDING in ('mqtt', 'ws'), 'No parallel execution for MQTT or WS binding yet')
+	@unittest.skipIf(BINDING == 'mqtt', 'No parallel execution for MQTT binding yet')
 	def test_deleteAEsParallel(self) -> None:
 		"""	Delete n AEs in m threads in parallel """
 		print(f'{self.count} * {self.parallel} Threads ... ', end='', flush=True)
-		nrPerList = int(len(TestLoad.aes)/self.parallel)
-		deleteLists = [TestLoad.aes[x:x+nrPerList] for x in range(0, len(TestLoad.aes), nrPerList)]
-		threads = [threading.Thread(target=lambda n: self._deleteAEs(self.count, aes=deleteLists[n]), args=(n,)) for n in range(self.parallel)]
+		threads = [threading.Thread(target=lambda n: self._deleteAEs(self.count, start=n, step=self.parallel), args=(n,)) for n in range(self.parallel)]
 		TestLoad.startTimer()
 		[t.start() for t in threads]	# type: ignore [func-returns-value]
 		[t.join() for t in threads]		# type: ignore [func-returns-value]
@@ -210,6 +227,98 @@ class TestLoad(unittest.TestCase):
 		TestLoad.aes.clear()
 
 
+	@unittest.skipIf(noCSE, 'No CSEBase')
+	@unittest.skipIf(BINDING == 'mqtt', 'No parallel execution for MQTT binding yet')
+	def test_createAEsProcesses(self) -> None:
+		"""	Create n AEs in m worker processes in parallel """
+		print(f'{self.count} * {self.parallel} Processes ... ', end='', flush=True)
+		result = runWorkers('createAEs', self.parallel, self.count)
+		TestLoad.aes.extend(result.items)
+		self.assertEqual(result.failures, [])
+		self.assertEqual(result.errors, 0)
+		self.assertEqual(len(TestLoad.aes), self.count * self.parallel)
+		print(f'{result.duration:.4f} ({result.duration/(self.count*self.parallel):.5f}), client CPU {result.cpuTime:.2f} s ... ', end='', flush=True)
+
+
+	@unittest.skipIf(noCSE, 'No CSEBase')
+	@unittest.skipIf(BINDING == 'mqtt', 'No parallel execution for MQTT binding yet')
+	def test_deleteAEsProcesses(self) -> None:
+		"""	Delete n AEs in m worker processes in parallel """
+		print(f'{self.count} * {self.parallel} Processes ... ', end='', flush=True)
+		self.assertEqual(len(TestLoad.aes), self.count * self.parallel)
+		result = runWorkers('deleteAEs', self.parallel, self.count, list(TestLoad.aes))
+		if len(result.items) == len(TestLoad.aes):
+			TestLoad.aes.clear()
+		else:	# keep the AEs that were not deleted for the tear-down
+			deleted = set(result.items)
+			for slot, ae in TestLoad.aes.items():
+				if ae in deleted:
+					del TestLoad.aes[slot]
+		self.assertEqual(result.failures, [])
+		self.assertEqual(result.errors, 0)
+		print(f'{result.duration:.4f} ({result.duration/(self.count*self.parallel):.5f}), client CPU {result.cpuTime:.2f} s ... ', end='', flush=True)
+
+
+	@unittest.skipIf(noCSE, 'No CSEBase')
+	@unittest.skipIf(BINDING == 'mqtt', 'No parallel execution for MQTT binding yet')
+	def test_retrieveAEsProcesses(self) -> None:
+		"""	Retrieve an AE n times in each of m worker processes, and record the throughput for the load curve """
+		self.assertEqual(len(TestLoad.aes), 0)
+		print(f'{self.count} * {self.parallel} Processes ... ', end='', flush=True)
+		TestLoad.aes.extend(self._createAEs(1))
+		ae = next(iter(TestLoad.aes))
+		result = runWorkers('retrieveAEs', self.parallel, self.count, [ ae ] * self.parallel)
+		self._deleteAEs(1)
+		self.assertEqual(result.failures, [])
+		self.assertEqual(result.errors, 0)
+		throughput = result.requests / result.duration
+		p99 = mergeHistograms(list(result.latencies.values())).percentile(99)
+		TestLoad.loadCurve.append(LoadPoint(self.parallel, throughput, p99))
+		print(f'{throughput:.1f} req/s, p99 {p99*1000:.2f} ms ... ', end='', flush=True)
+
+
+	@unittest.skipIf(noCSE, 'No CSEBase')
+	@unittest.skipIf(BINDING == 'mqtt', 'No parallel execution for MQTT binding yet')
+	def test_createAEsOpenLoop(self) -> None:
+		"""	Create n AEs at a target rate """
+		self.assertEqual(len(TestLoad.aes), 0)
+		print(f'{self.count} @ {self.rate} req/s ... ', end='', flush=True)
+		lock = threading.Lock()
+
+		def _create(_:int) -> bool:
+			dct = 	{ 'm2m:ae' : {
+						'rn': uniqueRN(),
+						'api': APPID,
+						'rr': False,
+						'srv': [ RELEASEVERSION ]
+					}}
+			r, rsc = CREATE(cseURL, 'C', T.AE, dct)
+			if rsc != RC.CREATED:
+				return False
+			with lock:
+				TestLoad.aes.append((findXPath(r, 'm2m:ae/ri'), findXPath(r, 'm2m:ae/rn')))
+			return True
+
+		result = runOpenLoop(_create, self.rate, self.count)
+		print(f'{result} ... ', end='', flush=True)
+		self.assertEqual(result.errors, 0)
+		self._deleteAEs(self.count)
+
+
+	@unittest.skipIf(noCSE, 'No CSEBase')
+	@unittest.skipIf(BINDING == 'mqtt', 'No parallel execution for MQTT binding yet')
+	def test_retrieveAEOpenLoop(self) -> None:
+		"""	Retrieve an AE n times at a target rate """
+		self.assertEqual(len(TestLoad.aes), 0)
+		print(f'{self.count} @ {self.rate} req/s ... ', end='', flush=True)
+		TestLoad.aes.extend(self._createAEs(1))
+		ae = next(iter(TestLoad.aes))
+		result = runOpenLoop(lambda _: RETRIEVE(f'{cseURL}/{ae[1]}', ORIGINATOR)[1] == RC.OK, self.rate, self.count)
+		print(f'{result} ... ', end='', flush=True)
+		self._deleteAEs(1)
+		self.assertEqual(result.errors, 0)
+
+
 	@unittest.skipIf(noCSE, 'No CSEBase')
 	def test_createCNTCINs(self) -> None:
 		"""	Create 1 AE + n CNTs * 20 CINs"""
@@ -219,7 +328,7 @@ class TestLoad(unittest.TestCase):
 
 		# create an AE
 		TestLoad.aes.extend(self._createAEs(1))
-		ae = TestLoad.aes[0]
+		ae = next(iter(TestLoad.aes))
 
 		# add self.count containers
 		cnts = self._createCNTs(ae[1], ae[0], self.count, mni=10)
@@ -233,7 +342,7 @@ class TestLoad(unittest.TestCase):
 
 
 	@unittest.skipIf(noCSE, 'No CSEBase')
-	@unittest.skipIf(BINDING in ('mqtt', 'ws'), 'No parallel execution for MQTT or WS binding yet')
+	@unittest.skipIf(BINDING == 'mqtt', 'No parallel execution for MQTT binding yet')
 	def test_createCNTCINsParallel(self) -> None:
 		"""	Create 1 AE + n CNTs * 20 CINs in n threads"""
 		self.assertEqual(len(TestLoad.aes), 0)
@@ -242,7 +351,7 @@ class TestLoad(unittest.TestCase):
 
 		# create an AE
 		TestLoad.aes.extend(self._createAEs(1))
-		ae = TestLoad.aes[0]
+		ae = next(iter(TestLoad.aes))
 
 		# add self.count containers
 		cnts = self._createCNTs(ae[1], ae[0], self.count, mni=10)
@@ -255,6 +364,34 @@ class TestLoad(unittest.TestCase):
 		[t.join() for t in threads]		# type: ignore [func-returns-value]
 		print(f'{TestLoad.stopTimer(self.count, 1, divider=20)} ... ', end='', flush=True)
 
+
+	@unittest.skipIf(noCSE, 'No CSEBase')
+	@unittest.skipIf(BINDING == 'mqtt', 'No parallel execution for MQTT binding yet')
+	def test_createCNTCINsTree(self) -> None:
+		"""	Create 1 AE + n CNTs * 20 CINs as a resource tree with bounded parallelism"""
+		self.assertEqual(len(TestLoad.aes), 0)
+		print(f'{self.count} ... ', end='', flush=True)
+		TestLoad.startTimer()
+		tree = 	{ 'm2m:ae' : {
+					'rn': uniqueRN(),
+					'api': APPID,
+					'rr': False,
+					'srv': [ RELEASEVERSION ]
+				},
+				'children': [ { 'm2m:cnt': { 'rn': 'cnt', 'mni': 10 },
+								'count': self.count,
+								'children': [ { 'm2m:cin': { 'con': 'Hello, world' }, 'count': 20 } ]
+							  } ]
+				}
+		try:
+			index = resourceTree.build(tree, maxWorkers=self.parallel)
+		except resourceTree.TreeBuildError as e:
+			TestLoad.aes.extend([ (n.ri, n.rn) for n in resourceTree.roots(e.index) ])	# removed by test_deleteCNTCINs
+			raise
+		TestLoad.aes.extend([ (n.ri, n.rn) for n in resourceTree.roots(index) ])
+		self.assertEqual(len(index), 1 + self.count * 21)
+		print(f'{TestLoad.stopTimer(self.count, 1, divider=20)} ... ', end='', flush=True)
+
  
 	@unittest.skipIf(noCSE, 'No CSEBase')
 	def test_deleteCNTCINs(self) -> None:
@@ -335,6 +472,22 @@ def run(testFailFast:bool) -> Tuple[int, int, int, float]:
 	addTest(suite, TestLoad('test_createAEsParallel', 10, 100))
 	addTest(suite, TestLoad('test_deleteAEsParallel', 10, 100))
 
+	# Create and delete AEs in worker processes
+	addTest(suite, TestLoad('test_createAEsProcesses', 100, 4))
+	addTest(suite, TestLoad('test_deleteAEsProcesses', 100, 4))
+	addTest(suite, TestLoad('test_createAEsProcesses', 1000, 8))
+	addTest(suite, TestLoad('test_deleteAEsProcesses', 1000, 8))
+
+	# Retrieve AEs at increasing concurrency. The load curve is analysed at the end of the suite
+	for parallel in [ 1, 2, 4, 8, 16, 32 ]:
+		addTest(suite, TestLoad('test_retrieveAEsProcesses', 200, parallel))
+
+	# Create and retrieve <AE> at target rates, independent of the response times (open loop)
+	addTest(suite, TestLoad('test_createAEsOpenLoop', 500, rate = 100))
+	addTest(suite, TestLoad('test_retrieveAEOpenLoop', 1000, rate = 100))
+	addTest(suite, TestLoad('test_retrieveAEOpenLoop', 2000, rate = 500))
+	addTest(suite, TestLoad('test_retrieveAEOpenLoop', 5000, rate = 1000))
+
 	# Create and delete 1 AE + 10 CNTs * 20 CINs one by one
 	addTest(suite, TestLoad('test_createCNTCINs', 10))
 	addTest(suite, TestLoad('test_deleteCNTCINs', 10))
@@ -351,6 +504,10 @@ def run(testFailFast:bool) -> Tuple[int, int, int, float]:
 	addTest(suite, TestLoad('test_createCNTCINsParallel', 100))
 	addTest(suite, TestLoad('test_deleteCNTCINs', 100))
 
+	# Create a resource tree: 1 AE + 100 CNTs * 20 CINs, 16 concurrent requests
+	addTest(suite, TestLoad('test_createCNTCINsTree', 100, 16))
+	addTest(suite, TestLoad('test_deleteCNTCINs', 100))
+
 	# Test blob data
 	addTest(suite, TestLoad('test_storeImages', 100))
 	addTest(suite, TestLoad('test_storeImages', 1000))
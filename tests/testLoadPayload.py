@@ -0,0 +1,166 @@
+#
+#	testLoadPayload.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Load tests for the content size: create <CIN> resources with contents from
+#	bytes to megabytes and measure throughput and latency per size.
+#
+
+from __future__ import annotations
+import unittest, sys, base64, os
+if '..' not in sys.path:
+	sys.path.append('..')
+from typing import Tuple
+from rich.table import Table
+from acme.etc.Types import ResponseStatusCode as RC, ResourceTypes as T
+from init import *
+from histograms import LatencyHistogram
+
+
+def payload(size:int) -> str:
+	"""	Generate a random, incompressible content of a given size. The content only consists
+		of ASCII characters, so its size in bytes is the same as its length.
+	"""
+	return base64.b64encode(os.urandom(size * 3 // 4 + 3)).decode('ascii')[:size]
+
+
+class TestLoadPayload(unittest.TestCase):
+
+	ae 				= None
+	originator 		= None
+	results:list[Tuple[int, int, float, LatencyHistogram]] = []	# (size, count, duration, latencies)
+
+	def __init__(self, methodName:str='runTest', size:int=None, count:int=None):
+		"""	Pass the content size and the number of requests to the test cases.
+		"""
+		super(TestLoadPayload, self).__init__(methodName)
+		self.size = size
+		self.count = count
+
+
+	@classmethod
+	@unittest.skipIf(noCSE, 'No CSEBase')
+	def setUpClass(cls) -> None:
+		testCaseStart('Setup TestLoadPayload')
+		dct = 	{ 'm2m:ae' : {
+					'rn': aeRN,
+					'api': APPID,
+				 	'rr': False,
+				 	'srv': [ RELEASEVERSION ]
+				}}
+		cls.ae, rsc = CREATE(cseURL, 'C', T.AE, dct)	# AE to work under
+		assert rsc == RC.CREATED, 'cannot create parent AE'
+		cls.originator = findXPath(cls.ae, 'm2m:ae/aei')
+		cls.results = []
+		testCaseEnd('Setup TestLoadPayload')
+
+
+	@classmethod
+	@unittest.skipIf(noCSE, 'No CSEBase')
+	def tearDownClass(cls) -> None:
+		if cls.results:
+			cls.printResults()
+		if not isTearDownEnabled():
+			return
+		testCaseStart('TearDown TestLoadPayload')
+		DELETE(aeURL, ORIGINATOR)	# Just delete the AE and everything below it. Ignore whether it exists or not
+		testCaseEnd('TearDown TestLoadPayload')
+
+
+	def setUp(self) -> None:
+		testCaseStart(self._testMethodName)
+
+
+	def tearDown(self) -> None:
+		testCaseEnd(self._testMethodName)
+
+
+	@classmethod
+	def printResults(cls) -> None:
+		"""	Print the throughput and latencies of all content sizes.
+		"""
+		table = Table(show_header=True, header_style='bright_blue', title=f'Content size sweep ({BINDING})')
+		table.add_column('Size', justify='right')
+		table.add_column('Requests', justify='right')
+		table.add_column('Req / s', justify='right')
+		table.add_column('Bytes / s', justify='right')
+		table.add_column('Latency ms\np50 | p90 | p99 | Max', justify='center')
+		for size, count, duration, latencies in cls.results:
+			s = latencies.summary()
+			table.add_row(f'{size}',
+						  f'{count}',
+						  f'{count / duration:.1f}',
+						  f'{size * count / duration:,.0f}',
+						  f'{s["p50"]*1000:8.2f} | {s["p90"]*1000:8.2f} | {s["p99"]*1000:8.2f} | {s["max"]*1000:8.2f}')
+		console.print(table)
+
+
+	#########################################################################
+
+
+	@unittest.skipIf(noCSE, 'No CSEBase')
+	def test_createCINsWithSize(self) -> None:
+		"""	Create n <CIN> with a content of a given size """
+		print(f'{self.count} * {self.size} bytes ... ', end='', flush=True)
+
+		# A new container for each size, large enough for all instances
+		rn = f'{cntRN}{self.size}'
+		dct = 	{ 'm2m:cnt' : {
+					'rn' : rn,
+					'mni': self.count,
+					'mbs': self.count * self.size
+				}}
+		r, rsc = CREATE(aeURL, TestLoadPayload.originator, T.CNT, dct)
+		self.assertEqual(rsc, RC.CREATED, r)
+
+		con = payload(self.size)
+		latencies = LatencyHistogram()
+		startTime = time.perf_counter()
+		for _ in range(self.count):
+			requestTime = time.perf_counter()
+			r, rsc = CREATE(f'{aeURL}/{rn}', TestLoadPayload.originator, T.CIN, { 'm2m:cin': { 'con': con }})
+			latencies.record(time.perf_counter() - requestTime)
+			self.assertEqual(rsc, RC.CREATED, r)
+			self.assertEqual(findXPath(r, 'm2m:cin/cs'), self.size)
+		duration = time.perf_counter() - startTime
+		del con
+
+		# Check the container's statistics
+		r, rsc = RETRIEVE(f'{aeURL}/{rn}', TestLoadPayload.originator)
+		self.assertEqual(rsc, RC.OK, r)
+		self.assertEqual(findXPath(r, 'm2m:cnt/cni'), self.count)
+		self.assertEqual(findXPath(r, 'm2m:cnt/cbs'), self.count * self.size)
+
+		r, rsc = DELETE(f'{aeURL}/{rn}', TestLoadPayload.originator)
+		self.assertEqual(rsc, RC.DELETED, r)
+
+		TestLoadPayload.results.append((self.size, self.count, duration, latencies))
+		print(f'{self.count / duration:.1f} req/s, {self.size * self.count / duration:,.0f} bytes/s ... ', end='', flush=True)
+
+
+def run(testFailFast:bool) -> Tuple[int, int, int, float]:
+	suite = unittest.TestSuite()
+
+	# Small contents, around the size of a single CoAP datagram (1024 bytes), and up to megabytes
+	for size, count in [ (16, 200),
+						 (256, 200),
+						 (1000, 200),
+						 (1024, 200),
+						 (1100, 200),
+						 (4096, 200),
+						 (16384, 100),
+						 (65536, 100),
+						 (262144, 50),
+						 (1048576, 20),
+						 (4194304, 5) ]:
+		addTest(suite, TestLoadPayload('test_createCINsWithSize', size, count))
+
+	result = unittest.TextTestRunner(verbosity=testVerbosity, failfast=testFailFast).run(suite)
+	printResult(result)
+	return result.testsRun, len(result.errors + result.failures), len(result.skipped), getSleepTimeCount()
+
+
+if __name__ == '__main__':
+	r, errors, s, t = run(True)
+	sys.exit(errors)
@@ -402,8 +402,7 @@ class TestREQ(unittest.TestCase):
 		self.assertIsNotNone(findXPath(r, 'm2m:uri'))
 
 		# Wait and then check notification
-		testSleep(requestCheckDelay)
-		lastNotification = getLastNotification(wait = notificationDelay)
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:rsp/rqi') == rqi, wait = requestCheckDelay + notificationDelay)
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp'))
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp/rsc'))
 		self.assertEqual(findXPath(lastNotification, 'm2m:rsp/rsc'), RC.OK)
@@ -429,8 +428,7 @@ class TestREQ(unittest.TestCase):
 		self.assertIsNotNone(findXPath(r, 'm2m:uri'))
 
 		# Wait and then check notification
-		testSleep(requestCheckDelay)
-		lastNotification = getLastNotification()
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:rsp/rqi') == rqi, wait = requestCheckDelay)
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp'))
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp/rsc'))
 		self.assertEqual(findXPath(lastNotification, 'm2m:rsp/rsc'), RC.OK)
@@ -472,8 +470,7 @@ class TestREQ(unittest.TestCase):
 		self.assertIsNotNone(findXPath(r, 'm2m:uri'))
 
 		# Wait and then check notification
-		testSleep(requestCheckDelay)
-		lastNotification = getLastNotification()
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:rsp/rqi') == rqi, wait = requestCheckDelay)
 		self.assertIsNotNone(lastNotification)
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp'))
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp/rsc'))
@@ -500,8 +497,7 @@ class TestREQ(unittest.TestCase):
 		self.assertIsNotNone(findXPath(r, 'm2m:uri'))
 
 		# Wait and then check notification
-		testSleep(requestCheckDelay)
-		lastNotification = getLastNotification()
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:rsp/rqi') == rqi, wait = requestCheckDelay)
 		self.assertIsNotNone(lastNotification)
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp'))
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp/rsc'))
@@ -523,8 +519,7 @@ class TestREQ(unittest.TestCase):
 		self.assertIsNotNone(findXPath(r, 'm2m:uri'))
 
 		# Wait and then check notification
-		testSleep(requestCheckDelay)
-		lastNotification = getLastNotification()
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:rsp/rqi') == rqi, wait = requestCheckDelay)
 		self.assertIsNotNone(lastNotification)
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp'))
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp/rsc'))
@@ -549,8 +544,7 @@ class TestREQ(unittest.TestCase):
 		self.assertIsNotNone(findXPath(r, 'm2m:uri'))
 
 		# Wait and then check notification
-		testSleep(requestCheckDelay)
-		lastNotification = getLastNotification()
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:rsp/rqi') == rqi, wait = requestCheckDelay)
 		self.assertIsNotNone(lastNotification)
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp'))
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp/rsc'))
@@ -581,8 +575,7 @@ class TestREQ(unittest.TestCase):
 		requestURI = findXPath(r, 'm2m:uri')
 
 		# Wait and then check notification
-		testSleep(requestCheckDelay)
-		lastNotification = getLastNotification()
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:rsp/rqi') == rqi, wait = requestCheckDelay)
 		self.assertIsNotNone(lastNotification)
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp'))
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:rsp/rsc'))
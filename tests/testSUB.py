@@ -13,6 +13,7 @@ if '..' not in sys.path:
 from typing import Tuple
 from acme.etc.Types import NotificationEventType as NET, ResourceTypes as T, NotificationContentType, ResponseStatusCode as RC
 from init import *
+import resourceTree
 
 numberOfBatchNotifications = 5
 durationForBatchNotifications = 2
@@ -45,41 +46,34 @@ class TestSUB(unittest.TestCase):
 
 		testCaseStart('Setup TestSub')
 		# create other resources
-		dct = 	{ 'm2m:ae' : {
-					'rn'  : aeRN, 
-					'api' : APPID,
-				 	'rr'  : True,
-				 	'srv' : [ RELEASEVERSION ],
-				}}
-		cls.ae, rsc = CREATE(cseURL, 'C', T.AE, dct)	# AE to work under
-		assert rsc == RC.CREATED, 'cannot create parent AE'
+		tree = resourceTree.build([ { 'm2m:ae' : {
+										'rn'  : aeRN, 
+										'api' : APPID,
+										'rr'  : True,
+										'srv' : [ RELEASEVERSION ],
+									  },
+									  'children': [ { 'm2m:cnt' : { 'rn' : cntRN }} ]
+									},	# AE to work under
+									{ 'm2m:ae' : {
+										'rn'  : f'{aeRN}NoPOA', 
+										'api' : APPID,
+										'rr'  : True,
+										'srv' : [ RELEASEVERSION ]
+									}},	# AE without poa
+									{ 'm2m:ae' : {
+										'rn'  : f'{aeRN}POA', 
+										'api' : APPID,
+										'rr'  : True,
+										'srv' : [ RELEASEVERSION ],
+										'poa' : [ NOTIFICATIONSERVER ],
+									}}	# AE with poa
+								  ], originator = 'C')
+		cls.ae = tree[aeRN].resource
 		cls.originator = findXPath(cls.ae, 'm2m:ae/aei')
-
-		dct = 	{ 'm2m:ae' : {
-					'rn'  : f'{aeRN}NoPOA', 
-					'api' : APPID,
-					'rr'  : True,
-					'srv' : [ RELEASEVERSION ]
-				}}
-		cls.aeNoPoa, rsc = CREATE(cseURL, 'C', T.AE, dct)	# AE to work under
-		assert rsc == RC.CREATED, 'cannot create AE without poa'
-
-		dct = 	{ 'm2m:ae' : {
-					'rn'  : f'{aeRN}POA', 
-					'api' : APPID,
-				 	'rr'  : True,
-				 	'srv' : [ RELEASEVERSION ],
-					'poa' : [ NOTIFICATIONSERVER ],
-				}}
-		cls.aePoa, rsc = CREATE(cseURL, 'C', T.AE, dct)	# AE to work under
-		assert rsc == RC.CREATED, 'cannot create parent AE with poa'
+		cls.aeNoPoa = tree[f'{aeRN}NoPOA'].resource
+		cls.aePoa = tree[f'{aeRN}POA'].resource
 		cls.originatorPoa = findXPath(cls.aePoa, 'm2m:ae/aei')
-
-		dct = 	{ 'm2m:cnt' : { 
-					'rn'  : cntRN
-				}}
-		cls.cnt, rsc = CREATE(aeURL, cls.originator, T.CNT, dct)
-		assert rsc == RC.CREATED, 'cannot create container'
+		cls.cnt = tree[f'{aeRN}/{cntRN}'].resource
 		cls.cntRI = findXPath(cls.cnt, 'm2m:cnt/ri')
 
 		# Add another AE URL
@@ -259,7 +253,7 @@ class TestSUB(unittest.TestCase):
 		self.assertIsNotNone(findXPath(cnt, 'm2m:cnt/mbs'))
 		self.assertIsInstance(findXPath(cnt, 'm2m:cnt/mbs'), int)
 		self.assertEqual(findXPath(cnt, 'm2m:cnt/mbs'), 9999)
-		lastNotification = getLastNotification(wait = notificationDelay)
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:sgn/nev/rep/m2m:cnt/mbs') == 9999)
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:sgn/nev/rep'))
 		self.assertEqual(findXPath(lastNotification, 'm2m:sgn/nev/rep/m2m:cnt/ty'), T.CNT)
 		self.assertEqual(findXPath(lastNotification, 'm2m:sgn/nev/rep/m2m:cnt/rn'), cntRN)
@@ -277,7 +271,7 @@ class TestSUB(unittest.TestCase):
 		self.assertIsNotNone(r)
 		self.assertIsNotNone(findXPath(r, 'm2m:cin/ri'))
 		self.assertEqual(findXPath(r, 'm2m:cin/con'), 'aValue')
-		lastNotification = getLastNotification(wait = notificationDelay)
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:sgn/nev/rep/m2m:cin/ri') == findXPath(r, 'm2m:cin/ri'))
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:sgn/nev/rep'))
 		self.assertEqual(findXPath(lastNotification, 'm2m:sgn/nev/rep/m2m:cin/ty'), T.CIN)
 		self.assertEqual(findXPath(lastNotification, 'm2m:sgn/nev/rep/m2m:cin/con'), 'aValue')
@@ -363,7 +357,7 @@ class TestSUB(unittest.TestCase):
  				}}
 		_, rsc = UPDATE(cntURL, TestSUB.originator, dct)
 		self.assertEqual(rsc, RC.UPDATED)
-		lastNotification = getLastNotification(wait = notificationDelay)
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:sgn/nev/rep/m2m:cnt/lbl') == [ 'bTag' ])
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:sgn/nev/rep'))
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:sgn/nev/rep/m2m:cnt'))
 		self.assertEqual(findXPath(lastNotification, 'm2m:sgn/nev/rep/m2m:cnt/lbl'), [ 'bTag'])
@@ -378,7 +372,7 @@ class TestSUB(unittest.TestCase):
  				}}
 		_, rsc = UPDATE(cntURL, TestSUB.originator, dct)
 		self.assertEqual(rsc, RC.UPDATED)
-		lastNotification = getLastNotification(wait = notificationDelay)
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:sgn/nev/rep/m2m:cnt/lbl') == [ 'bTag' ])
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:sgn/nev/rep'))
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:sgn/nev/rep/m2m:cnt'))
 		self.assertEqual(findXPath(lastNotification, 'm2m:sgn/nev/rep/m2m:cnt/lbl'), [ 'bTag'])
@@ -413,7 +407,7 @@ class TestSUB(unittest.TestCase):
  				}}
 		cnt, rsc = UPDATE(cntURL, TestSUB.originator, dct)
 		self.assertEqual(rsc, RC.UPDATED)
-		lastNotification = getLastNotification(wait = notificationDelay)
+		lastNotification = waitForNotification(lambda n: str(findXPath(n, 'm2m:sgn/nev/rep/m2m:uri')).endswith(findXPath(cnt, 'm2m:cnt/ri')))
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:sgn/nev/rep'))
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:sgn/nev/rep/m2m:uri'))
 		self.assertTrue(findXPath(lastNotification, 'm2m:sgn/nev/rep/m2m:uri').endswith(findXPath(cnt, 'm2m:cnt/ri')))
@@ -455,7 +449,7 @@ class TestSUB(unittest.TestCase):
 					}}
 			_, rsc = UPDATE(cntURL, TestSUB.originator, dct)
 			self.assertEqual(rsc, RC.UPDATED)
-		lastNotification = getLastNotification(wait = notificationDelay)
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:agn/m2m:sgn/{0}/nev/rep/m2m:cnt/lbl') == [ '0' ])
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:agn'), lastNotification)
 		for i in range(0, numberOfBatchNotifications):	# check availability and correct order
 			self.assertIsNotNone(findXPath(lastNotification, 'm2m:agn/m2m:sgn/{%d}/nev/rep/m2m:cnt/lbl' % i))
@@ -476,7 +470,7 @@ class TestSUB(unittest.TestCase):
 		self.assertEqual(rsc, RC.DELETED)
 
 		# Should have received the outstanding notification
-		lastNotification = getLastNotification(wait = notificationDelay)
+		lastNotification = waitForNotification(lambda n: findXPath(n, 'm2m:agn/m2m:sgn/{0}/nev/rep/m2m:cnt/lbl') == [ '99' ])
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:agn'))
 		self.assertEqual(len(findXPath(lastNotification, 'm2m:agn')), 1)
 		self.assertIsNotNone(findXPath(lastNotification, 'm2m:agn/m2m:sgn/{0}/nev/rep/m2m:cnt/lbl'))
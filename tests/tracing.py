@@ -0,0 +1,149 @@
+#
+#	tracing.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Optional span tracing for the test suites. The recorded spans are exported in the
+#	Chrome trace event format, which can be opened in Perfetto (https://ui.perfetto.dev)
+#	or in chrome://tracing.
+#
+
+from __future__ import annotations
+from typing import Any, Optional
+import json, os, threading, time
+
+
+enabled = False
+""" Spans are only recorded if tracing is enabled. """
+
+_events:list[dict] = []
+_threadNames:dict[int, str] = {}
+_lock = threading.Lock()
+_offset = 0.0		# Offset from perf_counter() to wall clock time in microseconds, to align the traces of several processes
+
+
+class _NoSpan:
+	"""	Returned by *span()* when tracing is disabled. It does nothing.
+	"""
+	def __enter__(self) -> _NoSpan:
+		return self
+
+	def __exit__(self, *args:Any) -> None:
+		pass
+
+
+_noSpan = _NoSpan()
+
+
+class Span:
+	"""	A span that is recorded as a complete event when the *with* block is left.
+	"""
+
+	__slots__ = ('name', 'cat', 'args', 'start')
+
+	def __init__(self, name:str, cat:str, args:Optional[dict]) -> None:
+		self.name = name
+		self.cat = cat
+		self.args = args
+
+
+	def __enter__(self) -> Span:
+		self.start = time.perf_counter()
+		return self
+
+
+	def __exit__(self, *args:Any) -> None:
+		end = time.perf_counter()
+		event = { 'name': self.name,
+				  'cat': self.cat,
+				  'ph': 'X',
+				  'ts': self.start * 1000000 + _offset,
+				  'dur': (end - self.start) * 1000000 }
+		if self.args:
+			event['args'] = self.args
+		_add(event)
+
+
+def _add(event:dict) -> None:
+	thread = threading.current_thread()
+	event['pid'] = os.getpid()
+	event['tid'] = thread.native_id
+	with _lock:
+		if thread.native_id not in _threadNames:
+			_threadNames[thread.native_id] = thread.name
+		_events.append(event)
+
+
+def enable() -> None:
+	"""	Enable the recording of spans.
+	"""
+	global enabled, _offset
+	_offset = time.time() * 1000000 - time.perf_counter() * 1000000
+	enabled = True
+
+
+def span(name:str, cat:str = 'request', args:Optional[dict] = None) -> Span|_NoSpan:
+	"""	Return a span for a *with* block.
+
+		Args:
+			name: The span's name.
+			cat: The span's category.
+			args: Optional additional arguments that are shown with the span.
+
+		Return:
+			A span, or a span that does nothing if tracing is disabled.
+	"""
+	if not enabled:
+		return _noSpan
+	return Span(name, cat, args)
+
+
+def now() -> float:
+	"""	Return the start time for a span that is recorded by *complete()*. This is an alternative
+		to *span()* for code sections that are not a single block.
+	"""
+	return time.perf_counter() if enabled else 0.0
+
+
+def complete(name:str, cat:str, start:float, args:Optional[dict] = None) -> None:
+	"""	Record a span from a start time returned by *now()* until now.
+	"""
+	if enabled:
+		event = { 'name': name, 'cat': cat, 'ph': 'X', 'ts': start * 1000000 + _offset, 'dur': (time.perf_counter() - start) * 1000000 }
+		if args:
+			event['args'] = args
+		_add(event)
+
+
+def begin(name:str, cat:str, args:Optional[dict] = None) -> None:
+	"""	Start a span that is ended by a matching *end()* call in the same thread.
+	"""
+	if enabled:
+		_add({ 'name': name, 'cat': cat, 'ph': 'B', 'ts': time.perf_counter() * 1000000 + _offset, 'args': args or {} })
+
+
+def end(name:str, cat:str) -> None:
+	"""	End a span that was started by *begin()*.
+	"""
+	if enabled:
+		_add({ 'name': name, 'cat': cat, 'ph': 'E', 'ts': time.perf_counter() * 1000000 + _offset })
+
+
+def events() -> list[dict]:
+	"""	Return the recorded events, including the thread name metadata events.
+	"""
+	with _lock:
+		pid = os.getpid()
+		return [ { 'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': { 'name': name } }
+				 for tid, name in _threadNames.items() ] + list(_events)
+
+
+def export(filename:str, additionalEvents:Optional[list[dict]] = None) -> None:
+	"""	Write the recorded events to a file in the Chrome trace event format.
+
+		Args:
+			filename: The file to write to.
+			additionalEvents: Optional events from other processes, e.g. from worker processes.
+	"""
+	with open(filename, 'w', encoding = 'utf-8') as f:
+		json.dump({ 'traceEvents': events() + (additionalEvents or []), 'displayTimeUnit': 'ms' }, f)
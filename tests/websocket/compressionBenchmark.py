@@ -0,0 +1,122 @@
+#
+#	compressionBenchmark.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Benchmark for the WebSocket binding that compares the bytes on the wire and the
+#	latency of uncompressed and permessage-deflate compressed connections, with JSON
+#	text frames and CBOR binary frames.
+#
+
+from config import *
+import json, random, socket, sys, time
+from urllib.parse import urlparse
+import cbor2
+from rich import print
+from rich.table import Table
+from websockets.sync.client import connect
+from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory
+
+
+requestCount = 100
+""" The number of requests per workload and variant. """
+
+variants = {
+	'json': 				( 'json', { 'compression': None } ),
+	'json + deflate':		( 'json', { 'compression': 'deflate' } ),
+	'json + deflate (10)':	( 'json', { 'compression': None,
+									    'extensions': [ ClientPerMessageDeflateFactory(client_max_window_bits = 10, server_max_window_bits = 10) ] } ),
+	'cbor':					( 'cbor', { 'compression': None } ),
+	'cbor + deflate':		( 'cbor', { 'compression': 'deflate' } ),
+}
+""" The benchmark variants: serialization and connect() arguments. The first entry is the baseline. """
+
+workloads = {
+	'retrieve <CB>':	{ 'to': 'cse-in', 'op': 2 },
+	'discovery':		{ 'to': 'cse-in', 'op': 2, 'fc': { 'fu': 1 }, 'rcn': 8 },
+}
+""" The request templates for the workloads. """
+
+
+class CountingSocket(socket.socket):
+	""" A socket that counts the bytes sent and received, including the WebSocket framing.
+	"""
+	bytesSent = 0
+	bytesReceived = 0
+
+	def send(self, data:bytes, *args:int) -> int:	# type:ignore[override]
+		n = super().send(data, *args)
+		self.bytesSent += n
+		return n
+
+	def sendall(self, data:bytes, *args:int) -> None:	# type:ignore[override]
+		super().sendall(data, *args)
+		self.bytesSent += len(data)
+
+	def recv(self, bufsize:int, *args:int) -> bytes:	# type:ignore[override]
+		data = super().recv(bufsize, *args)
+		self.bytesReceived += len(data)
+		return data
+
+
+def _percentile(values:list[float], p:float) -> float:
+	""" Return the p-th percentile of a sorted list of values.
+	"""
+	return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def runWorkload(request:dict, serialization:str, arguments:dict) -> tuple[int, int, list[float]]:
+	""" Send a workload's request n times over a new connection.
+
+		Args:
+			request: The request template.
+			serialization: The serialization to use, either 'json' or 'cbor'.
+			arguments: Additional arguments for connect().
+
+		Returns:
+			The bytes sent, the bytes received, and the sorted list of latencies.
+	"""
+	url = urlparse(cseUrl)
+	sock = CountingSocket(socket.AF_INET, socket.SOCK_STREAM)
+	sock.connect((url.hostname, url.port))
+	latencies:list[float] = []
+	with connect(cseUrl,
+				 sock = sock,
+				 subprotocols = [ f'oneM2M.{serialization}' ],		# type:ignore[list-item]
+				 additional_headers = { 'X-M2M-Origin': adminOriginator },
+				 max_size = maxSize,
+				 **arguments) as websocket:
+		sock.bytesSent = sock.bytesReceived = 0		# don't count the handshake
+		for _ in range(requestCount):
+			req = dict(request, fr = adminOriginator, rqi = str(random.randint(1, sys.maxsize)), rvi = '4')
+			start = time.perf_counter()
+			websocket.send(json.dumps(req) if serialization == 'json' else cbor2.dumps(req))
+			websocket.recv(timeout = timeout)
+			latencies.append(time.perf_counter() - start)
+	return sock.bytesSent, sock.bytesReceived, sorted(latencies)
+
+
+if __name__ == '__main__':
+	table = Table(title = f'WebSocket compression benchmark ({requestCount} requests each)')
+	table.add_column('Workload')
+	table.add_column('Variant')
+	table.add_column('Sent / Req', justify = 'right')
+	table.add_column('Received / Req', justify = 'right')
+	table.add_column('vs. Baseline', justify = 'right')
+	table.add_column('Latency ms\nMean | p50 | p99', justify = 'center')
+
+	for workloadName, request in workloads.items():
+		baseline = None
+		for variantName, (serialization, arguments) in variants.items():
+			sent, received, latencies = runWorkload(request, serialization, arguments)
+			total = sent + received
+			if baseline is None:
+				baseline = total
+			table.add_row(workloadName,
+						  variantName,
+						  f'{sent / requestCount:.0f}',
+						  f'{received / requestCount:.0f}',
+						  f'{total / baseline * 100:.1f} %',
+						  f'{sum(latencies) / len(latencies) * 1000:.3f} | {_percentile(latencies, 50) * 1000:.3f} | {_percentile(latencies, 99) * 1000:.3f}')
+		table.add_section()
+	print(table)
@@ -12,10 +12,19 @@
 cseUrl = 'ws://localhost:8180'
 notificationHost = 'localhost'
 notificationPort = 8190
-subProtocol = 'oneM2M.json'
+subProtocol = 'oneM2M.json'	# oneM2M.json (text frames) or oneM2M.cbor (binary frames)
 adminOriginator = 'CAdmin'
 aeName = 'myAE'
 subName = 'mySub'
 timeout = 1
 wsServerPOA = f'ws://{notificationHost}:{notificationPort}'
-unreachablePOA = 'ws://default'
\ No newline at end of file
+unreachablePOA = 'ws://default'
+
+# Compression and frame size
+
+compression = True			# Negotiate the permessage-deflate extension
+clientMaxWindowBits = None	# 8..15, or None for the default (15)
+serverMaxWindowBits = None	# 8..15, or None for the default (15)
+compressionLevel = None		# zlib compression level 1..9, or None for the default
+memLevel = None				# zlib memory level 1..9, or None for the default
+maxSize = 2**24				# Maximum size of a received message (bytes)
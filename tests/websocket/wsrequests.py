@@ -8,11 +8,15 @@
 #
 
 from config import *
-import json, random, sys, threading, queue
+import json, os, random, sys, threading, queue
+import cbor2
 from rich import print, rule
 from websockets.sync.client import connect, ClientConnection
 from websockets.sync.server import WebSocketServer as WSServer, serve, ServerConnection
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))	# after this directory, so that its config module is used
+import wsdeflate
+
 
 _websocket:ClientConnection = None
 """ The main WebSocket connection to send requests. """
@@ -67,6 +71,39 @@ def _uniqueID() -> str:
 	return str(random.randint(1,sys.maxsize))
 
 
+def connectArguments() -> dict:
+	""" Return the compression and frame size arguments for a connect() call.
+
+		Returns:
+			The keyword arguments for connect().
+	"""
+	return wsdeflate.connectArguments(compression, maxSize, clientMaxWindowBits, serverMaxWindowBits, compressionLevel, memLevel)
+
+
+def _encode(message:dict) -> str|bytes:
+	""" Serialize a message. JSON is sent in text frames, CBOR in binary frames.
+
+		Args:
+			message: The message to serialize.
+
+		Returns:
+			The serialized message.
+	"""
+	return cbor2.dumps(message) if subProtocol == 'oneM2M.cbor' else json.dumps(message)
+
+
+def _decode(message:str|bytes) -> dict:
+	""" Deserialize a received message. Text frames contain JSON, binary frames CBOR.
+
+		Args:
+			message: The received message.
+
+		Returns:
+			The deserialized message.
+	"""
+	return json.loads(message) if isinstance(message, str) else cbor2.loads(message)
+
+
 def openConnection(originator:str = None) -> None:
 	""" Open a new WebSocket connection.
 	
@@ -76,7 +113,8 @@ def openConnection(originator:str = None) -> None:
 	global _websocket
 	_websocket = connect(cseUrl, 
 					 	subprotocols=[subProtocol], 
-						additional_headers = { 'X-M2M-Origin': originator } if originator else {})
+						additional_headers = { 'X-M2M-Origin': originator } if originator else {},
+						**connectArguments())
 	print(f'\n[yellow]>>> Connected to WebSocket server at [bold]{cseUrl}[/bold] with originator [bold]{originator}[/bold]')
 	
 
@@ -99,7 +137,8 @@ def openUpdateConnection(originator:str = None) -> None:
 	global _updateWebsocket
 	_updateWebsocket = connect(cseUrl, 
 						 	   subprotocols=[subProtocol], 
-							   additional_headers = { 'X-M2M-Origin': originator } if originator else {})
+							   additional_headers = { 'X-M2M-Origin': originator } if originator else {},
+							   **connectArguments())
 	print(f'\n[yellow]>>> (Updates) Connected to WebSocket server at [bold]{cseUrl}[/bold] with originator [bold]{originator}[/bold]')
 
 
@@ -125,10 +164,10 @@ def _doRequest(request:dict, originator:str = None, reason:str = None, websocket
 		Returns:
 			The received response.
 	"""
-	websocket.send(json.dumps(_printSend(request, reason, websocket)))
+	websocket.send(_encode(_printSend(request, reason, websocket)))
 	try:
 		while True:
-			if (response := _printRecv(json.loads(websocket.recv(timeout = timeout)))):
+			if (response := _printRecv(_decode(websocket.recv(timeout = timeout)))):
 				return response
 			else:
 				continue
@@ -158,7 +197,7 @@ def receiveNotification(originator:str = None) -> dict:
 
 		try:
 			while True:
-				if (request := _printRecv(json.loads(_websocket.recv(timeout = timeout)), 'Received Notification')):
+				if (request := _printRecv(_decode(_websocket.recv(timeout = timeout)), 'Received Notification')):
 					if request['pc'].get('m2m:sgn'):
 						# This is a notification, send response
 						response = {
@@ -168,7 +207,7 @@ def receiveNotification(originator:str = None) -> dict:
 							'rvi': request['rvi'],
 							'rsc': 2000
 						}
-						_websocket.send(json.dumps(_printSend(response, 'Send Notification Response')))
+						_websocket.send(_encode(_printSend(response, 'Send Notification Response')))
 					return request
 				else:
 					continue
@@ -188,7 +227,7 @@ def startNotificationServer(doRespond:bool = True) -> None:
 	stopNotificationServer()
 
 	def _handleNotification(websocket:ServerConnection) -> None:
-		_printRecv(request := json.loads(websocket.recv()), 'Received Notification via standalone WS server')
+		_printRecv(request := _decode(websocket.recv()), 'Received Notification via standalone WS server')
 		_notifications.put(request)
 
 		if doRespond:
@@ -201,7 +240,7 @@ def startNotificationServer(doRespond:bool = True) -> None:
 				'rvi': request['rvi'],
 				'rsc': 2000
 			}
-			websocket.send(json.dumps(_printSend(response, 'Send Notification Response via standalone WS server')))
+			websocket.send(_encode(_printSend(response, 'Send Notification Response via standalone WS server')))
 
 	def _runNotificationServer() -> None:
 		with _websocketServer as server:
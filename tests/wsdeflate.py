@@ -0,0 +1,45 @@
+#
+#	wsdeflate.py
+#
+#	License: BSD 3-Clause License. See the LICENSE file for further details.
+#
+#	Arguments for the permessage-deflate negotiation of WebSocket connections. This module
+#	doesn't depend on a test configuration, so it is shared by the test suite and the
+#	standalone tests in the "websocket" directory.
+#
+
+from __future__ import annotations
+from typing import Any, Optional
+
+from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory
+
+
+def connectArguments(compression:bool,
+					 maxSize:int,
+					 clientMaxWindowBits:Optional[int] = None,
+					 serverMaxWindowBits:Optional[int] = None,
+					 compressionLevel:Optional[int] = None,
+					 memLevel:Optional[int] = None) -> dict[str, Any]:
+	"""	Return the compression and frame size arguments for a WebSocket connect() call.
+
+		Args:
+			compression: Negotiate the permessage-deflate extension.
+			maxSize: Maximum size of a received message in bytes.
+			clientMaxWindowBits: 8..15, or None for the default (15).
+			serverMaxWindowBits: 8..15, or None for the default (15).
+			compressionLevel: zlib compression level 1..9, or None for the default.
+			memLevel: zlib memory level 1..9, or None for the default.
+
+		Return:
+			Dictionary with keyword arguments for *connect()*.
+	"""
+	if not compression:
+		return { 'compression': None, 'max_size': maxSize }
+	compressSettings = { k:v for k,v in (('level', compressionLevel), ('memLevel', memLevel)) if v is not None }
+	if compressSettings or clientMaxWindowBits or serverMaxWindowBits:
+		return { 'compression': None,
+				 'extensions': [ ClientPerMessageDeflateFactory(client_max_window_bits = clientMaxWindowBits or True,
+																server_max_window_bits = serverMaxWindowBits,
+																compress_settings = compressSettings or None) ],
+				 'max_size': maxSize }
+	return { 'compression': 'deflate', 'max_size': maxSize }	# the library's default deflate settings